@@ -8,7 +8,7 @@ class CSVUploadAdmin(admin.ModelAdmin):
     list_filter = ['uploaded_at', 'uploaded_by']
     search_fields = ['file_name']
     readonly_fields = ['file_name', 'file_size', 'row_count', 'column_count', 
-                       'uploaded_by', 'uploaded_at']
+                       'encoding', 'delimiter', 'has_header', 'content_hash', 'uploaded_by', 'uploaded_at']
     date_hierarchy = 'uploaded_at'
     
     def has_add_permission(self, request):
@@ -21,7 +21,7 @@ class AnalysisAdmin(admin.ModelAdmin):
     list_display = ['id', 'csv_upload', 'status', 'model_used', 'token_count', 'created_by', 'created_at']
     list_filter = ['status', 'model_used', 'created_at']
     search_fields = ['prompt', 'result']
-    readonly_fields = ['csv_upload', 'model_used', 'token_count', 'created_by', 
+    readonly_fields = ['csv_upload', 'prompt_hash', 'model_used', 'token_count', 'created_by', 
                        'created_at', 'completed_at']
     date_hierarchy = 'created_at'
     
@@ -33,7 +33,7 @@ class AnalysisAdmin(admin.ModelAdmin):
             'fields': ('result', 'error_message'),
         }),
         ('AI情報', {
-            'fields': ('model_used', 'token_count'),
+            'fields': ('model_used', 'token_count', 'prompt_hash'),
             'classes': ('collapse',)
         }),
         ('メタデータ', {
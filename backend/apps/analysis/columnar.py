@@ -0,0 +1,217 @@
+"""
+アップロードCSVのParquetキャッシュ
+
+CSVUploadごとに、初回の分析時にCSVを型付きのParquetファイルへ1回だけ変換する。
+以降の分析（カスタムプロンプトでの再分析・一括分析）はCSVを解析し直さず、
+Parquetをメモリマップで読み、必要な列だけを取り出す。
+
+変換時にユニーク値の少ない文字列列は辞書型（pandasではcategory）、整数列は値の範囲に
+収まる最小の型にする。読み込み時の文字列はArrow型のまま扱う。
+"""
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from django.conf import settings
+
+from .profiling import CATEGORY_MAX_RATIO, CSV_CHUNK_ROWS, iter_csv_chunks
+
+logger = logging.getLogger(__name__)
+
+
+# Parquetファイルの保存先（MEDIA_ROOTからの相対パス）
+PARQUET_UPLOAD_DIR = 'uploads/parquet'
+
+# 行グループの行数（チャンク単位の読み込みと揃える）
+PARQUET_ROW_GROUP_ROWS = CSV_CHUNK_ROWS
+
+# Parquetの圧縮方式
+PARQUET_COMPRESSION = 'zstd'
+
+# 整数列の縮小先（小さい順）
+INTEGER_TYPES = [pa.int8(), pa.int16(), pa.int32()]
+
+# DataFrameに変換する際の型（文字列はPythonオブジェクトにせずArrowのまま持つ）
+PANDAS_TYPES = {
+    pa.string(): pd.StringDtype('pyarrow'),
+    pa.large_string(): pd.StringDtype('pyarrow'),
+}
+
+
+def get_parquet_name(csv_upload):
+    """CSVUploadに対応するParquetファイル名（MEDIA_ROOTからの相対パス）"""
+    return f'{PARQUET_UPLOAD_DIR}/{csv_upload.id}.parquet'
+
+
+def convert_csv_to_parquet(csv_path, parquet_path, encoding='utf-8', sep=',', header=0):
+    """
+    CSVを型付きのParquetに変換
+
+    型はファイル全体から推論する（途中で小数が現れる整数列などもfloatになる）。
+
+    Returns:
+        int: 行数
+    """
+    read_options = pa_csv.ReadOptions(
+        encoding=encoding,
+        autogenerate_column_names=header is None,
+    )
+    parse_options = pa_csv.ParseOptions(delimiter=sep)
+    # pandasと同じく、文字列の列でも空欄は欠損値として扱う
+    convert_options = pa_csv.ConvertOptions(strings_can_be_null=True)
+
+    table = pa_csv.read_csv(
+        csv_path,
+        read_options=read_options,
+        parse_options=parse_options,
+        convert_options=convert_options,
+    )
+    if header is None:
+        # CSVから直接読む場合（iter_csv_chunks）と同じく '0', '1', '2'... の列名にする
+        table = table.rename_columns([str(index) for index in range(table.num_columns)])
+    else:
+        table = table.rename_columns(_dedupe_column_names(table.column_names))
+    table = optimize_table(table)
+
+    parquet_path = Path(parquet_path)
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # 書き込み途中のファイルを読まれないよう、一時ファイルに書いてから置き換える
+    fd, tmp_path = tempfile.mkstemp(dir=parquet_path.parent, suffix='.tmp')
+    os.close(fd)
+    try:
+        pq.write_table(
+            table,
+            tmp_path,
+            row_group_size=PARQUET_ROW_GROUP_ROWS,
+            compression=PARQUET_COMPRESSION,
+        )
+        os.replace(tmp_path, parquet_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return table.num_rows
+
+
+def optimize_table(table):
+    """
+    保存・読み込みのサイズを減らすよう列の型を変換
+
+    - ユニーク値の少ない文字列列は辞書型にする
+    - 整数列は値の範囲に収まる最小の型にする（値は変わらない）
+    """
+    for index, field in enumerate(table.schema):
+        column = table.column(index)
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            if table.num_rows and pc.count_distinct(column).as_py() <= table.num_rows * CATEGORY_MAX_RATIO:
+                table = table.set_column(index, field.name, pc.dictionary_encode(column))
+        elif pa.types.is_int64(field.type) and table.num_rows:
+            min_max = pc.min_max(column).as_py()
+            if min_max['min'] is None:
+                continue
+            for integer_type in INTEGER_TYPES:
+                low, high = _integer_range(integer_type)
+                if low <= min_max['min'] and min_max['max'] <= high:
+                    table = table.set_column(index, field.name, column.cast(integer_type))
+                    break
+    return table
+
+
+def get_or_create_parquet(csv_upload):
+    """
+    CSVUploadのParquetファイルのパスを取得（未作成の場合は変換する）
+
+    Returns:
+        str: Parquetファイルのパス。変換できない場合はNone（CSVから直接読む）
+    """
+    if csv_upload.parquet_file:
+        path = csv_upload.parquet_file.path
+        if os.path.exists(path):
+            return path
+        logger.warning(f"Parquet file missing for CSV #{csv_upload.id}, converting again")
+
+    name = get_parquet_name(csv_upload)
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    read_options = csv_upload.get_read_options()
+
+    try:
+        row_count = convert_csv_to_parquet(csv_upload.file.path, path, **read_options)
+    except (pa.ArrowException, UnicodeDecodeError, OSError) as e:
+        logger.warning(f"Parquet conversion failed for CSV #{csv_upload.id}: {e}")
+        return None
+
+    csv_upload.parquet_file.name = name
+    csv_upload.save(update_fields=['parquet_file'])
+    logger.info(f"Converted CSV #{csv_upload.id} to Parquet: {row_count} rows")
+    return path
+
+
+def iter_parquet_chunks(path, columns=None, batch_size=CSV_CHUNK_ROWS):
+    """Parquetをメモリマップで開き、指定した列だけをチャンク（DataFrame）単位で読み込む"""
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas(types_mapper=PANDAS_TYPES.get, date_as_object=False)
+
+
+def read_parquet_columns(path, columns=None):
+    """Parquetから指定した列だけを1つのDataFrameとして読み込む"""
+    table = pq.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas(types_mapper=PANDAS_TYPES.get, date_as_object=False)
+
+
+def iter_upload_chunks(csv_upload, columns=None, chunksize=CSV_CHUNK_ROWS):
+    """
+    CSVUploadのデータをチャンク単位で読み込む
+
+    Parquetキャッシュがあればそこから、なければ作成して読む。
+    変換できないファイルはCSVから直接読む。
+    """
+    parquet_path = get_or_create_parquet(csv_upload)
+    if parquet_path:
+        yield from iter_parquet_chunks(parquet_path, columns=columns, batch_size=chunksize)
+        return
+
+    yield from iter_csv_chunks(
+        csv_upload.file.path,
+        chunksize=chunksize,
+        usecols=columns,
+        **csv_upload.get_read_options()
+    )
+
+
+def delete_parquet(csv_upload):
+    """Parquetキャッシュを削除"""
+    if csv_upload.parquet_file:
+        csv_upload.parquet_file.delete(save=False)
+
+
+def _integer_range(integer_type):
+    bits = integer_type.bit_width - 1
+    return -(1 << bits), (1 << bits) - 1
+
+
+def _dedupe_column_names(names):
+    """重複した列名をpandasと同じく 'a', 'a.1', 'a.2' の形にする"""
+    seen = {}
+    result = []
+    for name in names:
+        if name in seen:
+            seen[name] += 1
+            candidate = f'{name}.{seen[name]}'
+            while candidate in seen:
+                seen[name] += 1
+                candidate = f'{name}.{seen[name]}'
+            seen[candidate] = 0
+            result.append(candidate)
+        else:
+            seen[name] = 0
+            result.append(name)
+    return result
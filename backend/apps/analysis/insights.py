@@ -0,0 +1,477 @@
+"""
+AIに渡す集計結果（インサイト）の事前計算
+
+サンプル行や基本統計から傾向を推測させるのではなく、次の集計をローカルで計算し、
+短い文章（事実）としてプロンプトに含める。集計は統計と同時にチャンク単位で行う。
+- 推移: 日付の列を検出し、期間（日・週・月・年）ごとの件数・合計と前期比・前年同期比
+- 内訳: ユニーク値の少ない列ごとの数値列の合計の上位と構成比・平均
+- 相関: 数値列の組み合わせの相関係数
+- 異常: 推移のうち他の期間から大きく外れた期間（1日あたりの値の中央値・MADによるロバストなzスコア）
+"""
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# 集計に使う数値列の上限（MEASURE_KEYWORDS に当てはまる列を優先し、あとは列の並び順）
+MAX_MEASURES = 5
+
+# 合計に意味のある数値列の名前（優先順）
+MEASURE_KEYWORDS = [
+    '売上', '金額', '合計', '利益', '数量', '件数', '個数',
+    'sales', 'revenue', 'amount', 'total', 'profit', 'quantity', 'qty', 'count',
+]
+
+# 合計に意味のない数値列（IDやコード）の名前
+IDENTIFIER_PATTERN = re.compile(r'(?:^|_)id$|ID$|コード|番号|code$|(?:^|_)no$', re.IGNORECASE)
+
+# 推移・内訳を文章にする数値列の上限
+MAX_REPORTED_MEASURES = 2
+
+# 内訳に使う列のユニーク値数の上限（超えた列は内訳に使わない）
+MAX_GROUPS = 50
+
+# 内訳の候補として集計する列の上限
+MAX_GROUP_COLUMNS = 5
+
+# 内訳を文章にする列の上限
+MAX_REPORTED_GROUP_COLUMNS = 3
+
+# 内訳で示す上位の件数
+TOP_GROUPS = 3
+
+# 相関係数を計算する数値列の上限
+MAX_CORRELATION_COLUMNS = 10
+
+# 相関として示す係数の絶対値の下限 / 件数の上限
+MIN_CORRELATION = 0.5
+MAX_CORRELATIONS = 5
+
+# 日付の列の判定に使う値の数と、日付として読めるべき値の割合
+DATE_DETECT_SAMPLE = 200
+DATE_MATCH_RATIO = 0.9
+
+# 日付と見なす値（2023-01-05, 2023/1/5, 2023年1月5日 など。時刻は続いてもよい）
+DATE_PATTERN = re.compile(r'^\s*\d{4}[-/.年]\d{1,2}(?:[-/.月]\d{1,2}日?)?(?:[ T]\S*)?\s*$')
+
+# 異常と見なすロバストなzスコアと、判定に必要な期間の数
+ANOMALY_Z = 3.5
+MIN_ANOMALY_PERIODS = 6
+
+# 異常と見なす中央値からの最小の乖離（割合）。期間ごとの値がほぼ一定の場合にMADが小さくなり、
+# わずかな差でもzスコアが大きくなるため、zスコアと合わせて判定する
+ANOMALY_MIN_DEVIATION = 0.2
+
+# 事実の件数の上限
+MAX_FACTS = 20
+
+# 期間の単位（データの期間の日数の上限, pandasの期間, 表示名, 期間の数の単位）
+PERIOD_UNITS = [
+    (31, 'D', '日', '日間'),
+    (92, 'W', '週', '週'),
+    (366 * 6, 'M', '月', 'か月'),
+    (None, 'Y', '年', '年'),
+]
+
+# 件数の集計に使う列名
+COUNT_COLUMN = '（件数）'
+
+
+class InsightCollector:
+    """
+    チャンクを順に受け取り、推移・内訳・相関の集計を更新する
+
+    集計は日別・値別の合計と件数、数値列の積和だけを持つため、メモリは行数によらない。
+    """
+
+    def __init__(self, max_measures=MAX_MEASURES, max_groups=MAX_GROUPS):
+        self.max_measures = max_measures
+        self.max_groups = max_groups
+        self.measures = None
+        self.date_column = None
+        self._date_checked = False
+        # 日別の集計（索引は日付、列は (数値列, 'sum'/'count') と件数）
+        self.daily = None
+        # 内訳: 列 → 値ごとの集計
+        self.groups = {}
+        self._group_columns = None
+        # 相関: 欠損のない行の件数・合計・積和（桁落ちを防ぐため最初のチャンクの平均を引いて集計）
+        self.correlation_columns = []
+        self._correlation_n = 0
+        self._correlation_shift = None
+        self._correlation_sum = None
+        self._correlation_products = None
+
+    def update(self, chunk: pd.DataFrame, categorical_columns, numeric_values):
+        """
+        1チャンク分の集計を更新
+
+        Args:
+            categorical_columns: 数値以外の列（日付・内訳の候補）
+            numeric_values: 数値列 → 値（float64、欠損はNaN。chunkと同じ行順）
+        """
+        if not len(chunk):
+            return
+        if self.measures is None:
+            self.measures = _select_measures(numeric_values)[:self.max_measures]
+            self.correlation_columns = list(numeric_values)[:MAX_CORRELATION_COLUMNS]
+
+        # チャンクによって数値でなくなった列は欠損として扱う
+        missing = np.full(len(chunk), np.nan)
+        frame = pd.DataFrame(
+            {col: numeric_values.get(col, missing) for col in self.measures},
+            index=chunk.index
+        )
+
+        if not self._date_checked:
+            self._date_checked = True
+            self.date_column = _detect_date_column(chunk, categorical_columns)
+        if self.date_column is not None:
+            dates = _to_dates(chunk[self.date_column])
+            self.daily = _add(self.daily, _aggregate(frame, dates.to_numpy()))
+
+        if self._group_columns is None:
+            self._group_columns = [
+                col for col in categorical_columns
+                if col != self.date_column and chunk[col].nunique() <= self.max_groups
+            ][:MAX_GROUP_COLUMNS]
+        for col in list(self._group_columns):
+            counts = _add(self.groups.get(col), _aggregate(frame, chunk[col]))
+            if len(counts) > self.max_groups:
+                # ユニーク値が多い列は内訳に使わない
+                self._group_columns.remove(col)
+                self.groups.pop(col, None)
+                continue
+            self.groups[col] = counts
+
+        self._update_correlation(numeric_values, missing)
+
+    def _update_correlation(self, numeric_values, missing):
+        if len(self.correlation_columns) < 2:
+            return
+        matrix = np.column_stack([numeric_values.get(col, missing) for col in self.correlation_columns])
+        matrix = matrix[~np.isnan(matrix).any(axis=1)]
+        if not len(matrix):
+            return
+        if self._correlation_shift is None:
+            self._correlation_shift = matrix.mean(axis=0)
+            size = len(self.correlation_columns)
+            self._correlation_sum = np.zeros(size)
+            self._correlation_products = np.zeros((size, size))
+        matrix = matrix - self._correlation_shift
+        self._correlation_n += len(matrix)
+        self._correlation_sum += matrix.sum(axis=0)
+        self._correlation_products += matrix.T @ matrix
+
+    def correlations(self):
+        """数値列の組み合わせごとの相関係数（係数の絶対値の大きい順）"""
+        if self._correlation_n < 3:
+            return []
+        n = self._correlation_n
+        mean = self._correlation_sum / n
+        covariance = self._correlation_products / n - np.outer(mean, mean)
+        std = np.sqrt(np.clip(np.diag(covariance), 0, None))
+
+        pairs = []
+        for i, a in enumerate(self.correlation_columns):
+            for j in range(i + 1, len(self.correlation_columns)):
+                if std[i] == 0 or std[j] == 0:
+                    continue
+                r = float(np.clip(covariance[i, j] / (std[i] * std[j]), -1, 1))
+                pairs.append({'columns': [a, self.correlation_columns[j]], 'r': r})
+        pairs.sort(key=lambda pair: abs(pair['r']), reverse=True)
+        return pairs
+
+    def summarize(self):
+        """
+        集計結果を確定（Analysis.metadata の insights）
+
+        Returns:
+            dict: facts（AIに渡す文章）と、推移・内訳・相関・異常の集計値
+        """
+        reported = (self.measures or [])[:MAX_REPORTED_MEASURES]
+        trends, anomalies = self._trends(reported)
+        breakdowns = self._breakdowns(reported)
+        correlations = [
+            pair for pair in self.correlations() if abs(pair['r']) >= MIN_CORRELATION
+        ][:MAX_CORRELATIONS]
+
+        facts = [trend['fact'] for trend in trends]
+        facts += [anomaly['fact'] for anomaly in anomalies]
+        facts += [breakdown['fact'] for breakdown in breakdowns]
+        facts += [_correlation_fact(pair) for pair in correlations]
+
+        return {
+            'date_column': self.date_column,
+            'trends': trends,
+            'anomalies': anomalies,
+            'breakdowns': breakdowns,
+            'correlations': correlations,
+            'facts': facts[:MAX_FACTS],
+        }
+
+    def _trends(self, measures):
+        """期間ごとの件数・合計の推移と、外れた期間"""
+        if self.daily is None or not len(self.daily):
+            return [], []
+
+        daily = self.daily.sort_index()
+        first, last = daily.index.min(), daily.index.max()
+        span = (last - first).days
+        freq, unit, counter = next(
+            (freq, unit, counter) for days, freq, unit, counter in PERIOD_UNITS if days is None or span <= days
+        )
+
+        periods = daily.index.to_period(freq)
+        totals = daily.groupby(periods).sum()
+        totals = totals.reindex(pd.period_range(periods.min(), periods.max(), freq=freq), fill_value=0)
+        # データの途中で始まる・終わる期間は比較に使わない
+        complete = totals
+        if len(complete) and first > complete.index[0].start_time:
+            complete = complete.iloc[1:]
+        if len(complete) and last.normalize() < complete.index[-1].end_time.normalize():
+            complete = complete.iloc[:-1]
+
+        series = {'件数': complete[COUNT_COLUMN]}
+        for col in measures:
+            series[f"{col}の合計"] = complete[(col, 'sum')]
+
+        trends, anomalies = [], []
+        for label, values in series.items():
+            if len(values) < 2:
+                continue
+            trend = _describe_trend(label, values, freq, unit, counter)
+            trend['fact'] = f"{unit}別の{label}（{self.date_column}）: {trend['fact']}"
+            trends.append(trend)
+            anomalies += _find_anomalies(label, values)
+        return trends, anomalies
+
+    def _breakdowns(self, measures):
+        """内訳の列ごとに、合計の上位と構成比・平均"""
+        columns = [col for col in self._group_columns or [] if len(self.groups.get(col, [])) >= 2]
+        breakdowns = []
+        for col in columns[:MAX_REPORTED_GROUP_COLUMNS]:
+            counts = self.groups[col]
+            if not measures:
+                breakdowns.append(_describe_breakdown(col, '件数', counts[COUNT_COLUMN], None))
+                continue
+            for measure in measures:
+                sums, non_null = counts[(measure, 'sum')], counts[(measure, 'count')]
+                means = sums / non_null.where(non_null > 0)
+                breakdowns.append(_describe_breakdown(col, f"{measure}の合計", sums, means))
+        return breakdowns
+
+
+def _select_measures(columns):
+    """合計を集計する数値列（売上・数量などを優先し、IDやコードの列は除く）"""
+    columns = [col for col in columns if not IDENTIFIER_PATTERN.search(str(col))]
+
+    def rank(col):
+        name = str(col).lower()
+        return next(
+            (index for index, keyword in enumerate(MEASURE_KEYWORDS) if keyword in name),
+            len(MEASURE_KEYWORDS)
+        )
+
+    return sorted(columns, key=rank)
+
+
+def _aggregate(frame, keys):
+    """キーごとの数値列の合計・件数と行数"""
+    grouped = frame.groupby(keys, observed=True, sort=False)
+    counts = grouped.agg(['sum', 'count']) if len(frame.columns) else pd.DataFrame(index=grouped.size().index)
+    counts[COUNT_COLUMN] = grouped.size()
+    return counts
+
+
+def _add(total, counts):
+    if total is None:
+        return counts
+    return total.add(counts, fill_value=0)
+
+
+def _detect_date_column(chunk, columns):
+    """日付の列（日時型の列、なければ日付として読める文字列の列）を1つ選ぶ"""
+    for col in columns:
+        if pd.api.types.is_datetime64_any_dtype(chunk[col].dtype):
+            return col
+    for col in columns:
+        values = chunk[col].dropna().head(DATE_DETECT_SAMPLE)
+        if not len(values):
+            continue
+        matched = values.astype(str).str.match(DATE_PATTERN)
+        if matched.mean() >= DATE_MATCH_RATIO:
+            return col
+    return None
+
+
+def _to_dates(series):
+    """日付の列を日単位の日時に変換（読めない値はNaT）"""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if getattr(series.dt, 'tz', None) is not None:
+            series = series.dt.tz_localize(None)
+        return series.dt.normalize()
+
+    # 同じ日付が繰り返し現れるため、ユニーク値だけを変換する
+    codes, uniques = pd.factorize(series.astype(object))
+    normalized = (
+        pd.Series(uniques, dtype=object).astype(str)
+        .str.replace(r'[/.年月]', '-', regex=True)
+        .str.replace('日', '', regex=False)
+    )
+    # 形式を固定しないと最初の値から推論された形式（時刻付きなど）に合わない値がNaTになる
+    parsed = pd.to_datetime(normalized, errors='coerce', format='ISO8601').dt.normalize().to_numpy()
+    dates = np.where(codes >= 0, parsed[codes], np.datetime64('NaT'))
+    return pd.Series(dates, index=series.index, dtype='datetime64[ns]')
+
+
+def _describe_trend(label, values, freq, unit, counter):
+    """推移の要約（最新の値と前期比・前年同期比、最大・最小、全体の傾き）"""
+    latest = float(values.iloc[-1])
+    previous = float(values.iloc[-2])
+    peak, low = values.idxmax(), values.idxmin()
+    # 期間あたりの増減（線形回帰の傾き）を平均に対する割合で表す
+    mean = float(values.mean())
+    slope = float(np.polyfit(np.arange(len(values)), values.to_numpy(dtype=float), 1)[0])
+    slope_ratio = slope / abs(mean) if mean else None
+
+    trend = {
+        'label': label,
+        'period': freq,
+        'values': {str(period): float(value) for period, value in values.items()},
+        'latest': {'period': str(values.index[-1]), 'value': latest, 'change': _change(latest, previous)},
+        'peak': {'period': str(peak), 'value': float(values[peak])},
+        'low': {'period': str(low), 'value': float(values[low])},
+        'slope_ratio': slope_ratio,
+    }
+
+    parts = [f"{values.index[0]}〜{values.index[-1]}の{len(values)}{counter}"]
+    latest_text = f"最新{values.index[-1]}は{_format_number(latest)}"
+    if trend['latest']['change'] is not None:
+        latest_text += f"（前{unit}比{trend['latest']['change']:+.1%}"
+        year_ago = _year_ago(values, freq)
+        if year_ago is not None:
+            trend['latest']['year_over_year'] = _change(latest, year_ago)
+            if trend['latest']['year_over_year'] is not None:
+                latest_text += f"、前年同{unit}比{trend['latest']['year_over_year']:+.1%}"
+        latest_text += "）"
+    parts.append(latest_text)
+    if values[peak] == values[low]:
+        parts.append("全期間で同じ値")
+    else:
+        parts.append(f"最大{peak}（{_format_number(values[peak])}）、最小{low}（{_format_number(values[low])}）")
+    if slope_ratio is not None and values[peak] != values[low]:
+        if abs(slope_ratio) < 0.005:
+            parts.append("全体ではほぼ横ばい")
+        else:
+            direction = '増加' if slope_ratio > 0 else '減少'
+            parts.append(f"全体では毎{unit}平均{slope_ratio:+.1%}の{direction}傾向")
+    trend['fact'] = '、'.join(parts)
+    return trend
+
+
+def _year_ago(values, freq):
+    """1年前の同じ期間の値（日・月・週の推移で、1年以上のデータがある場合）"""
+    lags = {'D': 365, 'W': 52, 'M': 12}
+    lag = lags.get(freq)
+    if lag is None or len(values) <= lag:
+        return None
+    return float(values.iloc[-1 - lag])
+
+
+def _find_anomalies(label, values):
+    """
+    1日あたりの値が中央値からMADの ANOMALY_Z 倍以上、かつ ANOMALY_MIN_DEVIATION 以上外れた期間
+
+    月によって日数が異なる（2月は28日）ため、期間の合計を日数で割ってから比べる。
+    """
+    if len(values) < MIN_ANOMALY_PERIODS:
+        return []
+    index = values.index
+    days = ((index.end_time - index.start_time).days + 1).to_numpy(dtype=float)
+    rates = values.to_numpy(dtype=float) / days
+    median = np.median(rates)
+    mad = np.median(np.abs(rates - median))
+    if mad == 0:
+        return []
+
+    anomalies = []
+    z_scores = 0.6745 * (rates - median) / mad
+    for period, value, rate, z in zip(index, values.to_numpy(dtype=float), rates, z_scores):
+        if abs(z) < ANOMALY_Z:
+            continue
+        if median and abs(rate / median - 1) < ANOMALY_MIN_DEVIATION:
+            continue
+        direction = '多い' if z > 0 else '少ない'
+        ratio = f"1日あたり中央値の{rate / median:.1f}倍" if median else f"1日あたり中央値{_format_number(median)}"
+        anomalies.append({
+            'label': label,
+            'period': str(period),
+            'value': float(value),
+            'daily_rate': float(rate),
+            'z': float(z),
+            'fact': f"{period}の{label}は他の期間より突出して{direction}（{_format_number(value)}、{ratio}）",
+        })
+    return anomalies
+
+
+def _describe_breakdown(col, label, sums, means):
+    """値ごとの合計の上位と構成比（平均があれば最も高い・低い値も）"""
+    sums = sums.sort_values(ascending=False)
+    total = float(sums.sum())
+    top = sums.head(TOP_GROUPS)
+
+    items = []
+    for value, amount in top.items():
+        share = amount / total if total > 0 and (sums >= 0).all() else None
+        item = {'value': str(value), 'amount': float(amount), 'share': share}
+        items.append(item)
+
+    texts = [
+        f"{item['value']} {_format_number(item['amount'])}"
+        + (f"（{item['share']:.1%}）" if item['share'] is not None else "")
+        for item in items
+    ]
+    fact = f"{col}別の{label}（上位{len(items)}/{len(sums)}）: {'、'.join(texts)}"
+
+    breakdown = {'column': col, 'label': label, 'groups': len(sums), 'top': items}
+    if means is not None:
+        means = means.dropna()
+        if len(means) >= 2:
+            highest, lowest = means.idxmax(), means.idxmin()
+            breakdown['mean'] = {
+                'highest': {'value': str(highest), 'mean': float(means[highest])},
+                'lowest': {'value': str(lowest), 'mean': float(means[lowest])},
+            }
+            fact += (
+                f"。1件あたりの平均は{highest}が最も高く{_format_number(means[highest])}、"
+                f"{lowest}が最も低く{_format_number(means[lowest])}"
+            )
+    breakdown['fact'] = fact
+    return breakdown
+
+
+def _correlation_fact(pair):
+    a, b = pair['columns']
+    strength = '強い' if abs(pair['r']) >= 0.7 else '中程度の'
+    direction = '正' if pair['r'] > 0 else '負'
+    return f"{a}と{b}の相関係数 {pair['r']:+.2f}（{strength}{direction}の相関）"
+
+
+def _change(current, previous):
+    """前の値からの変化率（前の値が0以下の場合はNone）"""
+    if previous <= 0:
+        return None
+    return current / previous - 1
+
+
+def _format_number(value):
+    """桁区切り付きの数値（整数または小数2桁）"""
+    value = float(value)
+    if value.is_integer() or abs(value) >= 10000:
+        return f"{value:,.0f}"
+    return f"{value:,.2f}"
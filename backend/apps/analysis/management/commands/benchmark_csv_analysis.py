@@ -0,0 +1,123 @@
+"""
+CSV分析の読み込み・集計ベンチマーク
+
+指定したCSV（代表的な売上データなど）で、次の方式の処理時間とDataFrameのメモリを比較する。
+- 従来: ファイル全体を既定の型（文字列はPythonオブジェクト）で読み、describe() / nunique() で集計
+- CSV: チャンク単位でcategory型・整数の縮小を行って集計（Parquetに変換できない場合）
+- Parquet: Parquetキャッシュ（変換は初回のみ）からArrow型の文字列・category型で読んで集計
+
+メモリはデータ全体をそれぞれの型で持った場合の大きさ（memory_usage(deep=True)、チャンク方式は合計）。
+"""
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from apps.analysis.columnar import convert_csv_to_parquet, iter_parquet_chunks
+from apps.analysis.profiling import iter_csv_chunks, profile_chunks
+from apps.analysis.sniffing import sniff_csv
+from apps.analysis.tasks import _create_data_summary, _get_basic_statistics
+
+
+def legacy_analyze(path, read_options):
+    """従来の集計処理（ファイル全体を読み込み、基本統計とサマリーでそれぞれ集計していた）"""
+    df = pd.read_csv(path, **read_options)
+
+    numeric_cols = df.select_dtypes(include=['number']).columns
+    stats = {
+        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+        'missing_values': {col: int(count) for col, count in df.isnull().sum().items()},
+        'numeric_summary': df[numeric_cols].describe().to_dict() if len(numeric_cols) else {},
+    }
+    summary = [df.head(10).to_string()]
+    if len(numeric_cols):
+        summary.append(df[numeric_cols].describe().to_string())
+    for col in df.select_dtypes(include=['object']).columns:
+        summary.append(f"- {col}: {df[col].nunique()}種類")
+
+    return df
+
+
+class Command(BaseCommand):
+    help = 'CSV分析の読み込み・集計（従来方式 / 型を最適化したCSV / Parquetキャッシュ）の時間とメモリを比較'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='CSVファイルのパス')
+        parser.add_argument('--iterations', type=int, default=3, help='方式ごとの繰り返し回数')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        for path in options['files']:
+            path = Path(path)
+            if not path.exists():
+                self.stdout.write(self.style.ERROR(f"ファイルが見つかりません: {path}"))
+                continue
+
+            with open(path, 'rb') as f:
+                sniffed = sniff_csv(File(f))
+            read_options = {
+                'encoding': sniffed['encoding'],
+                'sep': sniffed['delimiter'],
+                'header': 0 if sniffed['has_header'] else None,
+            }
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\n{path.name}（{sniffed['row_count']}行 × {sniffed['column_count']}列, {read_options['encoding']}）"
+            ))
+
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                parquet_path = Path(tmp_dir) / 'data.parquet'
+                convert_seconds = self._measure(
+                    lambda: convert_csv_to_parquet(path, parquet_path, **read_options), 1
+                )
+
+                legacy_seconds, df = self._measure_with_result(
+                    lambda: legacy_analyze(path, read_options), iterations
+                )
+                csv_seconds = self._measure(
+                    lambda: self._analyze(iter_csv_chunks(path, **read_options)), iterations
+                )
+                parquet_seconds = self._measure(
+                    lambda: self._analyze(iter_parquet_chunks(parquet_path)), iterations
+                )
+
+                # メモリは時間の計測とは別に測る
+                legacy_memory = df.memory_usage(deep=True).sum()
+                del df
+                csv_memory = self._total_memory(iter_csv_chunks(path, **read_options))
+                parquet_memory = self._total_memory(iter_parquet_chunks(parquet_path))
+                parquet_size = parquet_path.stat().st_size
+
+            self.stdout.write(f"{'方式':<16}{'時間(ms)':>12}{'DataFrame(MB)':>16}")
+            self.stdout.write(f"{'従来':<16}{legacy_seconds * 1000:>12.1f}{legacy_memory / 1e6:>16.1f}")
+            self.stdout.write(f"{'CSV（型最適化）':<16}{csv_seconds * 1000:>12.1f}{csv_memory / 1e6:>16.1f}")
+            self.stdout.write(f"{'Parquet':<16}{parquet_seconds * 1000:>12.1f}{parquet_memory / 1e6:>16.1f}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Parquet: 時間 {1 - parquet_seconds / legacy_seconds:.0%} 削減, "
+                f"メモリ {1 - parquet_memory / legacy_memory:.0%} 削減 "
+                f"(変換 {convert_seconds * 1000:.1f}ms・初回のみ, ファイル {parquet_size / 1e6:.1f}MB)"
+            ))
+
+    def _analyze(self, chunks):
+        """チャンク単位で集計して基本統計とサマリーを作成"""
+        profile = profile_chunks(chunks).profile()
+        _get_basic_statistics(profile)
+        _create_data_summary(profile)
+
+    def _total_memory(self, chunks):
+        return sum(chunk.memory_usage(deep=True).sum() for chunk in chunks)
+
+    def _measure(self, func, iterations):
+        """1回あたりの平均時間（秒）"""
+        seconds, _ = self._measure_with_result(func, iterations)
+        return seconds
+
+    def _measure_with_result(self, func, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            result = func()
+        return (time.perf_counter() - start) / iterations, result
+
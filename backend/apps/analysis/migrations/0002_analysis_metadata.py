@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='metadata',
+            field=models.JSONField(blank=True, default=dict, verbose_name='メタデータ'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0002_analysis_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvupload',
+            name='delimiter',
+            field=models.CharField(blank=True, max_length=4, verbose_name='区切り文字'),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='encoding',
+            field=models.CharField(blank=True, max_length=20, verbose_name='文字コード'),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='has_header',
+            field=models.BooleanField(default=True, verbose_name='見出し行あり'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0003_csvupload_read_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvupload',
+            name='parquet_file',
+            field=models.FileField(blank=True, max_length=255, upload_to='', verbose_name='Parquetキャッシュ'),
+        ),
+    ]
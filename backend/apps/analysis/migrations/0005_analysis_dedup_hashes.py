@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0004_csvupload_parquet_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='prompt_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='プロンプトハッシュ'),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='ファイルハッシュ'),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
 from django.core.validators import FileExtensionValidator
 from django.conf import settings
-import pandas as pd
+
+from .sniffing import hash_file, sniff_csv
 
 
 class CSVUpload(models.Model):
@@ -17,6 +18,17 @@ class CSVUpload(models.Model):
     row_count = models.IntegerField(null=True, blank=True, verbose_name="行数")
     column_count = models.IntegerField(null=True, blank=True, verbose_name="列数")
     
+    # 読み込み設定（アップロード時に先頭部分から判定）
+    encoding = models.CharField(max_length=20, blank=True, verbose_name="文字コード")
+    delimiter = models.CharField(max_length=4, blank=True, verbose_name="区切り文字")
+    has_header = models.BooleanField(default=True, verbose_name="見出し行あり")
+    
+    # ファイル内容のSHA-256（同じ内容のファイルの分析結果を再利用する）
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="ファイルハッシュ")
+    
+    # 型付きの列指向キャッシュ（初回の分析時に作成し、以降の分析はこちらを読む）
+    parquet_file = models.FileField(blank=True, max_length=255, verbose_name="Parquetキャッシュ")
+    
     # アップロード者
     uploaded_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -41,16 +53,61 @@ class CSVUpload(models.Model):
             self.file_size = self.file.size
             
             try:
-                # pandasでCSV解析
-                df = pd.read_csv(self.file)
-                self.row_count = len(df)
-                self.column_count = len(df.columns)
+                # ファイル全体は解析せず、先頭部分と改行数から判定する（正確な行数は分析時に書き戻す）
+                self.apply_sniff_result(sniff_csv(self.file, self._get_allowed_encodings()))
             except Exception as e:
                 # エラーが発生しても保存は継続
                 self.row_count = 0
                 self.column_count = 0
         
         super().save(*args, **kwargs)
+    
+    def apply_sniff_result(self, result):
+        self.encoding = result['encoding']
+        self.delimiter = result['delimiter']
+        self.has_header = result['has_header']
+        self.row_count = result['row_count']
+        self.column_count = result['column_count']
+        self.content_hash = result['content_hash']
+    
+    def get_read_options(self):
+        """
+        pandasでの読み込み設定
+        
+        判定前にアップロードされたファイルはここで判定して保存する
+        """
+        if not self.encoding:
+            with self.file.open('rb') as f:
+                self.apply_sniff_result(sniff_csv(f, self._get_allowed_encodings()))
+            self.save(update_fields=[
+                'encoding', 'delimiter', 'has_header', 'row_count', 'column_count', 'content_hash'
+            ])
+        
+        return {
+            'encoding': self.encoding,
+            'sep': self.delimiter or ',',
+            'header': 0 if self.has_header else None,
+        }
+    
+    def get_content_hash(self):
+        """
+        ファイル内容のハッシュ値
+        
+        ハッシュ導入前にアップロードされたファイルはここで計算して保存する
+        """
+        if not self.content_hash:
+            with self.file.open('rb') as f:
+                self.content_hash = hash_file(f)
+            self.save(update_fields=['content_hash'])
+        return self.content_hash
+    
+    @staticmethod
+    def _get_allowed_encodings():
+        from apps.core.models import SystemSettings
+        try:
+            return SystemSettings.get_settings().allowed_csv_encodings
+        except Exception:
+            return None
 
 
 class Analysis(models.Model):
@@ -73,6 +130,8 @@ class Analysis(models.Model):
     
     # プロンプト
     prompt = models.TextField(verbose_name="分析プロンプト")
+    # 実際に使うプロンプトの識別子のハッシュ（カスタムプロンプト / テンプレートのバージョン）
+    prompt_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="プロンプトハッシュ")
     
     # 結果
     result = models.TextField(blank=True, verbose_name="分析結果")
@@ -81,6 +140,9 @@ class Analysis(models.Model):
     model_used = models.CharField(max_length=50, blank=True, verbose_name="使用モデル")
     token_count = models.IntegerField(null=True, blank=True, verbose_name="使用トークン数")
     
+    # 統計情報など
+    metadata = models.JSONField(default=dict, blank=True, verbose_name="メタデータ")
+    
     # ステータス
     status = models.CharField(
         max_length=20,
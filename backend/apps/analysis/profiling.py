@@ -0,0 +1,497 @@
+"""
+CSVのストリーミング統計エンジン
+
+CSVをチャンク単位で読み込み、全体をメモリに載せずに基本統計情報を計算する。
+- 件数・欠損数・最小値・最大値はチャンクごとの値を合算
+- 平均・標準偏差はチャンクごとの値をWelford法（並列版）で統合
+- 四分位数は一様サンプル（bottom-kサンプリング）から近似
+- ユニーク値数は上限までは正確に数える
+
+行数が APPROXIMATE_ROW_THRESHOLD を超えるファイルは近似モードで集計する。
+- ユニーク値数はHyperLogLogで推定（相対誤差 1.04 / √レジスタ数）
+- 四分位数の一様サンプルの誤差はDKW不等式による順位の誤差として記録する
+
+チャンクはユニーク値の少ない文字列の列をcategory、整数を最小の型にしてから集計する。
+AIに渡すサンプル行の候補（sampling.py）と、推移・内訳・相関の集計（insights.py）も同時に行う。
+"""
+import functools
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .insights import InsightCollector
+from .sampling import SampleCollector
+
+logger = logging.getLogger(__name__)
+
+
+# 1チャンクあたりの行数
+CSV_CHUNK_ROWS = 50000
+
+# 四分位数の近似に使うサンプル数（行数がこれ以下なら正確な値になる）
+QUANTILE_SAMPLE_SIZE = 50000
+
+# ユニーク値数を正確に数える上限（超えた場合は下限値として扱う）
+DISTINCT_LIMIT = 100000
+
+# 基本統計で出力する四分位数（describe()と同じ）
+PERCENTILES = [0.25, 0.5, 0.75]
+
+# 近似モードに切り替える行数
+APPROXIMATE_ROW_THRESHOLD = 1000000
+
+# HyperLogLogの精度（レジスタ数 2^14 = 16384、相対誤差 約0.8%）
+HLL_PRECISION = 14
+
+# 誤差の範囲を記録する際の信頼度
+ERROR_CONFIDENCE = 0.99
+
+
+# category型に変換するユニーク値の割合の上限（チャンク内）
+CATEGORY_MAX_RATIO = 0.05
+
+
+def iter_csv_chunks(path, encoding='utf-8', chunksize=CSV_CHUNK_ROWS, **read_csv_kwargs):
+    """
+    CSVをチャンク（DataFrame）単位で読み込む（型はoptimize_dtypesで最適化する）
+
+    ヘッダー行がない場合（header=None）の列名は、Parquetへの変換と同じく文字列の '0', '1', ... にする
+    """
+    headerless = 'header' in read_csv_kwargs and read_csv_kwargs['header'] is None
+    if headerless and read_csv_kwargs.get('usecols') is not None:
+        read_csv_kwargs['usecols'] = [int(col) for col in read_csv_kwargs['usecols']]
+
+    # dtype_backend='pyarrow' はCパーサーの結果を変換し直すため、読み込みが約2倍遅くなる
+    with pd.read_csv(path, encoding=encoding, chunksize=chunksize, **read_csv_kwargs) as reader:
+        for chunk in reader:
+            if headerless:
+                chunk.columns = [str(col) for col in chunk.columns]
+            yield optimize_dtypes(chunk)
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    メモリを減らすよう型を変換
+
+    - 欠損のない整数列は値の範囲に収まる最小の整数型にする
+    - ユニーク値の少ない文字列列はcategory型にする
+    """
+    converted = {}
+    for col, dtype in df.dtypes.items():
+        series = df[col]
+        if _is_integer_kind(str(dtype)) and not series.hasnans:
+            converted[col] = pd.to_numeric(series.to_numpy(dtype='int64'), downcast='integer')
+        elif pd.api.types.is_string_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype):
+            if len(series) and series.nunique() <= len(series) * CATEGORY_MAX_RATIO:
+                converted[col] = series.astype('category')
+
+    if not converted:
+        return df
+
+    df = df.copy(deep=False)
+    for col, values in converted.items():
+        df[col] = values
+    return df
+
+
+class NumericAccumulator:
+    """数値列の統計（件数・平均・分散・最小値・最大値・四分位数用サンプル）"""
+
+    def __init__(self, sample_size=QUANTILE_SAMPLE_SIZE, rng=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sample_size = sample_size
+        self._rng = rng or np.random.default_rng()
+        self._sample_values = np.empty(0)
+        self._sample_keys = np.empty(0)
+        self._key_threshold = 1.0
+
+    def update(self, values):
+        """
+        1チャンク分の値を統合
+
+        Args:
+            values: 欠損を除いた値（float64のnumpy配列）
+        """
+        count = len(values)
+        if not count:
+            return
+
+        mean = float(values.mean())
+        m2 = float(np.square(values - mean).sum())
+        minimum = float(values.min())
+        maximum = float(values.max())
+
+        # Welford法の並列版（Chan et al.）で平均と偏差平方和を統合
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+        self.min = minimum if self.min is None else min(self.min, minimum)
+        self.max = maximum if self.max is None else max(self.max, maximum)
+
+        # 乱数キーの小さい順にsample_size件を残す（一様な非復元サンプルになる）
+        keys = self._rng.random(count)
+        if self._key_threshold < 1.0:
+            # サンプルが埋まった後は、残っているキーの最大値より小さいものだけが候補になる
+            candidates = keys < self._key_threshold
+            values, keys = values[candidates], keys[candidates]
+        sample_values = np.concatenate([self._sample_values, values])
+        sample_keys = np.concatenate([self._sample_keys, keys])
+        if len(sample_keys) > self.sample_size:
+            keep = np.argpartition(sample_keys, self.sample_size)[:self.sample_size]
+            sample_values, sample_keys = sample_values[keep], sample_keys[keep]
+            self._key_threshold = float(sample_keys.max())
+        self._sample_values, self._sample_keys = sample_values, sample_keys
+
+    @property
+    def std(self):
+        """標本標準偏差（describe()と同じく不偏推定）"""
+        if self.count < 2:
+            return None
+        return float(np.sqrt(self.m2 / (self.count - 1)))
+
+    def quantiles(self, percentiles=PERCENTILES):
+        if not len(self._sample_values):
+            return {p: None for p in percentiles}
+        values = np.quantile(self._sample_values, percentiles)
+        return {p: float(value) for p, value in zip(percentiles, values)}
+
+    @property
+    def is_exact_quantiles(self):
+        return self.count <= self.sample_size
+
+    def quantile_rank_error(self, confidence=ERROR_CONFIDENCE):
+        """
+        四分位数の順位の誤差（DKW不等式）
+
+        例: 0.01 なら、中央値は真の順位で49%〜51%の間の値（信頼度 confidence）
+        """
+        if self.is_exact_quantiles:
+            return 0.0
+        return float(np.sqrt(np.log(2 / (1 - confidence)) / (2 * len(self._sample_values))))
+
+    def describe(self):
+        """describe()と同じ形式の辞書"""
+        quantiles = self.quantiles()
+        return {
+            'count': float(self.count),
+            'mean': float(self.mean) if self.count else None,
+            'std': self.std,
+            'min': _to_float(self.min),
+            **{f'{int(p * 100)}%': quantiles[p] for p in PERCENTILES},
+            'max': _to_float(self.max),
+        }
+
+
+class DistinctAccumulator:
+    """ユニーク値数（DISTINCT_LIMIT件までは正確）"""
+
+    approximate = False
+
+    def __init__(self, limit=DISTINCT_LIMIT):
+        self.limit = limit
+        self.values = set()
+        self.overflowed = False
+
+    def update(self, series):
+        if self.overflowed:
+            return
+        # Arrow型の配列は1件ずつ取り出すと遅いため、リストに変換してから追加する
+        self.values.update(_distinct_values(series).tolist())
+        if len(self.values) > self.limit:
+            self.overflowed = True
+            self.values = set()
+
+    @property
+    def count(self):
+        return self.limit if self.overflowed else len(self.values)
+
+
+class HyperLogLog:
+    """
+    HyperLogLogによるユニーク値数の推定（近似モード用）
+
+    メモリは 2^precision バイトで一定。値はpandasのハッシュ（64bit）でまとめて処理する。
+    """
+
+    approximate = True
+    overflowed = False
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, series):
+        values = _distinct_values(series)
+        if not len(values):
+            return
+
+        # 値はユニーク済みのため、hash_array の重複除去（categorize）は行わない
+        hashes = pd.util.hash_array(np.asarray(values), categorize=False)
+        # 上位precisionビットでレジスタを選び、残りのビットの先頭の0の数 + 1 を記録する
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        rest = (hashes << np.uint64(self.precision)) | np.uint64(1 << (self.precision - 1))
+        ranks = (64 - np.floor(np.log2(rest.astype(np.float64)))).astype(np.uint8)
+        np.maximum.at(self.registers, index, ranks)
+
+    @property
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+
+        # 少ない件数では空のレジスタの数から推定する（Linear Counting）
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    @property
+    def relative_error(self):
+        """推定値の標準誤差（相対値）"""
+        return 1.04 / np.sqrt(len(self.registers))
+
+
+class StreamingProfiler:
+    """
+    チャンクを順に受け取り、データセット全体の統計を計算する
+
+    使い方:
+        profiler = StreamingProfiler()
+        for chunk in iter_csv_chunks(path):
+            profiler.update(chunk)
+        profile = profiler.profile()
+    """
+
+    def __init__(self, seed=None, approximate=False):
+        self.approximate = approximate
+        self.row_count = 0
+        self.columns = []
+        self.dtypes = {}
+        self.missing = {}
+        self.numeric = {}
+        self.distinct = {}
+        self._rng = np.random.default_rng(seed)
+        self.samples = SampleCollector(self._rng)
+        self.insights = InsightCollector()
+
+    def update(self, chunk: pd.DataFrame):
+        """1チャンク分の統計を統合"""
+        if not self.columns:
+            self.columns = list(chunk.columns)
+            self.missing = {col: 0 for col in self.columns}
+
+        # サンプル行を元の行順に並べられるよう、索引をファイル内の通し行番号にする
+        chunk = chunk.set_axis(pd.RangeIndex(self.row_count, self.row_count + len(chunk)))
+        self.row_count += len(chunk)
+
+        for col, dtype in chunk.dtypes.items():
+            self.dtypes[col] = _merge_dtype(self.dtypes.get(col), dtype)
+
+
+        # 列ごとに1回だけ走査し、欠損数と統計を同時に求める
+        categorical_columns = []
+        numeric_values = {}
+        for col in self.columns:
+            series = chunk[col]
+            if not _is_numeric_kind(self.dtypes[col]):
+                # チャンクによって数値でなくなった列は数値の統計を破棄する
+                self.numeric.pop(col, None)
+                self.missing[col] += int(series.isna().sum())
+                if col not in self.distinct:
+                    self.distinct[col] = HyperLogLog() if self.approximate else DistinctAccumulator()
+                self.distinct[col].update(series)
+                categorical_columns.append(col)
+                continue
+
+            values = series.to_numpy(dtype=float, na_value=np.nan)
+            numeric_values[col] = values
+            values = values[~np.isnan(values)]
+            self.missing[col] += len(series) - len(values)
+            self.numeric.setdefault(col, NumericAccumulator(rng=self._rng)).update(values)
+
+        # サンプル行の候補（層別の代表・外れ値・無作為抽出）
+        self.samples.update(chunk, categorical_columns, numeric_values)
+        # 推移・内訳・相関の集計
+        self.insights.update(chunk, categorical_columns, numeric_values)
+
+    def numeric_columns(self):
+        return [col for col in self.columns if col in self.numeric]
+
+    def categorical_columns(self):
+        """文字列・カテゴリの列（数値・日時以外）"""
+        return [
+            col for col in self.columns
+            if col in self.distinct and not _is_datetime_kind(self.dtypes.get(col))
+        ]
+
+    def profile(self):
+        """集計結果を確定してDataProfileを作成"""
+        return DataProfile(self)
+
+    def basic_stats(self):
+        """基本統計情報（profile().to_dict() と同じ）"""
+        return self.profile().to_dict()
+
+    def unique_counts(self):
+        """数値以外の列（文字列・日付）のユニーク値数（上限を超えた列は上限値）"""
+        return {
+            col: self.distinct[col].count
+            for col in self.columns
+            if col in self.distinct
+        }
+
+
+class DataProfile:
+    """
+    データセット全体の統計（StreamingProfiler.profile() で作成）
+
+    四分位数などの統計はここで1回だけ計算し、基本統計（JSON）とAIに渡すサマリーの両方に使う
+    """
+
+    def __init__(self, profiler: StreamingProfiler):
+        self.row_count = profiler.row_count
+        self.columns = list(profiler.columns)
+        self.dtypes = dict(profiler.dtypes)
+        self.missing = dict(profiler.missing)
+        self.numeric_summary = {
+            col: profiler.numeric[col].describe() for col in profiler.numeric_columns()
+        }
+        self.unique_counts = profiler.unique_counts()
+        self.unique_overflowed = {
+            col for col in self.unique_counts if profiler.distinct[col].overflowed
+        }
+        self.approximate = profiler.approximate
+        # 層別の代表・外れ値・無作為抽出の行をトークン数の上限内で選ぶ
+        self.sample_rows = profiler.samples.select(self.numeric_summary)
+        # 推移・内訳・相関・異常の集計と、AIに渡す文章
+        self.insights = profiler.insights.summarize()
+
+        # 近似値の誤差（Analysis.metadata に記録する）
+        self.quantile_errors = {
+            col: profiler.numeric[col].quantile_rank_error()
+            for col in self.numeric_summary
+            if not profiler.numeric[col].is_exact_quantiles
+        }
+        self.distinct_error = next(
+            (accumulator.relative_error for accumulator in profiler.distinct.values() if accumulator.approximate),
+            None
+        )
+
+    def to_dict(self):
+        """基本統計情報（Analysis.metadata の basic_stats）"""
+        return {
+            'row_count': self.row_count,
+            'column_count': len(self.columns),
+            'columns': self.columns,
+            'dtypes': self.dtypes,
+            'missing_values': self.missing,
+            'numeric_summary': self.numeric_summary,
+        }
+
+    def approximation(self):
+        """近似した統計と誤差の範囲"""
+        info = {
+            'mode': 'approximate' if self.approximate else 'exact',
+            'confidence': ERROR_CONFIDENCE,
+            'sample_rows': {'method': 'stratified', 'size': len(self.sample_rows)},
+        }
+        if self.quantile_errors:
+            info['quantiles'] = {
+                'method': 'uniform_sample',
+                'sample_size': QUANTILE_SAMPLE_SIZE,
+                # 順位の誤差の上限（例: 0.01 → 中央値は真の49%〜51%点の間）
+                'rank_error': max(self.quantile_errors.values()),
+                'columns': list(self.quantile_errors),
+            }
+        if self.distinct_error is not None:
+            info['distinct_counts'] = {
+                'method': 'hyperloglog',
+                'precision': HLL_PRECISION,
+                'relative_standard_error': self.distinct_error,
+            }
+        elif self.unique_overflowed:
+            info['distinct_counts'] = {
+                'method': 'exact_with_limit',
+                'limit': DISTINCT_LIMIT,
+                'lower_bound_columns': sorted(map(str, self.unique_overflowed)),
+            }
+        return info
+
+
+def should_approximate(row_count):
+    """近似モードで集計するか（行数はアップロード時の概算値でよい）"""
+    return bool(row_count) and row_count > APPROXIMATE_ROW_THRESHOLD
+
+
+def profile_chunks(chunks, approximate=False):
+    """チャンク（DataFrame）の列を順に集計"""
+    profiler = StreamingProfiler(approximate=approximate)
+    for chunk in chunks:
+        profiler.update(chunk)
+    return profiler
+
+
+def profile_csv(path, encoding='utf-8', chunksize=CSV_CHUNK_ROWS, **read_csv_kwargs):
+    """CSVファイル全体をストリーミングで集計"""
+    chunks = iter_csv_chunks(path, encoding=encoding, chunksize=chunksize, **read_csv_kwargs)
+    return profile_chunks(chunks)
+
+
+def _distinct_values(series):
+    """欠損を除いたユニーク値（category型は使われているカテゴリだけを見る）"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = np.unique(series.cat.codes.to_numpy())
+        return series.cat.categories[codes[codes >= 0]]
+    return pd.unique(series.dropna())
+
+
+def _merge_dtype(current, dtype):
+    """
+    チャンクごとに推論された型を統合
+
+    整数同士（int8 + int16 など）→ int64、整数と小数 → float64、それ以外の不一致 → object
+    """
+    dtype = str(dtype)
+    if current is None or current == dtype:
+        return dtype
+    if _is_numeric_kind(current) and _is_numeric_kind(dtype):
+        return 'int64' if _is_integer_kind(current) and _is_integer_kind(dtype) else 'float64'
+    return 'object'
+
+
+@functools.lru_cache(maxsize=None)
+def _is_numeric_kind(dtype):
+    """数値型か（型名で判定。describe()と同じく真偽値は含めない）"""
+    try:
+        dtype = pd.api.types.pandas_dtype(dtype)
+    except TypeError:
+        return False
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+@functools.lru_cache(maxsize=None)
+def _is_integer_kind(dtype):
+    try:
+        return pd.api.types.is_integer_dtype(pd.api.types.pandas_dtype(dtype))
+    except TypeError:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _is_datetime_kind(dtype):
+    try:
+        return pd.api.types.is_datetime64_any_dtype(pd.api.types.pandas_dtype(dtype))
+    except TypeError:
+        return False
+
+
+def _to_float(value):
+    return float(value) if value is not None else None
@@ -0,0 +1,247 @@
+"""
+AIに渡すサンプル行の抽出
+
+先頭の数行（日付やID順に並んだ偏った範囲）ではなく、ファイル全体から
+- 層別: ユニーク値の少ない列の値ごとに代表行
+- 外れ値: 数値列の最大値・最小値のうち平均から大きく外れた行
+- 無作為: 全体から一様に抽出した行
+を集め、トークン数の上限に収まるだけ選ぶ。候補は集計と同時にチャンク単位で集める。
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# サンプル行に使うトークン数の上限（概算）
+SAMPLE_TOKEN_BUDGET = 1500
+
+# サンプル行数の上限
+MAX_SAMPLE_ROWS = 30
+
+# 無作為抽出の候補として保持する行数
+CANDIDATE_POOL_ROWS = 1000
+
+# 層別に使う列のユニーク値数の上限（超えた列は層別に使わない）
+MAX_STRATA = 20
+
+# 外れ値と見なす平均からの距離（標準偏差の倍数）
+OUTLIER_Z = 3.0
+
+# 外れ値として含める行数の上限
+MAX_OUTLIER_ROWS = 5
+
+# サンプル行に付ける抽出理由の列名
+REASON_COLUMN = '（抽出理由）'
+
+
+def estimate_tokens(text):
+    """トークン数の概算（日本語などの非ASCII文字は1文字≒1トークン、ASCIIは4文字≒1トークン）"""
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return non_ascii + (len(text) - non_ascii) / 4
+
+
+class RowReservoir:
+    """ファイル全体から一様に行を抽出する（乱数キーの小さい順に size 行を残す）"""
+
+    def __init__(self, size, rng):
+        self.size = size
+        self._rng = rng
+        self.rows = None
+        self._keys = np.empty(0)
+        self._key_threshold = 1.0
+
+    def update(self, chunk: pd.DataFrame):
+        if not self.size or not len(chunk):
+            return
+
+        keys = self._rng.random(len(chunk))
+        candidates = keys < self._key_threshold
+        if not candidates.any():
+            return
+
+        rows = chunk[candidates]
+        keys = np.concatenate([self._keys, keys[candidates]])
+        rows = rows if self.rows is None else pd.concat([self.rows, rows])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            rows, keys = rows.iloc[keep], keys[keep]
+            self._key_threshold = float(keys.max())
+        self.rows, self._keys = rows, keys
+
+    def sample(self):
+        """抽出した行（乱数キーの順 = 無作為な順）"""
+        if self.rows is None:
+            return pd.DataFrame()
+        return self.rows.iloc[np.argsort(self._keys, kind='stable')]
+
+
+class SampleCollector:
+    """
+    チャンクを順に受け取り、サンプル行の候補を集める
+
+    チャンクの索引はファイル内の通し行番号にしておく（StreamingProfilerが付け直す）。
+    層別・外れ値の候補は行番号だけを記録し、行の取り出しはチャンクごとに1回にまとめる。
+    """
+
+    def __init__(self, rng, pool_rows=CANDIDATE_POOL_ROWS, max_strata=MAX_STRATA):
+        self.max_strata = max_strata
+        self.pool = RowReservoir(pool_rows, rng)
+        # 層別の候補: 列 → 値ごとの件数 / 値ごとの最初の行番号
+        self.strata_counts = {}
+        self.strata_first = {}
+        self._dropped_strata = set()
+        # 外れ値の候補: 列 → {'min': (値, 行番号), 'max': (値, 行番号)}
+        self.extremes = {}
+        # 候補の行（索引は行番号）
+        self.rows = None
+
+    def update(self, chunk: pd.DataFrame, categorical_columns, numeric_values):
+        """
+        1チャンク分の候補を更新
+
+        Args:
+            categorical_columns: 層別の候補にする列
+            numeric_values: 数値列 → 値（float64、欠損はNaN。chunkと同じ行順）
+        """
+        self.pool.update(chunk)
+
+        positions = set()
+        for col in categorical_columns:
+            positions.update(self._update_strata(chunk, col))
+        for col, values in numeric_values.items():
+            positions.update(self._update_extremes(chunk, col, values))
+
+        if positions:
+            rows = chunk.iloc[sorted(positions)]
+            self.rows = rows if self.rows is None else pd.concat([self.rows, rows])
+
+    def _update_strata(self, chunk, col):
+        """値ごとの件数と最初の行を記録し、新しく必要になった行の位置を返す"""
+        if col in self._dropped_strata:
+            return []
+
+        series = chunk[col]
+        counts = series.value_counts(dropna=True)
+        counts = counts[counts > 0]
+        if col in self.strata_counts:
+            counts = counts.add(self.strata_counts[col], fill_value=0)
+        if len(counts) > self.max_strata:
+            # ユニーク値が多い列は層別に使わない
+            self._dropped_strata.add(col)
+            self.strata_counts.pop(col, None)
+            self.strata_first.pop(col, None)
+            return []
+        self.strata_counts[col] = counts
+
+        first = self.strata_first.setdefault(col, {})
+        is_new = ~series.duplicated() & series.notna() & ~series.isin(list(first))
+        new_positions = np.flatnonzero(is_new.to_numpy())
+        for position in new_positions:
+            first[series.iat[position]] = chunk.index[position]
+        return new_positions.tolist()
+
+    def _update_extremes(self, chunk, col, values):
+        """最大値・最小値を更新し、新しく必要になった行の位置を返す"""
+        valid = np.flatnonzero(~np.isnan(values))
+        if not len(valid):
+            return []
+
+        current = self.extremes.setdefault(col, {})
+        positions = {'min': valid[values[valid].argmin()], 'max': valid[values[valid].argmax()]}
+        updated = []
+        for kind, position in positions.items():
+            value = float(values[position])
+            if kind not in current or (value < current[kind][0] if kind == 'min' else value > current[kind][0]):
+                current[kind] = (value, chunk.index[position])
+                updated.append(position)
+        return updated
+
+    def select(self, numeric_summary, token_budget=SAMPLE_TOKEN_BUDGET, max_rows=MAX_SAMPLE_ROWS):
+        """
+        候補からサンプル行を選ぶ（層別の代表 → 外れ値 → 無作為 の優先順）
+
+        Args:
+            numeric_summary: 列ごとのdescribe()形式の統計（外れ値の判定に使う）
+
+        Returns:
+            DataFrame: 元の行順に並べたサンプル行（抽出理由の列付き）
+        """
+        candidates = [
+            self._stratum_representatives(),
+            self._outliers(numeric_summary),
+            _with_reason(self.pool.sample(), '無作為抽出'),
+        ]
+        candidates = [rows for rows in candidates if len(rows)]
+        if not candidates:
+            return pd.DataFrame()
+
+        combined = pd.concat(candidates)
+        combined = combined[~combined.index.duplicated(keep='first')].head(max_rows)
+
+        # 行ごとのトークン数を概算し、上限に収まる分だけ優先順に残す
+        row_texts = combined.astype(str).agg(' '.join, axis=1)
+        header_tokens = estimate_tokens(' '.join(map(str, combined.columns)))
+        row_tokens = np.fromiter((estimate_tokens(text) for text in row_texts), dtype=float, count=len(row_texts))
+        within_budget = header_tokens + np.cumsum(row_tokens) <= token_budget
+        # 1行も収まらない場合でも、最も優先度の高い1行は含める
+        within_budget[0] = True
+
+        return combined[within_budget].sort_index(kind='stable')
+
+    def _strata_column(self):
+        """層別に使う列（上限以内で最もユニーク値の多い列）"""
+        candidates = {col: len(counts) for col, counts in self.strata_counts.items() if len(counts) >= 2}
+        if not candidates:
+            return None
+        return max(candidates, key=candidates.get)
+
+    def _stratum_representatives(self):
+        """層別の列の値ごとに1行（無作為抽出の候補にあればそれを、なければ最初に現れた行）"""
+        col = self._strata_column()
+        if col is None:
+            return pd.DataFrame()
+
+        counts = self.strata_counts[col].sort_values(ascending=False)
+        pool = self.pool.sample()
+        from_pool = pool.dropna(subset=[col]).drop_duplicates(subset=[col])
+        in_pool = set(from_pool[col])
+        first_labels = [label for value, label in self.strata_first[col].items() if value not in in_pool]
+        rows = pd.concat([from_pool, self.rows.loc[first_labels]]) if first_labels else from_pool
+
+        # 件数の多い値から順に並べる
+        order = pd.Series(range(len(counts)), index=counts.index)
+        rows = rows.iloc[np.argsort(rows[col].astype(object).map(order).to_numpy(dtype=float), kind='stable')]
+
+        total = counts.sum()
+        reasons = [f"{col}={value}の代表（{counts[value] / total:.0%}）" for value in rows[col]]
+        return _with_reason(rows, reasons)
+
+    def _outliers(self, numeric_summary):
+        """平均から OUTLIER_Z 標準偏差以上離れた最大値・最小値の行（離れている順）"""
+        found = []
+        for col, extremes in self.extremes.items():
+            stats = numeric_summary.get(col)
+            if not stats or not stats.get('std'):
+                continue
+            for kind, (value, label) in extremes.items():
+                z = (value - stats['mean']) / stats['std']
+                if abs(z) >= OUTLIER_Z:
+                    name = '最大' if kind == 'max' else '最小'
+                    found.append((abs(z), label, f"{col}が{name}（平均{z:+.1f}σ）"))
+
+        if not found:
+            return pd.DataFrame()
+
+        found.sort(key=lambda item: item[0], reverse=True)
+        found = found[:MAX_OUTLIER_ROWS]
+        rows = self.rows.loc[[label for _, label, _ in found]]
+        return _with_reason(rows, [reason for _, _, reason in found])
+
+
+def _with_reason(rows, reasons):
+    if not len(rows):
+        return rows
+    return rows.assign(**{REASON_COLUMN: reasons})
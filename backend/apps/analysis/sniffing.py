@@ -0,0 +1,212 @@
+"""
+CSVファイルの事前調査
+
+ファイル全体を解析せずに、文字コード・区切り文字・見出し行の有無、行数や列数を取得する。
+行数を数える際にファイルのハッシュ値も求める（同じ内容のファイルの分析結果を再利用する）。
+結果はCSVUploadに保存し、以降の読み込みは正しい設定で1回だけ行う。
+"""
+import codecs
+import csv
+import hashlib
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 判定に使う先頭のバイト数
+SAMPLE_BYTES = 64 * 1024
+
+# 先頭がASCIIのみで文字コードを判定できない場合に読み進める上限
+MAX_ENCODING_SCAN_BYTES = 8 * 1024 * 1024
+
+# 判定する文字コード（優先順）。cp932はshift_jisの上位互換（①や㈱などを含む）
+CANDIDATE_ENCODINGS = ['utf-8', 'cp932', 'shift_jis']
+
+# 区切り文字の候補
+CANDIDATE_DELIMITERS = ',\t;|'
+
+# 区切り文字・見出し行の判定に使う行数
+SNIFF_LINES = 20
+
+
+def count_lines(file, digest=None):
+    """
+    改行の数を数えて行数を取得（バイト単位で読むだけで解析はしない）
+
+    最終行が改行で終わっていない場合も1行と数える。
+    引用符内の改行も数えるため、正確な行数は分析時に書き戻す。
+
+    Args:
+        digest: 指定した場合は読んだバイト列でハッシュを更新する（hashlibのオブジェクト）
+    """
+    file.seek(0)
+    lines = 0
+    last_byte = b'\n'
+    for chunk in file.chunks():
+        lines += chunk.count(b'\n')
+        if digest is not None:
+            digest.update(chunk)
+        if chunk:
+            last_byte = chunk[-1:]
+    if last_byte != b'\n':
+        lines += 1
+    file.seek(0)
+    return lines
+
+
+def hash_file(file):
+    """ファイル内容のSHA-256（16進数）"""
+    digest = hashlib.sha256()
+    count_lines(file, digest)
+    return digest.hexdigest()
+
+
+def normalize_encoding(name):
+    """文字コード名を正規化（例: 'Shift-JIS' → 'shift_jis'）。不明な場合はNone"""
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+
+def get_candidate_encodings(allowed_encodings=None):
+    """判定対象の文字コード（SystemSettings.allowed_csv_encodings が設定されていれば絞り込む）"""
+    allowed = {normalize_encoding(name) for name in (allowed_encodings or [])} - {None}
+    if not allowed:
+        return list(CANDIDATE_ENCODINGS)
+    candidates = [encoding for encoding in CANDIDATE_ENCODINGS if encoding in allowed]
+    # 候補以外の許可された文字コードは最後に試す
+    candidates += sorted(allowed - set(candidates) - {'utf-8-sig'})
+    return candidates or list(CANDIDATE_ENCODINGS)
+
+
+def detect_encoding(file, allowed_encodings=None):
+    """
+    先頭のバイト列から文字コードを判定
+
+    BOM付きはutf-8-sig。先頭がASCIIのみの場合は非ASCIIのバイトが現れるまで読み進める。
+
+    Returns:
+        str: 文字コード（いずれでもデコードできない場合は最初の候補）
+    """
+    candidates = get_candidate_encodings(allowed_encodings)
+
+    file.seek(0)
+    sample = file.read(SAMPLE_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        file.seek(0)
+        return 'utf-8-sig'
+
+    scanned = len(sample)
+    while sample.isascii() and scanned < MAX_ENCODING_SCAN_BYTES:
+        block = file.read(SAMPLE_BYTES)
+        if not block:
+            break
+        scanned += len(block)
+        if not block.isascii():
+            sample = block
+    file.seek(0)
+
+    if sample.isascii():
+        return candidates[0]
+
+    for encoding in candidates:
+        # サンプルの末尾で途切れた文字はエラーにしない
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+
+    logger.warning(f"CSVの文字コードを判定できませんでした（{', '.join(candidates)}）")
+    return candidates[0]
+
+
+def sniff_dialect(text):
+    """
+    先頭の数行から区切り文字と見出し行の有無を判定
+
+    見出し行は「あり」を既定とし、明らかにデータ行と判断できる場合だけ「なし」とする
+    （csv.Sniffer.has_header は文字列だけの見出しを見出しと判定できないことがあるため）。
+
+    Returns:
+        tuple: (区切り文字, 見出し行があるか)
+    """
+    lines = text.splitlines()[:SNIFF_LINES]
+    # 最終行は途中で途切れている可能性があるため、十分な行数があれば除く
+    if len(lines) > 2:
+        lines = lines[:-1]
+    sample = '\n'.join(lines)
+    if not sample.strip():
+        return ',', True
+
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=CANDIDATE_DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ','
+
+    rows = list(csv.reader(io.StringIO(sample), delimiter=delimiter))
+    return delimiter, not _first_row_is_data(rows)
+
+
+def _first_row_is_data(rows):
+    """
+    先頭行がデータ行か（見出し行がないか）
+
+    2行目以降がすべて数値の列（数値列）が1つ以上あり、そのすべてで先頭行も数値の場合だけデータ行とする。
+    数値列の先頭が文字列なら見出し行と判断する。
+    """
+    if len(rows) < 3:
+        return False
+    first, body = rows[0], rows[1:]
+
+    numeric_columns = [
+        index for index in range(len(first))
+        if all(index < len(row) and _is_number(row[index]) for row in body)
+    ]
+    if not numeric_columns:
+        return False
+    return all(_is_number(first[index]) for index in numeric_columns)
+
+
+def _is_number(value):
+    try:
+        float(value.replace(',', ''))
+        return True
+    except ValueError:
+        return False
+
+
+def sniff_csv(file, allowed_encodings=None):
+    """
+    文字コード・区切り文字・見出し行の有無と、行数・列数を判定
+
+    Returns:
+        dict: encoding / delimiter / has_header / row_count / column_count / content_hash
+    """
+    encoding = detect_encoding(file, allowed_encodings)
+
+    file.seek(0)
+    sample = file.read(SAMPLE_BYTES)
+    file.seek(0)
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=False)
+
+    delimiter, has_header = sniff_dialect(text)
+    first_line = text.splitlines()[0] if text else ''
+    columns = next(csv.reader(io.StringIO(first_line), delimiter=delimiter), [])
+
+    # 行数を数えながらハッシュ値も求める（ファイルの読み込みは1回）
+    digest = hashlib.sha256()
+    lines = count_lines(file, digest)
+    if not columns:
+        lines = 0
+    return {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'has_header': has_header,
+        'row_count': max(lines - 1, 0) if has_header else lines,
+        'column_count': len(columns),
+        'content_hash': digest.hexdigest(),
+    }
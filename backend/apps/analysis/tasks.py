@@ -1,18 +1,31 @@
 """
 CSV分析の非同期タスク
 """
+import hashlib
+import json
 import logging
 import pandas as pd
 from celery import shared_task
 from openai import OpenAI
 from django.conf import settings
+from django.utils import timezone
 
 from .models import CSVUpload, Analysis
-from apps.core.utils import get_openai_api_key, is_ai_enabled
+from .columnar import delete_parquet, iter_upload_chunks
+from .profiling import DataProfile, profile_chunks, should_approximate
+from apps.core.utils import get_active_prompt_template, get_openai_api_key, is_ai_enabled
+from apps.core.llm import create_chat_completion
 
 logger = logging.getLogger(__name__)
 
 
+# 分析に使うモデル
+ANALYSIS_MODEL = 'gpt-4o'
+
+# 再利用できるか確認する分析結果の件数の上限（同じ内容のファイルの新しい順）
+REUSE_CANDIDATES = 20
+
+
 @shared_task(bind=True, max_retries=3)
 def analyze_csv_data(self, csv_upload_id: int, analysis_prompt: str = None):
     """
@@ -27,20 +40,33 @@ def analyze_csv_data(self, csv_upload_id: int, analysis_prompt: str = None):
         
         logger.info(f"Analyzing CSV #{csv_upload_id}: {csv_upload.file_name}")
         
-        # 1. CSVファイルを読み込み
-        try:
-            df = pd.read_csv(csv_upload.file.path, encoding='utf-8')
-        except UnicodeDecodeError:
-            # UTF-8で失敗した場合はShift-JISで試す
-            df = pd.read_csv(csv_upload.file.path, encoding='shift-jis')
+        # 1. データをチャンク単位で読み込んで集計（ファイル全体はメモリに載せない）
+        # 初回はCSVをParquetに変換し、再分析ではParquetをメモリマップで読む
+        # 統計は1回だけ計算し、基本統計とサマリーの両方に使う
+        # 行数の多いファイルはユニーク値数・サンプル行を近似で求める
+        approximate = should_approximate(csv_upload.row_count)
+        profile = profile_chunks(iter_upload_chunks(csv_upload), approximate=approximate).profile()
         
-        logger.info(f"CSV loaded: {len(df)} rows, {len(df.columns)} columns")
+        logger.info(
+            f"CSV loaded: {profile.row_count} rows, {len(profile.columns)} columns "
+            f"(source={'parquet' if csv_upload.parquet_file else 'csv'}, approximate={approximate})"
+        )
+        
+        # アップロード時の概算値を正確な値で書き戻す
+        CSVUpload.objects.filter(id=csv_upload_id).update(
+            row_count=profile.row_count,
+            column_count=len(profile.columns)
+        )
         
         # 2. 基本統計情報を取得
-        basic_stats = _get_basic_statistics(df)
+        basic_stats = _get_basic_statistics(profile)
         
         # 3. データサマリーを作成（AIに渡す用）
-        data_summary = _create_data_summary(df)
+        data_summary = _create_data_summary(profile)
+        
+        # 実際に送るプロンプト（同じファイル・プロンプトの分析結果の再利用に、その文面のハッシュを記録する）
+        prompt = build_analysis_prompt(data_summary, basic_stats, analysis_prompt)
+        prompt_hash = get_prompt_hash(prompt)
         
         # 4. AI機能の確認
         if not is_ai_enabled():
@@ -48,42 +74,28 @@ def analyze_csv_data(self, csv_upload_id: int, analysis_prompt: str = None):
             # AI分析なしで保存
             analysis = Analysis.objects.create(
                 csv_upload=csv_upload,
-                analysis_result={
-                    'statistics': basic_stats,
+                prompt=analysis_prompt or '',
+                prompt_hash=prompt_hash,
+                result='AI機能が無効のため、分析は実行されませんでした。',
+                metadata={
+                    'basic_stats': basic_stats,
+                    'approximation': profile.approximation(),
+                    'insights': profile.insights,
                     'summary': data_summary,
-                    'ai_analysis': 'AI機能が無効のため、分析は実行されませんでした。'
                 },
-                status='completed'
+                status='completed',
+                created_by=csv_upload.uploaded_by,
+                completed_at=timezone.now()
             )
             return analysis.id
         
         # 4. AIで分析実行
         client = OpenAI(api_key=get_openai_api_key())
         
-        # システム設定からプロンプトテンプレートを取得
-        from apps.core.models import PromptTemplate
-        
-        if analysis_prompt:
-            prompt = analysis_prompt
-        else:
-            try:
-                template = PromptTemplate.objects.filter(
-                    template_type='csv_analysis',
-                    is_active=True
-                ).order_by('-version').first()
-                
-                if template:
-                    prompt = template.prompt_text.format(
-                        data_summary=data_summary,
-                        basic_stats=basic_stats
-                    )
-                else:
-                    prompt = _get_default_analysis_prompt(data_summary, basic_stats)
-            except:
-                prompt = _get_default_analysis_prompt(data_summary, basic_stats)
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
+        response = create_chat_completion(
+            client,
+            'csv_analysis',
+            model=ANALYSIS_MODEL,
             messages=[
                 {
                     "role": "system",
@@ -103,15 +115,22 @@ def analyze_csv_data(self, csv_upload_id: int, analysis_prompt: str = None):
         # 5. Analysisレコードを作成
         analysis = Analysis.objects.create(
             csv_upload=csv_upload,
-            analysis_result=analysis_result,
+            prompt=prompt,
+            prompt_hash=prompt_hash,
+            result=analysis_result,
+            model_used=ANALYSIS_MODEL,
+            token_count=response.usage.total_tokens,
+            # 行数・列数・列名は basic_stats に含まれる
+            # summary は再利用の判定でプロンプトを組み立て直すために保存する
             metadata={
-                'row_count': len(df),
-                'column_count': len(df.columns),
-                'columns': list(df.columns),
                 'basic_stats': basic_stats,
-                'model_used': 'gpt-4o'
+                'approximation': profile.approximation(),
+                'insights': profile.insights,
+                'summary': data_summary,
             },
-            analyzed_by=csv_upload.uploaded_by
+            status='completed',
+            created_by=csv_upload.uploaded_by,
+            completed_at=timezone.now()
         )
         
         logger.info(f"Analysis completed: #{analysis.id}")
@@ -131,28 +150,95 @@ def analyze_csv_data(self, csv_upload_id: int, analysis_prompt: str = None):
         raise self.retry(exc=e, countdown=60 * (self.request.retries + 1))
 
 
-def _get_basic_statistics(df: pd.DataFrame) -> dict:
+def build_analysis_prompt(data_summary: str, basic_stats: dict, analysis_prompt: str = None) -> str:
     """
-    データフレームから基本統計情報を抽出
+    AIに送る分析プロンプト
+    
+    カスタムプロンプト → 有効なプロンプトテンプレート（csv_analysis）→ デフォルトのプロンプト の順に使う。
     """
-    stats = {
-        'row_count': len(df),
-        'column_count': len(df.columns),
-        'columns': list(df.columns),
-        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
-        'missing_values': df.isnull().sum().to_dict(),
-        'numeric_summary': {}
-    }
+    if analysis_prompt:
+        return analysis_prompt
     
-    # 数値列の統計
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    if len(numeric_cols) > 0:
-        stats['numeric_summary'] = df[numeric_cols].describe().to_dict()
+    try:
+        template = get_active_prompt_template('csv_analysis')
+        if template:
+            from django.template import Context
+            return template.get_compiled_template().render(Context({
+                'data_summary': data_summary,
+                # 保存・再読み込みでキーの順序が変わっても同じ文面になるよう整列する
+                'basic_stats': json.dumps(basic_stats, ensure_ascii=False, sort_keys=True, default=str),
+            }, autoescape=False))
+    except Exception as e:
+        logger.warning(f"CSV解析のプロンプトテンプレートを使えません: {e}")
     
-    return stats
+    return _get_default_analysis_prompt(data_summary, basic_stats)
+
 
+def get_prompt_hash(prompt: str) -> str:
+    """プロンプトの文面のハッシュ"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
 
-def _create_data_summary(df: pd.DataFrame, max_rows: int = 10) -> str:
+
+def find_reusable_analysis(csv_upload: CSVUpload, analysis_prompt: str = None):
+    """
+    同じ内容のファイル・同じプロンプト・同じモデルで完了済みの分析結果を取得
+    
+    ファイル名やアップロードが異なっても、内容のハッシュが同じなら再利用する。
+    プロンプトは候補の分析結果に保存したサマリーから今回送る文面を組み立て直し、そのハッシュで比べる。
+    AI機能が無効な間に作成された結果（モデルなし）は対象にしない。
+    
+    Returns:
+        Analysis: 最新の分析結果（なければNone）
+    """
+    candidates = Analysis.objects.filter(
+        csv_upload__content_hash=csv_upload.get_content_hash(),
+        model_used=ANALYSIS_MODEL,
+        status='completed'
+    ).exclude(prompt_hash='').order_by('-completed_at')[:REUSE_CANDIDATES]
+    
+    for candidate in candidates:
+        data_summary = candidate.metadata.get('summary')
+        if data_summary is None:
+            continue
+        prompt = build_analysis_prompt(data_summary, candidate.metadata.get('basic_stats', {}), analysis_prompt)
+        if get_prompt_hash(prompt) == candidate.prompt_hash:
+            return candidate
+    return None
+
+
+def reuse_analysis(existing: Analysis, csv_upload: CSVUpload, user) -> Analysis:
+    """
+    再利用する分析結果を、今回のアップロード・実行者の分析結果として複製する
+    
+    同じアップロード・実行者の分析結果であればそのまま返す。AIは呼ばないため使用トークン数は0とする。
+    """
+    if existing.csv_upload_id == csv_upload.id and existing.created_by_id == user.id:
+        return existing
+    
+    return Analysis.objects.create(
+        csv_upload=csv_upload,
+        prompt=existing.prompt,
+        prompt_hash=existing.prompt_hash,
+        result=existing.result,
+        model_used=existing.model_used,
+        token_count=0,
+        metadata={**existing.metadata, 'reused_from': existing.id},
+        status='completed',
+        created_by=user,
+        completed_at=timezone.now()
+    )
+
+
+def _get_basic_statistics(profile: DataProfile) -> dict:
+    """
+    集計結果から基本統計情報を抽出
+    
+    numeric_summary はdescribe()と同じ形式（四分位数は大きなファイルではサンプルからの近似値）
+    """
+    return profile.to_dict()
+
+
+def _create_data_summary(profile: DataProfile) -> str:
     """
     AIに渡すためのデータサマリーを作成
     """
@@ -160,30 +246,41 @@ def _create_data_summary(df: pd.DataFrame, max_rows: int = 10) -> str:
     
     # 列情報
     summary_parts.append(f"【データ概要】")
-    summary_parts.append(f"- 行数: {len(df)}")
-    summary_parts.append(f"- 列数: {len(df.columns)}")
-    summary_parts.append(f"- 列名: {', '.join(df.columns)}")
+    summary_parts.append(f"- 行数: {profile.row_count}")
+    summary_parts.append(f"- 列数: {len(profile.columns)}")
+    summary_parts.append(f"- 列名: {', '.join(map(str, profile.columns))}")
     summary_parts.append("")
     
-    # サンプルデータ（最初の数行）
-    summary_parts.append(f"【サンプルデータ（最初の{min(max_rows, len(df))}行）】")
-    summary_parts.append(df.head(max_rows).to_string())
+    # 全行から計算した推移・内訳・相関・異常（AIに推測させず、集計済みの値を渡す）
+    if profile.insights['facts']:
+        summary_parts.append("【集計結果（全行から計算）】")
+        for fact in profile.insights['facts']:
+            summary_parts.append(f"- {fact}")
+        summary_parts.append("")
+    
+    # サンプルデータ（先頭ではなく、値の種類・外れ値・無作為抽出から選んだ行。左端は元の行番号）
+    summary_parts.append(f"【サンプルデータ（全体から選んだ代表的な{len(profile.sample_rows)}行）】")
+    summary_parts.append(profile.sample_rows.to_string())
     summary_parts.append("")
     
     # 数値列の統計
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    if len(numeric_cols) > 0:
+    if profile.numeric_summary:
         summary_parts.append("【数値列の基本統計】")
-        summary_parts.append(df[numeric_cols].describe().to_string())
+        summary_parts.append(pd.DataFrame(profile.numeric_summary).to_string())
+        if profile.quantile_errors:
+            summary_parts.append("※四分位数はサンプルからの推定値です")
         summary_parts.append("")
     
     # カテゴリ列のユニーク値数
-    categorical_cols = df.select_dtypes(include=['object']).columns
-    if len(categorical_cols) > 0:
+    if profile.unique_counts:
         summary_parts.append("【カテゴリ列のユニーク値数】")
-        for col in categorical_cols:
-            unique_count = df[col].nunique()
-            summary_parts.append(f"- {col}: {unique_count}種類")
+        for col, unique_count in profile.unique_counts.items():
+            if profile.distinct_error is not None:
+                summary_parts.append(f"- {col}: 約{unique_count}種類")
+            elif col in profile.unique_overflowed:
+                summary_parts.append(f"- {col}: {unique_count}種類以上")
+            else:
+                summary_parts.append(f"- {col}: {unique_count}種類")
         summary_parts.append("")
     
     return '\n'.join(summary_parts)
@@ -264,6 +361,7 @@ def cleanup_old_csv_files():
     for upload in old_uploads:
         if upload.file:
             upload.file.delete()
+        delete_parquet(upload)
     
     # レコードを削除
     old_uploads.delete()
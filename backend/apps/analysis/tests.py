@@ -0,0 +1,46 @@
+"""
+CSV分析のテスト
+"""
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from .columnar import convert_csv_to_parquet, iter_parquet_chunks
+from .profiling import iter_csv_chunks
+
+
+HEADERLESS_CSV = (
+    "2024-01-01,東京,120,3.5\n"
+    "2024-01-02,大阪,98,2.25\n"
+    "2024-01-03,東京,143,4.0\n"
+)
+
+
+class HeaderlessColumnNamesTests(SimpleTestCase):
+    """ヘッダー行のないCSVは、Parquet経由でもCSVから直接でも同じ列名で読み込まれる"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.csv_path = self.tmp_dir / 'headerless.csv'
+        self.csv_path.write_text(HEADERLESS_CSV, encoding='utf-8')
+        self.parquet_path = self.tmp_dir / 'headerless.parquet'
+        convert_csv_to_parquet(self.csv_path, self.parquet_path, header=None)
+
+    def test_both_paths_use_the_same_column_names(self):
+        parquet_df = next(iter_parquet_chunks(self.parquet_path))
+        csv_df = next(iter_csv_chunks(self.csv_path, header=None))
+
+        self.assertEqual(list(parquet_df.columns), ['0', '1', '2', '3'])
+        self.assertEqual(list(csv_df.columns), list(parquet_df.columns))
+        self.assertEqual(csv_df['2'].tolist(), parquet_df['2'].tolist())
+
+    def test_both_paths_select_columns_by_the_same_names(self):
+        parquet_df = next(iter_parquet_chunks(self.parquet_path, columns=['1', '3']))
+        csv_df = next(iter_csv_chunks(self.csv_path, header=None, usecols=['1', '3']))
+
+        self.assertEqual(list(csv_df.columns), ['1', '3'])
+        self.assertEqual(list(csv_df.columns), list(parquet_df.columns))
+        self.assertEqual(csv_df['3'].tolist(), parquet_df['3'].tolist())
@@ -13,7 +13,7 @@ from .serializers import (
     AnalysisListSerializer,
     AnalysisRequestSerializer
 )
-from .tasks import analyze_csv_data
+from .tasks import analyze_csv_data, find_reusable_analysis, reuse_analysis
 
 
 class CSVUploadViewSet(viewsets.ModelViewSet):
@@ -36,19 +36,21 @@ class CSVUploadViewSet(viewsets.ModelViewSet):
         """
         csv_upload = self.get_object()
         
-        # 既に分析済みかチェック
-        if hasattr(csv_upload, 'analysis') and csv_upload.analysis:
-            return Response(
-                {
-                    'message': '既に分析済みです',
-                    'analysis_id': csv_upload.analysis.id
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         # カスタムプロンプト（オプション）
         custom_prompt = request.data.get('custom_prompt', None)
         
+        # 同じ内容のファイル・プロンプトの分析結果があれば、新しく分析せずに返す
+        existing = find_reusable_analysis(csv_upload, custom_prompt)
+        if existing:
+            # 他のアップロード・ユーザーの結果は、このアップロードの分析結果として複製する
+            analysis = reuse_analysis(existing, csv_upload, request.user)
+            return Response({
+                'message': '同じファイル・プロンプトの分析結果があります',
+                'analysis_id': analysis.id,
+                'csv_upload_id': csv_upload.id,
+                'result': analysis.result
+            }, status=status.HTTP_200_OK)
+        
         # 分析開始
         task = analyze_csv_data.delay(csv_upload.id, custom_prompt)
         
@@ -63,7 +65,7 @@ class AnalysisViewSet(viewsets.ReadOnlyModelViewSet):
     """
     分析結果のViewSet（読み取り専用）
     """
-    queryset = Analysis.objects.select_related('csv_upload', 'analyzed_by').all().order_by('-analyzed_at')
+    queryset = Analysis.objects.select_related('csv_upload', 'created_by').all().order_by('-created_at')
     permission_classes = [IsAuthenticated]
     
     def get_serializer_class(self):
@@ -90,6 +92,18 @@ class AnalysisViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
+        # 同じ内容のファイル・プロンプトの分析結果があれば、新しく分析せずに返す
+        existing = find_reusable_analysis(csv_upload, custom_prompt)
+        if existing:
+            # 他のアップロード・ユーザーの結果は、このアップロードの分析結果として複製する
+            analysis = reuse_analysis(existing, csv_upload, request.user)
+            return Response({
+                'message': '同じファイル・プロンプトの分析結果があります',
+                'analysis_id': analysis.id,
+                'csv_upload_id': csv_upload.id,
+                'result': analysis.result
+            }, status=status.HTTP_200_OK)
+        
         # 分析開始
         task = analyze_csv_data.delay(csv_upload_id, custom_prompt)
         
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Company
+from .models import Company, CompanyRefreshRun
 
 
 @admin.register(Company)
@@ -7,7 +7,8 @@ class CompanyAdmin(admin.ModelAdmin):
     list_display = ['company_name', 'domain', 'industry', 'scrape_status', 'scraped_at']
     list_filter = ['industry', 'scrape_status', 'scraped_at']
     search_fields = ['company_name', 'domain', 'url']
-    readonly_fields = ['scraped_at', 'created_at']
+    readonly_fields = ['scraped_at', 'created_at', 'main_content', 'http_etag', 'http_last_modified',
+                       'content_hash', 'page_snapshots']
     date_hierarchy = 'created_at'
     
     fieldsets = (
@@ -22,10 +23,36 @@ class CompanyAdmin(admin.ModelAdmin):
                       'pain_points', 'ai_summary'),
             'classes': ('collapse',)
         }),
+        ('更新判定', {
+            'fields': ('http_etag', 'http_last_modified', 'content_hash', 'page_snapshots'),
+            'classes': ('collapse',)
+        }),
     )
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         # 営業マネージャー以上は全て閲覧可能
-        return qs
+        # 一覧では大きな列を読まない（詳細画面では必要になった時点で読み込まれる）
+        return qs.defer('meta_description', 'business_description', 'target_market',
+                        'ai_summary', 'pain_points', 'page_snapshots')
+
+
 
+@admin.register(CompanyRefreshRun)
+class CompanyRefreshRunAdmin(admin.ModelAdmin):
+    """企業情報の定期更新の実行記録（閲覧のみ）"""
+    list_display = ['started_at', 'stale_count', 'enqueued_count', 'skipped_count',
+                    'success_count', 'unchanged_count', 'insufficient_count', 'failed_count',
+                    'throughput_display', 'finished_at']
+    date_hierarchy = 'started_at'
+    
+    def throughput_display(self, obj):
+        throughput = obj.throughput_per_minute
+        return f"{throughput}件/分" if throughput is not None else '-'
+    throughput_display.short_description = 'スループット'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
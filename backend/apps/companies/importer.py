@@ -0,0 +1,168 @@
+"""
+企業URLの一括インポート
+
+CSVまたはURLのリストから企業を一括登録する。
+ドメインを正規化して、ファイル内・登録済みの企業との重複を除いた上で bulk_create する。
+"""
+import csv
+import io
+import logging
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.utils import timezone
+
+from .scraper import normalize_domain
+
+logger = logging.getLogger(__name__)
+
+
+# 1回のインポートで受け付けるURL数の上限
+MAX_IMPORT_URLS = 20000
+
+# bulk_create・重複チェックの1回あたりの件数
+IMPORT_BATCH_SIZE = 1000
+
+# CSVでURLの列と見なす見出し
+URL_COLUMN_NAMES = ['url', 'urls', 'website', 'homepage', 'ホームページ', 'webサイト', 'サイトurl', '企業url', 'url(企業)']
+
+# 結果に含める不正なURLの件数の上限
+MAX_REPORTED_INVALID = 100
+
+# スキームなしのURL（例: example.co.jp/about）
+BARE_URL_PATTERN = re.compile(r'^[a-z0-9\-]+(\.[a-z0-9\-]+)*\.[a-z]{2,}(:\d+)?(/\S*)?$', re.IGNORECASE)
+
+_validate_url = URLValidator(schemes=['http', 'https'])
+
+
+def parse_csv_urls(content):
+    """
+    CSVからURLのリストを取得
+
+    見出し行にURLの列があればその列を、なければ各行で最初にURLらしい値を使う
+    """
+    if isinstance(content, bytes):
+        for encoding in ('utf-8-sig', 'cp932'):
+            try:
+                content = content.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            raise ValueError("CSVの文字コードを判定できません（UTF-8またはShift_JISで保存してください）")
+
+    rows = list(csv.reader(io.StringIO(content)))
+    if not rows:
+        return []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    url_column = next((index for index, name in enumerate(header) if name in URL_COLUMN_NAMES), None)
+
+    urls = []
+    if url_column is not None:
+        for row in rows[1:]:
+            if len(row) > url_column and row[url_column].strip():
+                urls.append(row[url_column].strip())
+        return urls
+
+    for row in rows:
+        for cell in row:
+            cell = cell.strip()
+            if cell.startswith(('http://', 'https://')) or BARE_URL_PATTERN.match(cell):
+                urls.append(cell)
+                break
+    return urls
+
+
+def clean_url(value):
+    """
+    URLを整形して検証する
+
+    スキームがなければ https:// を補う。不正なURLの場合はNone
+    """
+    url = (value or '').strip()
+    if not url:
+        return None
+    if '://' not in url:
+        url = f'https://{url}'
+
+    try:
+        _validate_url(url)
+    except ValidationError:
+        return None
+    return url
+
+
+def import_companies(urls):
+    """
+    企業を一括登録
+
+    Args:
+        urls: URL文字列のリスト
+
+    Returns:
+        dict: created / duplicate / existing / invalid の件数と、登録した企業のIDリスト
+    """
+    from .models import Company
+
+    started_at = timezone.now()
+    invalid = []
+    duplicate = 0
+    candidates = {}
+
+    # 1. 整形・ファイル内の重複除去（同じドメインは最初のURLを採用）
+    for value in urls:
+        url = clean_url(value)
+        domain = normalize_domain(url) if url else ''
+        if not domain:
+            invalid.append(value)
+            continue
+        if domain in candidates:
+            duplicate += 1
+            continue
+        candidates[domain] = url
+
+    # 2. 登録済みの企業との重複除去
+    existing_domains = set()
+    domains = list(candidates)
+    for start in range(0, len(domains), IMPORT_BATCH_SIZE):
+        existing_domains.update(
+            Company.objects.filter(domain__in=domains[start:start + IMPORT_BATCH_SIZE])
+            .values_list('domain', flat=True)
+        )
+
+    new_companies = [
+        Company(url=url, domain=domain)
+        for domain, url in candidates.items()
+        if domain not in existing_domains
+    ]
+
+    # 3. 一括登録（URLの一意制約に当たったものは無視する）
+    Company.objects.bulk_create(new_companies, batch_size=IMPORT_BATCH_SIZE, ignore_conflicts=True)
+
+    # ignore_conflicts ではIDが返らないため、今回登録した企業を取得し直す
+    new_urls = [company.url for company in new_companies]
+    created_ids = []
+    for start in range(0, len(new_urls), IMPORT_BATCH_SIZE):
+        created_ids.extend(
+            Company.objects.filter(
+                url__in=new_urls[start:start + IMPORT_BATCH_SIZE],
+                created_at__gte=started_at
+            ).values_list('id', flat=True)
+        )
+
+    existing = len(candidates) - len(created_ids)
+    logger.info(
+        f"企業の一括インポート: 登録{len(created_ids)}件, 登録済み{existing}件, "
+        f"重複{duplicate}件, 不正{len(invalid)}件"
+    )
+
+    return {
+        'created': len(created_ids),
+        'existing': existing,
+        'duplicate': duplicate,
+        'invalid': len(invalid),
+        'invalid_urls': invalid[:MAX_REPORTED_INVALID],
+        'company_ids': created_ids,
+    }
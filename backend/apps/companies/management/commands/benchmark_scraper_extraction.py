@@ -0,0 +1,151 @@
+"""
+スクレイピングのHTML抽出ベンチマーク
+
+保存済みの企業ページ（benchmark_pages/*.html）を使い、
+従来の抽出（trafilatura + BeautifulSoupでの解析）と
+extract_page（1回の解析）のCPU時間を比較する。
+従来方式はトップページのみの場合（max_pages=1）とクロールする場合に分けて計測する。
+"""
+import time
+from pathlib import Path
+
+import trafilatura
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand
+
+from apps.companies.scraper import extract_page
+
+DEFAULT_PAGES_DIR = Path(__file__).resolve().parents[2] / 'benchmark_pages'
+
+
+def legacy_extract_with_trafilatura(html):
+    """従来の CompanyScraper.extract_with_trafilatura（本文の抽出）"""
+    try:
+        content = trafilatura.extract(
+            html,
+            include_links=False,
+            include_images=False,
+            include_tables=True,
+            output_format='txt'
+        )
+        return content or ""
+    except Exception:
+        return ""
+
+
+def legacy_extract_with_beautifulsoup(html):
+    """従来の CompanyScraper.extract_with_beautifulsoup（タイトル・説明・見出しの抽出）"""
+    try:
+        soup = BeautifulSoup(html, 'html.parser')
+
+        title = ""
+        if soup.find('title'):
+            title = soup.find('title').text.strip()
+
+        meta_desc = ""
+        meta_tag = soup.find('meta', {'name': 'description'}) or \
+                  soup.find('meta', {'property': 'og:description'})
+        if meta_tag and meta_tag.get('content'):
+            meta_desc = meta_tag['content'].strip()
+
+        headings = []
+        for h_tag in soup.find_all(['h1', 'h2', 'h3']):
+            text = h_tag.get_text().strip()
+            if text:
+                headings.append(text)
+
+        return {
+            'title': title,
+            'meta_description': meta_desc,
+            'headings': headings[:10],
+        }
+    except Exception:
+        return {}
+
+
+def legacy_extract_links(html):
+    """従来の CompanyScraper.discover_pages のリンク抽出（max_pages > 1 の場合のみ実行されていた）"""
+    try:
+        soup = BeautifulSoup(html, 'html.parser')
+    except Exception:
+        return []
+    return [(a_tag['href'], a_tag.get_text(' ', strip=True)) for a_tag in soup.find_all('a', href=True)]
+
+
+def legacy_extract(html, crawl=False):
+    """
+    従来のトップページの抽出処理
+
+    本文はtrafilatura、メタデータはBeautifulSoupで解析し、関連ページをクロールする場合
+    （max_pages > 1）はリンクの抽出のためにもう1回BeautifulSoupで解析していた
+    """
+    content = legacy_extract_with_trafilatura(html)
+    structured_data = legacy_extract_with_beautifulsoup(html)
+    return {
+        'title': structured_data.get('title', ''),
+        'meta_description': structured_data.get('meta_description', ''),
+        'headings': structured_data.get('headings', []),
+        'links': legacy_extract_links(html) if crawl else None,
+        'content': content,
+    }
+
+
+class Command(BaseCommand):
+    help = 'HTML抽出処理（従来方式と1回解析方式）のCPU時間を比較'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages-dir', default=str(DEFAULT_PAGES_DIR), help='HTMLファイルのディレクトリ')
+        parser.add_argument('--iterations', type=int, default=20, help='ページごとの繰り返し回数')
+
+    def handle(self, *args, **options):
+        paths = sorted(Path(options['pages_dir']).glob('*.html'))
+        if not paths:
+            self.stdout.write(self.style.ERROR(f"HTMLファイルが見つかりません: {options['pages_dir']}"))
+            return
+
+        iterations = options['iterations']
+        total_top = total_crawl = total_single = 0.0
+
+        self.stdout.write(
+            f"{'ページ':<28}{'従来/トップのみ(ms)':>20}{'従来/クロール(ms)':>18}{'1回解析(ms)':>14}"
+        )
+        for path in paths:
+            html = path.read_text(encoding='utf-8')
+
+            legacy = legacy_extract(html, crawl=True)
+            single = extract_page(html)
+            self._check_consistency(path.name, legacy, single)
+
+            top_seconds = self._measure(legacy_extract, html, iterations)
+            crawl_seconds = self._measure(legacy_extract, html, iterations, crawl=True)
+            single_seconds = self._measure(extract_page, html, iterations)
+            total_top += top_seconds
+            total_crawl += crawl_seconds
+            total_single += single_seconds
+
+            self.stdout.write(
+                f"{path.name:<28}{top_seconds * 1000:>20.2f}{crawl_seconds * 1000:>18.2f}"
+                f"{single_seconds * 1000:>14.2f}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\n合計: 1回解析 {total_single * 1000:.2f}ms "
+            f"(従来/トップのみ {total_top * 1000:.2f}ms から {1 - total_single / total_top:.0%} 削減, "
+            f"従来/クロール {total_crawl * 1000:.2f}ms から {1 - total_single / total_crawl:.0%} 削減, "
+            f"{len(paths)}ページ × {iterations}回の平均)"
+        ))
+
+    def _measure(self, func, html, iterations, **kwargs):
+        """1回あたりの平均CPU時間（秒）"""
+        start = time.process_time()
+        for _ in range(iterations):
+            func(html, **kwargs)
+        return (time.process_time() - start) / iterations
+
+    def _check_consistency(self, name, legacy, single):
+        """両方式の抽出結果が一致するか確認"""
+        for key in ('title', 'meta_description', 'headings', 'content'):
+            if legacy[key] != single[key]:
+                self.stdout.write(self.style.WARNING(f"  {name}: {key} が従来方式と一致しません"))
+        if len(legacy['links']) != len(single['links']):
+            self.stdout.write(self.style.WARNING(f"  {name}: links の件数が従来方式と一致しません"))
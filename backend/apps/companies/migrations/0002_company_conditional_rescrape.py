@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='コンテンツハッシュ'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='http_etag',
+            field=models.CharField(blank=True, max_length=255, verbose_name='ETag'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='http_last_modified',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Last-Modified'),
+        ),
+    ]
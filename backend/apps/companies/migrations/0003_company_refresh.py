@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0002_company_conditional_rescrape'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyRefreshRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='最終完了日時')),
+                ('stale_count', models.IntegerField(default=0, verbose_name='更新対象の企業数')),
+                ('enqueued_count', models.IntegerField(default=0, verbose_name='投入数')),
+                ('skipped_count', models.IntegerField(default=0, help_text='前回の定期更新で投入済み・未完了のためスキップした企業数', verbose_name='スキップ数')),
+                ('success_count', models.IntegerField(default=0, verbose_name='更新数')),
+                ('unchanged_count', models.IntegerField(default=0, help_text='サイトが更新されておらずAI構造化を省略した企業数', verbose_name='未更新数')),
+                ('failed_count', models.IntegerField(default=0, verbose_name='失敗数')),
+            ],
+            options={
+                'verbose_name': '企業情報の定期更新',
+                'verbose_name_plural': '企業情報の定期更新',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='scraped_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='取得日時'),
+        ),
+    ]
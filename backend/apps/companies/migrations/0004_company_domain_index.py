@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:39
+
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+
+
+def normalize_domains(apps, schema_editor):
+    """登録済みの企業のドメインを正規化（小文字、www.・ポート番号なし）"""
+    Company = apps.get_model('companies', 'Company')
+    for company in Company.objects.only('id', 'url', 'domain').iterator():
+        url = company.url if '://' in company.url else f'//{company.url}'
+        try:
+            host = (urlparse(url).hostname or '').rstrip('.')
+        except ValueError:
+            continue
+        if host.startswith('www.'):
+            host = host[4:]
+        if host and host != company.domain:
+            Company.objects.filter(id=company.id).update(domain=host)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_company_refresh'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='company',
+            name='domain',
+            field=models.CharField(db_index=True, help_text='正規化済み（小文字、www.・ポート番号なし）', max_length=255, verbose_name='ドメイン'),
+        ),
+        migrations.RunPython(normalize_domains, migrations.RunPython.noop),
+    ]
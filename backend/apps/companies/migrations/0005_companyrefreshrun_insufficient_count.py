@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_company_domain_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companyrefreshrun',
+            name='insufficient_count',
+            field=models.IntegerField(default=0, help_text='取得できた情報が少なくAI構造化を省略した企業数', verbose_name='情報不足数'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:42
+
+from django.db import migrations, models
+
+
+def move_main_content_to_blobs(apps, schema_editor):
+    """既存のメインコンテンツを圧縮BLOBストアへ移動"""
+    from apps.core.blob_store import put_text
+
+    Company = apps.get_model('companies', 'Company')
+    companies = Company.objects.exclude(main_content='').only('id', 'main_content')
+    for company in companies.iterator(chunk_size=500):
+        Company.objects.filter(id=company.id).update(main_content_hash=put_text(company.main_content))
+
+
+def restore_main_content(apps, schema_editor):
+    from apps.core.blob_store import get_text
+
+    Company = apps.get_model('companies', 'Company')
+    companies = Company.objects.exclude(main_content_hash='').only('id', 'main_content_hash')
+    for company in companies.iterator(chunk_size=500):
+        Company.objects.filter(id=company.id).update(main_content=get_text(company.main_content_hash))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0005_companyrefreshrun_insufficient_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='main_content_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='メインコンテンツのキー'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='page_snapshots',
+            field=models.JSONField(blank=True, default=list, help_text='取得したページごとの {url, category, chars, source, html_hash}', verbose_name='HTMLスナップショット'),
+        ),
+        migrations.RunPython(move_main_content_to_blobs, restore_main_content),
+        migrations.RemoveField(
+            model_name='company',
+            name='main_content',
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
 from django.utils import timezone
+from datetime import timedelta
 
 
 class Company(models.Model):
@@ -8,12 +9,25 @@ class Company(models.Model):
     
     # 基本情報
     url = models.URLField(unique=True, verbose_name="企業URL")
-    domain = models.CharField(max_length=255, verbose_name="ドメイン")
+    domain = models.CharField(
+        max_length=255,
+        db_index=True,
+        verbose_name="ドメイン",
+        help_text="正規化済み（小文字、www.・ポート番号なし）"
+    )
     
     # スクレイピング結果
     title = models.CharField(max_length=500, blank=True, verbose_name="ページタイトル")
     meta_description = models.TextField(blank=True, verbose_name="メタディスクリプション")
-    main_content = models.TextField(blank=True, verbose_name="メインコンテンツ")
+    
+    # 本文・HTMLは圧縮BLOBストアに保存し、ここにはキーのみ持つ（main_contentプロパティで遅延読み込み）
+    main_content_hash = models.CharField(max_length=64, blank=True, verbose_name="メインコンテンツのキー")
+    page_snapshots = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="HTMLスナップショット",
+        help_text="取得したページごとの {url, category, chars, source, html_hash}"
+    )
     
     # AI抽出情報
     company_name = models.CharField(max_length=255, blank=True, verbose_name="企業名")
@@ -46,7 +60,12 @@ class Company(models.Model):
         default='success',
         verbose_name="スクレイピング状態"
     )
-    scraped_at = models.DateTimeField(auto_now=True, verbose_name="取得日時")
+    scraped_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="取得日時")
+    
+    # 再取得の判定用（条件付きリクエストの検証子と本文のハッシュ）
+    http_etag = models.CharField(max_length=255, blank=True, verbose_name="ETag")
+    http_last_modified = models.CharField(max_length=100, blank=True, verbose_name="Last-Modified")
+    content_hash = models.CharField(max_length=64, blank=True, verbose_name="コンテンツハッシュ")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
     
     class Meta:
@@ -57,10 +76,166 @@ class Company(models.Model):
     def __str__(self):
         return f"{self.company_name or self.domain}"
     
+    @property
+    def main_content(self):
+        """メインコンテンツ（初回アクセス時にBLOBストアから読み込む）"""
+        if not hasattr(self, '_main_content'):
+            from apps.core.blob_store import get_text
+            self._main_content = get_text(self.main_content_hash)
+        return self._main_content
+    
+    @main_content.setter
+    def main_content(self, value):
+        """キーだけ先に決め、BLOBストアへの書き込みはsave()まで遅らせる"""
+        from apps.core.blob_store import text_key
+        self._main_content = value or ''
+        self.main_content_hash = text_key(self._main_content)
+        self._add_pending_blob(self.main_content_hash, self._main_content)
+    
+    def set_page_snapshots(self, pages):
+        """
+        取得したページのHTMLスナップショットを設定（BLOBストアへはsave()時に書き込む）
+        
+        Args:
+            pages: {'url', 'category', 'chars', 'source', 'html'} のリスト
+        """
+        from apps.core.blob_store import text_key
+        snapshots = []
+        for page in pages:
+            html_hash = text_key(page['html'])
+            self._add_pending_blob(html_hash, page['html'])
+            snapshots.append({
+                'url': page['url'],
+                'category': page['category'],
+                'chars': page['chars'],
+                'source': page['source'],
+                'html_hash': html_hash,
+            })
+        self.page_snapshots = snapshots
+    
+    def _add_pending_blob(self, key, text):
+        if key:
+            self.__dict__.setdefault('_pending_blobs', {})[key] = text
+    
+    def get_html_snapshot(self, url=None):
+        """取得時のHTML（URL省略時はトップページ）"""
+        from apps.core.blob_store import get_text
+        for snapshot in self.page_snapshots:
+            if url is None or snapshot.get('url') == url:
+                return get_text(snapshot.get('html_hash'))
+        return ''
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.__dict__.pop('_main_content', None)
+        self.__dict__.pop('_pending_blobs', None)
+    
+    def save(self, *args, **kwargs):
+        if not self.domain:
+            from .scraper import normalize_domain
+            self.domain = normalize_domain(self.url)
+        
+        # 参照を書き込む前にBLOBを保存する（未保存のインスタンスではBLOBを作らない）
+        pending_blobs = self.__dict__.pop('_pending_blobs', None)
+        if pending_blobs:
+            from apps.core.blob_store import put_text
+            for text in pending_blobs.values():
+                put_text(text)
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def get_referenced_blob_keys(cls):
+        """本文・HTMLスナップショットとして参照されているBLOBのキー"""
+        keys = set()
+        rows = cls.objects.values_list('main_content_hash', 'page_snapshots').iterator()
+        for main_content_hash, page_snapshots in rows:
+            if main_content_hash:
+                keys.add(main_content_hash)
+            for snapshot in page_snapshots or []:
+                if snapshot.get('html_hash'):
+                    keys.add(snapshot['html_hash'])
+        return keys
+    
     def needs_update(self, days=30):
         """更新が必要か判定"""
         if not self.scraped_at:
             return True
         age = timezone.now() - self.scraped_at
         return age.days > days
+    
+    @classmethod
+    def get_stale(cls, days=30):
+        """
+        更新が必要な企業（needs_updateと同じ条件）を取得日時の古い順に取得
+        
+        age.days > days は「取得から days+1 日以上経過」と同じ
+        """
+        threshold = timezone.now() - timedelta(days=days + 1)
+        return cls.objects.filter(scraped_at__lte=threshold).order_by('scraped_at')
+    
+    def is_structured(self):
+        """AI構造化済みか（未更新時にAI構造化を省略できるか）"""
+        return bool(self.content_hash) and self.scrape_status != 'failed'
 
+
+
+class CompanyRefreshRun(models.Model):
+    """企業情報の定期更新の実行記録"""
+    
+    OUTCOMES = ['success', 'unchanged', 'insufficient', 'failed']
+    
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name="開始日時")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="最終完了日時")
+    
+    stale_count = models.IntegerField(default=0, verbose_name="更新対象の企業数")
+    enqueued_count = models.IntegerField(default=0, verbose_name="投入数")
+    skipped_count = models.IntegerField(
+        default=0,
+        verbose_name="スキップ数",
+        help_text="前回の定期更新で投入済み・未完了のためスキップした企業数"
+    )
+    
+    # 各タスクの結果
+    success_count = models.IntegerField(default=0, verbose_name="更新数")
+    unchanged_count = models.IntegerField(
+        default=0,
+        verbose_name="未更新数",
+        help_text="サイトが更新されておらずAI構造化を省略した企業数"
+    )
+    insufficient_count = models.IntegerField(
+        default=0,
+        verbose_name="情報不足数",
+        help_text="取得できた情報が少なくAI構造化を省略した企業数"
+    )
+    failed_count = models.IntegerField(default=0, verbose_name="失敗数")
+    
+    class Meta:
+        verbose_name = "企業情報の定期更新"
+        verbose_name_plural = "企業情報の定期更新"
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"{self.started_at:%Y-%m-%d %H:%M} ({self.completed_count}/{self.enqueued_count})"
+    
+    @classmethod
+    def record_result(cls, run_id, outcome):
+        """投入した企業の処理結果を加算"""
+        if outcome not in cls.OUTCOMES:
+            raise ValueError(f"不明な結果: {outcome}")
+        
+        cls.objects.filter(id=run_id).update(
+            **{f'{outcome}_count': models.F(f'{outcome}_count') + 1},
+            finished_at=timezone.now()
+        )
+    
+    @property
+    def completed_count(self):
+        return self.success_count + self.unchanged_count + self.insufficient_count + self.failed_count
+    
+    @property
+    def throughput_per_minute(self):
+        """開始から最後の完了までの1分あたりの処理企業数"""
+        if not self.finished_at or not self.completed_count:
+            return None
+        minutes = (self.finished_at - self.started_at).total_seconds() / 60
+        return round(self.completed_count / max(minutes, 1 / 60), 2)
@@ -0,0 +1,156 @@
+"""
+robots.txt のキャッシュ
+
+スキーム+ホストごとに解析済みのルールをRedisに保存し、ワーカー間で共有する。
+取得に失敗した場合も短いTTLでキャッシュし（ネガティブキャッシュ）、
+キャッシュヒット時はネットワークアクセスを行わない。
+"""
+import logging
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser, Entry, RuleLine, RequestRate
+
+import requests
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+ROBOTS_CACHE_KEY = 'robots_txt:{origin}'
+ROBOTS_CACHE_TTL = 60 * 60 * 24  # 取得できたルールは24時間
+ROBOTS_FAILURE_TTL = 60 * 60  # 取得失敗は1時間
+
+
+def get_origin(url):
+    """URLからスキーム+ホスト（例: https://example.co.jp）を取得"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme or 'https'}://{parsed.netloc}"
+
+
+def get_robots_parser(url, timeout=10, headers=None):
+    """
+    URLのオリジンに対応する解析済みRobotFileParserを取得（キャッシュ付き）
+
+    Returns:
+        tuple: (RobotFileParser, 取得できたか)
+    """
+    origin = get_origin(url)
+    cache_key = ROBOTS_CACHE_KEY.format(origin=origin)
+
+    data = cache.get(cache_key)
+    if data is None:
+        data = fetch_robots_rules(origin, timeout=timeout, headers=headers)
+        ttl = ROBOTS_FAILURE_TTL if data['mode'] == 'error' else ROBOTS_CACHE_TTL
+        cache.set(cache_key, data, ttl)
+
+    return deserialize_parser(data), data['mode'] != 'error'
+
+
+def can_fetch(url, user_agent='*', timeout=10, headers=None):
+    """
+    robots.txtでアクセスが許可されているか
+
+    robots.txtを確認できない場合は許可と見なす
+    """
+    parser, available = get_robots_parser(url, timeout=timeout, headers=headers)
+    if not available:
+        return True
+    return parser.can_fetch(user_agent, url)
+
+
+def get_crawl_delay(url, user_agent='*', timeout=10, headers=None):
+    """robots.txtのCrawl-delay（秒）。指定がなければ0"""
+    parser, available = get_robots_parser(url, timeout=timeout, headers=headers)
+    if not available:
+        return 0
+    return parser.crawl_delay(user_agent) or 0
+
+
+def get_sitemaps(url, timeout=10, headers=None):
+    """robots.txtに記載されたサイトマップURLのリスト"""
+    parser, _ = get_robots_parser(url, timeout=timeout, headers=headers)
+    return parser.site_maps() or []
+
+
+def fetch_robots_rules(origin, timeout=10, headers=None):
+    """
+    robots.txtを取得して解析し、キャッシュ可能な辞書にする
+
+    ステータスの扱いは RobotFileParser.read に合わせる
+    （401/403は全拒否、その他の4xxは全許可）
+    """
+    try:
+        response = requests.get(
+            f"{origin}/robots.txt",
+            headers=headers,
+            timeout=timeout,
+            allow_redirects=True
+        )
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"robots.txt の取得に失敗 ({origin}): {e}")
+        return {'mode': 'error'}
+
+    if response.status_code in (401, 403):
+        return {'mode': 'disallow_all'}
+    if 400 <= response.status_code < 500:
+        return {'mode': 'allow_all'}
+    if response.status_code >= 500:
+        logger.warning(f"robots.txt の取得に失敗 ({origin}): HTTP {response.status_code}")
+        return {'mode': 'error'}
+
+    parser = RobotFileParser()
+    parser.parse(response.text.splitlines())
+    return serialize_parser(parser)
+
+
+def serialize_parser(parser):
+    """解析済みのRobotFileParserを辞書に変換"""
+
+    def serialize_entry(entry):
+        return {
+            'useragents': list(entry.useragents),
+            'rules': [[line.path, line.allowance] for line in entry.rulelines],
+            'delay': entry.delay,
+            'req_rate': list(entry.req_rate) if entry.req_rate else None,
+        }
+
+    return {
+        'mode': 'rules',
+        'entries': [serialize_entry(entry) for entry in parser.entries],
+        'default_entry': serialize_entry(parser.default_entry) if parser.default_entry else None,
+        'sitemaps': parser.site_maps() or [],
+    }
+
+
+def deserialize_parser(data):
+    """辞書からRobotFileParserを復元（robots.txtの再解析は行わない）"""
+
+    def deserialize_entry(entry_data):
+        entry = Entry()
+        entry.useragents = entry_data['useragents']
+        for path, allowance in entry_data['rules']:
+            # RuleLine()はパスを再クオートするため、解析済みの値をそのまま設定する
+            line = RuleLine.__new__(RuleLine)
+            line.path = path
+            line.allowance = allowance
+            entry.rulelines.append(line)
+        entry.delay = entry_data.get('delay')
+        if entry_data.get('req_rate'):
+            entry.req_rate = RequestRate(*entry_data['req_rate'])
+        return entry
+
+    parser = RobotFileParser()
+    mode = data['mode']
+    if mode == 'allow_all':
+        parser.allow_all = True
+    elif mode == 'disallow_all':
+        parser.disallow_all = True
+    elif mode == 'rules':
+        parser.entries = [deserialize_entry(entry) for entry in data['entries']]
+        if data.get('default_entry'):
+            parser.default_entry = deserialize_entry(data['default_entry'])
+        if data.get('sitemaps'):
+            parser.sitemaps = data['sitemaps']
+
+    # last_checkedが未設定だとcan_fetchが常にFalseを返す
+    parser.modified()
+    return parser
@@ -0,0 +1,103 @@
+"""
+スクレイピングのスケジューラ
+
+ドメインごとに scraping_delay_seconds の間隔を空けながら、複数ドメインを並行して処理する。
+アクセス枠はRedis上でドメインごとに予約し、待機が必要なタスクはワーカー内でsleepせず
+countdown付きで投入（または再投入）してワーカーを解放する。
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+DOMAIN_SLOT_KEY = 'scrape_domain_slot:{domain}'
+
+# ドメインの次回アクセス可能時刻（ミリ秒）を予約し、待機ミリ秒を返す。
+# 待機がARGV[2]ミリ秒（負の値なら無制限）を超える場合は予約せずに-1を返す。
+# 時刻はRedisのTIMEを使うため、ワーカー間の時計のずれに影響されない。
+RESERVE_SLOT_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local next_ms = tonumber(redis.call('GET', KEYS[1]) or '0')
+local slot_ms = math.max(now_ms, next_ms)
+local delay_ms = tonumber(ARGV[1])
+local max_wait_ms = tonumber(ARGV[2])
+if max_wait_ms >= 0 and slot_ms - now_ms > max_wait_ms then
+    return -1
+end
+redis.call('SET', KEYS[1], slot_ms + delay_ms, 'PX', slot_ms - now_ms + delay_ms)
+return slot_ms - now_ms
+"""
+
+_reserve_slot = None
+
+
+def reserve_domain_slot(domain, delay, max_wait=None):
+    """
+    ドメインへのアクセス枠を予約
+
+    同じドメインへの予約はdelay秒ずつ後ろにずれる。別ドメインは互いに待たない。
+
+    Args:
+        domain: 対象ドメイン
+        delay: 同一ドメインへのアクセス間隔（秒）
+        max_wait: 待機秒数の上限。空き枠がこれより先の場合は予約しない
+
+    Returns:
+        float: 予約した枠までの待機秒数（0なら即時アクセス可）。予約しなかった場合はNone
+    """
+    global _reserve_slot
+
+    try:
+        from django_redis import get_redis_connection
+
+        if _reserve_slot is None:
+            _reserve_slot = get_redis_connection('default').register_script(RESERVE_SLOT_SCRIPT)
+
+        wait_ms = _reserve_slot(
+            keys=[DOMAIN_SLOT_KEY.format(domain=domain.lower())],
+            args=[int(delay * 1000), -1 if max_wait is None else int(max_wait * 1000)]
+        )
+        if int(wait_ms) < 0:
+            return None
+        return int(wait_ms) / 1000
+    except Exception as e:
+        # Redisが使えない場合は間隔制御なしで続行する
+        logger.warning(f"ドメインのアクセス枠予約に失敗 ({domain}): {e}")
+        return 0.0
+
+
+def enqueue_company_scrapes(companies, delay, task_kwargs=None):
+    """
+    複数企業のスクレイピングをドメインごとの間隔を守って投入
+
+    各企業のアクセス枠を先に予約し、その時刻に実行されるようcountdown付きで投入する。
+
+    Args:
+        companies: Companyのイテラブル
+        delay: 同一ドメインへのアクセス間隔（秒）
+        task_kwargs: scrape_and_structure_companyに渡す追加の引数
+
+    Returns:
+        list: 投入したタスクの情報
+    """
+    from .scraper import extract_domain
+    from .tasks import scrape_and_structure_company
+
+    results = []
+    for company in companies:
+        domain = company.domain or extract_domain(company.url)
+        wait = reserve_domain_slot(domain, delay)
+        task = scrape_and_structure_company.apply_async(
+            args=[company.id],
+            kwargs={**(task_kwargs or {}), 'slot_reserved': True},
+            countdown=wait
+        )
+        results.append({
+            'company_id': company.id,
+            'task_id': task.id,
+            'countdown': wait
+        })
+
+    logger.info(f"スクレイピングを投入: {len(results)}件")
+    return results
@@ -2,24 +2,115 @@
 企業Webサイトのスクレイピング機能
 """
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
 import trafilatura
-from urllib.parse import urlparse
-from urllib.robotparser import RobotFileParser
-import time
+from trafilatura.utils import load_html
+from lxml import etree
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urljoin, urldefrag
+import hashlib
+import json
 import logging
+import re
+import threading
+import time
+import unicodedata
+
+from . import robots
 
 logger = logging.getLogger(__name__)
 
 
+# クロール対象ページの種類: (種類, 表示名, 優先度, キーワード)
+# キーワードはリンクテキスト（部分一致）とURLパスの区切り単位（完全一致）で照合する
+CRAWL_TARGETS = [
+    ('company', '会社概要', 3, ['会社概要', '企業情報', '会社情報', '企業概要', '会社案内',
+                             'about', 'aboutus', 'company', 'corporate', 'profile', 'outline', 'overview']),
+    ('business', '事業内容', 2, ['事業内容', '事業紹介', '事業案内', 'サービス', '製品',
+                              'business', 'service', 'services', 'products', 'solution', 'solutions']),
+    ('ir', 'IR情報', 1, ['IR情報', '投資家', '株主', 'ir', 'investor', 'investors']),
+]
+
+# クロールの既定の予算
+DEFAULT_MAX_BYTES = 3 * 1024 * 1024
+
+# ストリーミング取得時の読み込み単位
+FETCH_CHUNK_BYTES = 64 * 1024
+
+# 同一ドメインへの同時接続数（アクセス枠の時刻になった関連ページを並行取得する）
+CRAWL_CONCURRENCY = 2
+
+# 関連ページ・サイトマップのアクセス枠を待つ上限（秒）。1件あたりとスクレイピング全体の合計
+# 枠がこれより先になるページは取得しない（ワーカーを長く止めないため）
+CRAWL_MAX_SLOT_WAIT = 5
+CRAWL_MAX_TOTAL_WAIT = 10
+
+# AIに渡す本文の文字数上限（全ページ合計）
+CONTENT_BUNDLE_CHARS = 6000
+
+# 本文がこの文字数未満のページは埋め込みデータ（JSON-LD・ハイドレーション用JSON・OGP）で補う
+MIN_PAGE_CONTENT_CHARS = 200
+
+# 埋め込みデータから取り出すテキストの上限（1ページあたり）
+EMBEDDED_TEXT_CHARS = 4000
+
+# AI構造化に必要な最低限の文字数（タイトル・説明・見出し・本文の合計）
+MIN_SIGNAL_CHARS = 300
+
+# JSON-LDから取り出す項目
+JSON_LD_TEXT_KEYS = [
+    'name', 'legalName', 'alternateName', 'description', 'slogan', 'foundingDate',
+    'numberOfEmployees', 'streetAddress', 'addressLocality', 'addressRegion',
+    'areaServed', 'knowsAbout', 'headline', 'articleBody', 'serviceType', 'category',
+]
+
+# OGP・Twitterカードから取り出すメタタグ
+SOCIAL_META_PROPERTIES = ['og:site_name', 'og:title', 'og:description', 'twitter:title', 'twitter:description']
+
+# サイトマップの取得上限
+SITEMAP_MAX_FILES = 3
+SITEMAP_MAX_URLS = 500
+SITEMAP_MAX_BYTES = 5 * 1024 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """プロセス内で共有するHTTPセッション（コネクションプール付き）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=20, pool_maxsize=CRAWL_CONCURRENCY * 4)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
 class CompanyScraper:
-    """企業Webサイトのスクレイピング"""
+    """
+    企業Webサイトのスクレイピング
     
-    def __init__(self, url, timeout=15, delay=2.0):
+    トップページへのアクセス間隔は呼び出し側（scheduler.reserve_domain_slot）で制御する。
+    関連ページとサイトマップは同じドメインのアクセス枠を予約してから取得し、
+    枠が CRAWL_MAX_SLOT_WAIT / CRAWL_MAX_TOTAL_WAIT を超えて先になるものは取得しない
+    """
+    
+    def __init__(self, url, timeout=15, delay=0):
         self.url = url
         self.domain = urlparse(url).netloc
         self.timeout = timeout
         self.delay = delay
+        # アクセス枠の予約に使うドメイン（スケジューラと同じく正規化したもの）
+        self.slot_domain = normalize_domain(url)
+        self.total_slot_wait = 0.0
+        self._access_delay = None
+        # リダイレクト後のトップページのURL（www付きへの転送などでホストが変わる場合がある）
+        self.final_url = url
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (compatible; ProposalBot/1.0)',
             'Accept': 'text/html,application/xhtml+xml',
@@ -27,86 +118,288 @@ class CompanyScraper:
         }
     
     def check_robots_txt(self):
-        """robots.txtの確認"""
-        try:
-            rp = RobotFileParser()
-            rp.set_url(f"https://{self.domain}/robots.txt")
-            rp.read()
-            
-            can_scrape = rp.can_fetch("*", self.url)
-            if not can_scrape:
-                logger.warning(f"robots.txt でアクセスが禁止されています: {self.url}")
-            return can_scrape
-        except Exception as e:
-            logger.warning(f"robots.txt の確認に失敗: {e}")
-            return True  # 確認できない場合は許可と見なす
+        """robots.txtの確認（ワーカー間で共有するキャッシュ付き）"""
+        can_scrape = robots.can_fetch(
+            self.url,
+            timeout=self.timeout,
+            headers=self.headers
+        )
+        if not can_scrape:
+            logger.warning(f"robots.txt でアクセスが禁止されています: {self.url}")
+        return can_scrape
     
-    def fetch_page(self):
-        """ページの取得"""
+    def fetch_page(self, url=None, max_bytes=None):
+        """
+        ページの取得
+        
+        max_bytesを指定した場合は本文をストリーミングで読み、上限を超えた時点で
+        ダウンロードを打ち切ってNoneを返す
+        """
         try:
-            response = requests.get(
-                self.url,
+            with get_session().get(
+                url or self.url,
                 headers=self.headers,
                 timeout=self.timeout,
-                allow_redirects=True
-            )
-            response.raise_for_status()
-            response.encoding = response.apparent_encoding  # 文字化け対策
-            return response.text
+                allow_redirects=True,
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                body, truncated = read_body(response, max_bytes)
         except requests.exceptions.RequestException as e:
             logger.error(f"ページ取得エラー: {e}")
             raise
+        
+        if truncated:
+            logger.info(f"クロールのバイト数上限に達しました: {url or self.url}")
+            return None
+        return decode_body(body)
     
-    def extract_with_trafilatura(self, html):
-        """trafilaturaでメインコンテンツ抽出"""
+    def fetch_landing_page(self, etag='', last_modified='', max_bytes=None):
+        """
+        トップページの条件付き取得
+        
+        前回取得時の検証子（ETag / Last-Modified）を送り、未更新（304）ならHTMLはNoneを返す。
+        本文はmax_bytesまでしか読まない（超えた分は切り捨てる）
+        
+        Returns:
+            tuple: (HTML または None, {'etag', 'last_modified'})
+        """
+        headers = dict(self.headers)
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        
         try:
-            content = trafilatura.extract(
-                html,
-                include_links=False,
-                include_images=False,
-                include_tables=True,
-                output_format='txt'
-            )
-            return content or ""
-        except Exception as e:
-            logger.error(f"trafilatura抽出エラー: {e}")
-            return ""
+            with get_session().get(
+                self.url,
+                headers=headers,
+                timeout=self.timeout,
+                allow_redirects=True,
+                stream=True
+            ) as response:
+                if response.status_code == 304:
+                    return None, {'etag': etag, 'last_modified': last_modified}
+                response.raise_for_status()
+                body, truncated = read_body(response, max_bytes)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"ページ取得エラー: {e}")
+            raise
+        
+        if truncated:
+            logger.info(f"トップページがバイト数上限を超えたため切り詰めました: {self.url}")
+        self.final_url = response.url or self.url
+        validators = {
+            'etag': response.headers.get('ETag', ''),
+            'last_modified': response.headers.get('Last-Modified', ''),
+        }
+        return decode_body(body), validators
     
-    def extract_with_beautifulsoup(self, html):
-        """BeautifulSoupで構造化データ抽出"""
-        try:
-            soup = BeautifulSoup(html, 'html.parser')
+    def is_same_site(self, url):
+        """トップページ（リダイレクト後）と同じホストのURLか（www.の有無は区別しない）"""
+        host = normalize_host(urlparse(url).netloc)
+        return host in (normalize_host(urlparse(self.final_url).netloc), normalize_host(self.domain))
+    
+    def discover_pages(self, links, max_pages):
+        """
+        トップページのリンクから会社概要・事業内容・IRなどの同一ドメインのページを探す
+        
+        Args:
+            links: extract_pageで取得した (href, リンクテキスト) のリスト
+            max_pages: 最大ページ数
+        
+        Returns:
+            list: {'url', 'category', 'label', 'score'} のリスト（スコア順）
+        """
+        base_urls = {urldefrag(url)[0].rstrip('/') for url in (self.url, self.final_url)}
+        candidates = {}
+        for href, text in links:
+            # 相対リンクはリダイレクト後のURLを基準に解決する
+            url = urldefrag(urljoin(self.final_url, href))[0]
+            parsed = urlparse(url)
+            if parsed.scheme not in ('http', 'https') or not self.is_same_site(url):
+                continue
+            if url.rstrip('/') in base_urls:
+                continue
             
-            # タイトル
-            title = ""
-            if soup.find('title'):
-                title = soup.find('title').text.strip()
+            match = classify_link(text, parsed.path)
+            if match and (url not in candidates or candidates[url]['score'] < match['score']):
+                candidates[url] = {'url': url, **match}
+        
+        pages = sorted(candidates.values(), key=lambda page: page['score'], reverse=True)
+        
+        # 同じ種類のページは上位2件まで
+        selected = []
+        per_category = {}
+        for page in pages:
+            if per_category.get(page['category'], 0) >= 2:
+                continue
+            per_category[page['category']] = per_category.get(page['category'], 0) + 1
+            selected.append(page)
+            if len(selected) >= max_pages:
+                break
+        return selected
+    
+    def fetch_sitemap_urls(self, max_urls=SITEMAP_MAX_URLS):
+        """
+        サイトマップに記載された同一ドメインのページURL
+        
+        リンクをJavaScriptで描画するサイトでもクロール対象を見つけられるようにする。
+        robots.txtにサイトマップの記載がなければ /sitemap.xml を試す
+        """
+        queue = robots.get_sitemaps(self.url, timeout=self.timeout, headers=self.headers) \
+            or [f"{robots.get_origin(self.url)}/sitemap.xml"]
+        
+        urls = []
+        fetched = 0
+        while queue and fetched < SITEMAP_MAX_FILES and len(urls) < max_urls:
+            sitemap_url = queue.pop(0)
+            fetched += 1
             
-            # メタディスクリプション
-            meta_desc = ""
-            meta_tag = soup.find('meta', {'name': 'description'}) or \
-                      soup.find('meta', {'property': 'og:description'})
-            if meta_tag and meta_tag.get('content'):
-                meta_desc = meta_tag['content'].strip()
+            wait = self.reserve_slot()
+            if wait is None:
+                logger.info(f"アクセス枠が空いていないためサイトマップの取得を打ち切ります: {sitemap_url}")
+                break
+            if wait > 0:
+                time.sleep(wait)
             
-            # 見出し抽出（企業の特徴把握）
-            headings = []
-            for h_tag in soup.find_all(['h1', 'h2', 'h3']):
-                text = h_tag.get_text().strip()
-                if text:
-                    headings.append(text)
+            try:
+                with get_session().get(
+                    sitemap_url,
+                    headers=self.headers,
+                    timeout=self.timeout,
+                    stream=True
+                ) as response:
+                    response.raise_for_status()
+                    body, truncated = read_body(response, SITEMAP_MAX_BYTES)
+            except requests.exceptions.RequestException as e:
+                logger.info(f"サイトマップの取得に失敗 ({sitemap_url}): {e}")
+                continue
+            if truncated:
+                logger.info(f"サイトマップが大きすぎるため読み飛ばします: {sitemap_url}")
+                continue
             
-            return {
-                'title': title,
-                'meta_description': meta_desc,
-                'headings': headings[:10],  # 上位10個
-            }
-        except Exception as e:
-            logger.error(f"BeautifulSoup抽出エラー: {e}")
-            return {}
+            pages, children = parse_sitemap(body)
+            urls.extend(url for url in pages if self.is_same_site(url))
+            queue.extend(children)
+        
+        return urls[:max_urls]
     
-    def scrape(self):
-        """完全なスクレイピング実行"""
+    def get_access_delay(self):
+        """同一ドメインへのアクセス間隔（システム設定とrobots.txtのCrawl-delayの長い方）"""
+        if self._access_delay is None:
+            crawl_delay = robots.get_crawl_delay(self.final_url, timeout=self.timeout, headers=self.headers)
+            self._access_delay = max(self.delay, crawl_delay)
+        return self._access_delay
+    
+    def reserve_slot(self):
+        """
+        同じドメインのアクセス枠を予約
+        
+        Returns:
+            float: 枠までの待機秒数。枠が CRAWL_MAX_SLOT_WAIT より先、または待機の合計が
+                CRAWL_MAX_TOTAL_WAIT を超える場合は予約せずにNone
+        """
+        from .scheduler import reserve_domain_slot
+        
+        max_wait = min(CRAWL_MAX_SLOT_WAIT, CRAWL_MAX_TOTAL_WAIT - self.total_slot_wait)
+        if max_wait < 0:
+            return None
+        wait = reserve_domain_slot(self.slot_domain, self.get_access_delay(), max_wait=max_wait)
+        if wait is not None:
+            self.total_slot_wait += wait
+        return wait
+    
+    def _fetch_subpage(self, page, wait, started, budget):
+        """予約した枠の時刻まで待ってから関連ページを取得（バイト数の予算はスレッド間で共有）"""
+        remaining_wait = started + wait - time.monotonic()
+        if remaining_wait > 0:
+            time.sleep(remaining_wait)
+        
+        with budget['lock']:
+            remaining = budget['max_bytes'] - budget['used']
+        if remaining <= 0:
+            return None
+        try:
+            html = self.fetch_page(page['url'], max_bytes=remaining)
+        except Exception:
+            return None
+        if not html:
+            return None
+        
+        size = len(html.encode('utf-8'))
+        with budget['lock']:
+            if budget['used'] + size > budget['max_bytes']:
+                logger.info(f"クロールのバイト数上限に達しました: {page['url']}")
+                return None
+            budget['used'] += size
+        return html
+    
+    def crawl(self, landing_html, landing_links, max_pages, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        トップページに加えて価値の高いページを取得する
+        
+        ページごとに同じドメインのアクセス枠を予約し、枠の時刻になったページから
+        CRAWL_CONCURRENCY 件まで並行して取得する。枠が待機の上限より先になるページは取得しない。
+        各ページは残りのバイト数までしか読まず、超えたページは読み込みを打ち切って除外する
+        
+        Args:
+            landing_html: 取得済みのトップページのHTML
+            landing_links: トップページのリンク（extract_pageの'links'）
+            max_pages: トップページを含めた最大ページ数
+            max_bytes: 取得するHTMLの合計バイト数の上限
+        
+        Returns:
+            list: {'url', 'category', 'label', 'score', 'html'} のリスト（トップページが先頭）
+        """
+        used_bytes = len(landing_html.encode('utf-8'))
+        pages = [{'url': self.url, 'category': 'top', 'label': 'トップページ', 'score': 0, 'html': landing_html}]
+        
+        targets = self.discover_pages(landing_links, max_pages - 1) if max_pages > 1 else []
+        if not targets:
+            return pages
+        
+        scheduled = []
+        for page in targets:
+            if not robots.can_fetch(page['url'], timeout=self.timeout, headers=self.headers):
+                continue
+            wait = self.reserve_slot()
+            if wait is None:
+                logger.info(
+                    f"アクセス枠が待機の上限より先のため関連ページを省略: {self.domain} "
+                    f"{len(targets) - targets.index(page)}件"
+                )
+                break
+            scheduled.append((page, wait))
+        
+        started = time.monotonic()
+        budget = {'lock': threading.Lock(), 'used': used_bytes, 'max_bytes': max_bytes}
+        with ThreadPoolExecutor(max_workers=CRAWL_CONCURRENCY) as executor:
+            results = list(executor.map(
+                lambda item: self._fetch_subpage(*item, started, budget),
+                scheduled
+            ))
+        
+        for (page, _), html in zip(scheduled, results):
+            if html:
+                pages.append({**page, 'html': html})
+        
+        logger.info(f"クロール完了: {self.domain} {len(pages)}ページ, {budget['used']}バイト")
+        return pages
+    
+    def scrape(self, max_pages=1, max_bytes=DEFAULT_MAX_BYTES, etag='', last_modified=''):
+        """
+        完全なスクレイピング実行
+        
+        Args:
+            max_pages: トップページを含めて取得する最大ページ数（1ならトップページのみ）
+            max_bytes: 取得するHTMLの合計バイト数の上限
+            etag: 前回取得時のETag（条件付きリクエスト用）
+            last_modified: 前回取得時のLast-Modified（条件付きリクエスト用）
+        
+        Returns:
+            dict: トップページが未更新（304）の場合は status='not_modified'
+        """
         
         # 1. robots.txt確認
         if not self.check_robots_txt():
@@ -115,38 +408,443 @@ class CompanyScraper:
                 'error': 'robots.txtでアクセスが禁止されています'
             }
         
-        # 2. 礼儀正しく待機
-        time.sleep(self.delay)
-        
-        # 3. ページ取得
+        # 2. ページ取得（条件付き）
         try:
-            html = self.fetch_page()
+            html, validators = self.fetch_landing_page(etag, last_modified, max_bytes)
         except Exception as e:
             return {
                 'status': 'failed',
                 'error': str(e)
             }
         
-        # 4. コンテンツ抽出
-        main_content = self.extract_with_trafilatura(html)
-        structured_data = self.extract_with_beautifulsoup(html)
+        if html is None:
+            logger.info(f"トップページは未更新です: {self.url}")
+            return {
+                'status': 'not_modified',
+                'url': self.url,
+                'domain': self.domain,
+                **validators,
+            }
+        
+        # 3. トップページの解析（1回の解析でメタデータ・リンク・本文を取得）
+        landing = extract_page(html)
+        
+        # 4. 関連ページのクロール（本文が短いSPAなどはサイトマップからもページを探す）
+        links = landing['links']
+        if max_pages > 1 and landing['content_source'] == 'embedded':
+            links = links + [(url, '') for url in self.fetch_sitemap_urls()]
+        pages = self.crawl(html, links, max_pages, max_bytes)
         
-        # 5. 結果の統合
+        # 5. コンテンツ抽出（ページ間で重複する定型文は除去）
+        pages[0]['content'] = landing['content']
+        pages[0]['content_source'] = landing['content_source']
+        for page in pages[1:]:
+            extracted = extract_page(page['html'], metadata=False)
+            page['content'] = extracted['content']
+            page['content_source'] = extracted['content_source']
+        remove_boilerplate(pages)
+        
+        main_content = pages[0]['content']
+        
+        # 6. 結果の統合（トップページの本文をHTMLから取れなかった場合は部分的）
         result = {
-            'status': 'success' if main_content else 'partial',
+            'status': 'success' if main_content and landing['content_source'] == 'html' else 'partial',
             'url': self.url,
             'domain': self.domain,
-            'title': structured_data.get('title', ''),
-            'meta_description': structured_data.get('meta_description', ''),
-            'main_content': main_content,
-            'headings': structured_data.get('headings', []),
+            'title': landing['title'],
+            'meta_description': landing['meta_description'],
+            'main_content': merge_page_contents(pages),
+            'content_bundle': build_content_bundle(pages),
+            'headings': landing['headings'],
+            'pages': [
+                {
+                    'url': page['url'],
+                    'category': page['category'],
+                    'chars': len(page['content']),
+                    'source': page['content_source'],
+                    'html': page['html'],
+                }
+                for page in pages
+            ],
+            **validators,
         }
+        result['content_hash'] = compute_content_hash(result)
+        result['has_enough_signal'] = has_enough_signal(result)
         
         return result
 
 
+def read_body(response, max_bytes=None):
+    """
+    ストリーミング中のレスポンス本文をmax_bytesまで読む
+    
+    Returns:
+        tuple: (本文のバイト列, 上限を超えて打ち切ったか)
+    """
+    if max_bytes is None:
+        return response.content, False
+    
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=FETCH_CHUNK_BYTES):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_bytes:
+            return b''.join(chunks)[:max_bytes], True
+    return b''.join(chunks), False
+
+
+def decode_body(body):
+    """本文の文字コードを推定してデコード（文字化け対策）"""
+    encoding = chardet.detect(body)['encoding'] or 'utf-8'
+    return body.decode(encoding, errors='replace')
+
+
+def normalize_host(netloc):
+    """比較用のホスト名（小文字化し、先頭のwww.を除く）"""
+    host = netloc.lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def extract_page(html, metadata=True):
+    """
+    HTMLを1回だけ解析して、メタデータ・リンク・本文を抽出
+    
+    trafilaturaと同じパーサーで木を作り、タイトル・見出しなどを先に読み取ってから
+    同じ木をtrafilaturaに渡す（trafilaturaは木を書き換えるため本文抽出は最後に行う）
+    
+    本文が短いページ（JavaScriptで描画するSPAなど）は、埋め込みデータから取り出した
+    テキストで補う（content_source='embedded'）
+    
+    Args:
+        html: HTML文字列
+        metadata: Falseの場合は本文のみ抽出する
+    
+    Returns:
+        dict: title / meta_description / headings / links / content / content_source
+    """
+    result = {
+        'title': '', 'meta_description': '', 'headings': [], 'links': [],
+        'content': '', 'content_source': 'html',
+    }
+    
+    try:
+        tree = load_html(html)
+    except Exception as e:
+        logger.error(f"HTML解析エラー: {e}")
+        return result
+    if tree is None:
+        return result
+    
+    if metadata:
+        try:
+            result.update(extract_metadata(tree))
+        except Exception as e:
+            logger.error(f"メタデータ抽出エラー: {e}")
+    
+    try:
+        embedded = extract_embedded_text(tree)
+    except Exception as e:
+        logger.error(f"埋め込みデータ抽出エラー: {e}")
+        embedded = ''
+    
+    try:
+        result['content'] = trafilatura.extract(
+            tree,
+            include_links=False,
+            include_images=False,
+            include_tables=True,
+            output_format='txt'
+        ) or ""
+    except Exception as e:
+        logger.error(f"trafilatura抽出エラー: {e}")
+    
+    if len(result['content']) < MIN_PAGE_CONTENT_CHARS and embedded:
+        result['content'] = '\n'.join(part for part in (result['content'], embedded) if part)
+        result['content_source'] = 'embedded'
+    
+    return result
+
+
+def extract_embedded_text(tree):
+    """
+    ブラウザを使わずに、HTMLに埋め込まれたデータからテキストを取り出す
+    
+    - JSON-LD（schema.org の Organization など）
+    - Next.js の __NEXT_DATA__ や Nuxt の __NUXT_DATA__ などのハイドレーション用JSON
+    - OGP・Twitterカードのメタタグ
+    """
+    lines = []
+    
+    for script in tree.xpath('//script[@type="application/ld+json"]'):
+        data = _load_script_json(script)
+        if data is not None:
+            lines.extend(_collect_json_ld_text(data))
+    
+    for script in tree.xpath('//script[@id="__NEXT_DATA__" or @type="application/json"]'):
+        data = _load_script_json(script)
+        if data is not None:
+            lines.extend(_collect_hydration_text(data))
+    
+    for name in SOCIAL_META_PROPERTIES:
+        for value in tree.xpath(f'//meta[@property="{name}" or @name="{name}"]/@content'):
+            if value.strip():
+                lines.append(value.strip())
+    
+    # 重複を除いて上限まで
+    texts = []
+    seen = set()
+    total = 0
+    for line in lines:
+        line = ' '.join(line.split())
+        if not line or line in seen:
+            continue
+        seen.add(line)
+        texts.append(line)
+        total += len(line)
+        if total >= EMBEDDED_TEXT_CHARS:
+            break
+    return '\n'.join(texts)[:EMBEDDED_TEXT_CHARS]
+
+
+def _load_script_json(script):
+    text = (script.text or '').strip()
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def _collect_json_ld_text(data):
+    """JSON-LDから企業情報に関係する項目を「項目名: 値」の形で取り出す"""
+    lines = []
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            for key, value in node.items():
+                if key in JSON_LD_TEXT_KEYS and isinstance(value, (str, int, float)) and str(value).strip():
+                    lines.append(f"{key}: {value}")
+                elif key in JSON_LD_TEXT_KEYS and isinstance(value, list):
+                    values = [str(item) for item in value if isinstance(item, (str, int, float))]
+                    if values:
+                        lines.append(f"{key}: {', '.join(values)}")
+                if isinstance(value, (dict, list)):
+                    stack.append(value)
+    return lines
+
+
+def _collect_hydration_text(data):
+    """
+    ハイドレーション用JSONから文章らしい文字列を取り出す
+    
+    ID・URL・クラス名などを避けるため、空白か非ASCII文字を含むある程度の長さの文字列のみ対象にする
+    """
+    lines = []
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, str):
+            text = node.strip()
+            if len(text) < 10 or text.startswith(('http://', 'https://', '/', '{', '<')):
+                continue
+            if ' ' in text or not text.isascii():
+                lines.append(text)
+    return lines
+
+
+def has_enough_signal(scraped_data, min_chars=MIN_SIGNAL_CHARS):
+    """AI構造化に回すだけの情報があるか（タイトル・説明・見出し・本文の合計文字数で判定）"""
+    total = (
+        len(scraped_data.get('title', ''))
+        + len(scraped_data.get('meta_description', ''))
+        + sum(len(heading) for heading in scraped_data.get('headings', []))
+        + len(scraped_data.get('content_bundle', ''))
+    )
+    return total >= min_chars
+
+
+def parse_sitemap(content):
+    """
+    サイトマップXMLを解析
+    
+    Returns:
+        tuple: (ページのURLリスト, 子サイトマップのURLリスト)
+    """
+    try:
+        root = etree.fromstring(content, parser=etree.XMLParser(resolve_entities=False, no_network=True, recover=True))
+    except etree.XMLSyntaxError:
+        return [], []
+    if root is None:
+        return [], []
+    
+    locs = [loc.strip() for loc in root.xpath('//*[local-name()="loc"]/text()') if loc.strip()]
+    if etree.QName(root).localname == 'sitemapindex':
+        return [], locs
+    return locs, []
+
+
+def extract_metadata(tree):
+    """解析済みの木からタイトル・メタディスクリプション・見出し（上位10個）・リンクを取得"""
+    title = tree.findtext('.//title') or ''
+    
+    meta_desc = ''
+    for xpath in ('//meta[@name="description"]/@content', '//meta[@property="og:description"]/@content'):
+        values = [value.strip() for value in tree.xpath(xpath) if value.strip()]
+        if values:
+            meta_desc = values[0]
+            break
+    
+    # 見出し抽出（企業の特徴把握）
+    headings = []
+    for h_tag in tree.iter('h1', 'h2', 'h3'):
+        text = h_tag.text_content().strip()
+        if text:
+            headings.append(text)
+            if len(headings) >= 10:
+                break
+    
+    links = [
+        (a_tag.get('href'), ' '.join(a_tag.text_content().split()))
+        for a_tag in tree.iter('a')
+        if a_tag.get('href')
+    ]
+    
+    return {
+        'title': title.strip(),
+        'meta_description': meta_desc,
+        'headings': headings,
+        'links': links,
+    }
+
+
+def classify_link(text, path):
+    """
+    リンクテキストとURLパスからページの種類を判定
+    
+    Returns:
+        dict: {'category', 'label', 'score'} または None
+    """
+    text = (text or '').lower()
+    path_tokens = set(re.split(r'[/\-_.]+', (path or '').lower()))
+    
+    best = None
+    for category, label, priority, keywords in CRAWL_TARGETS:
+        score = 0
+        for keyword in keywords:
+            keyword = keyword.lower()
+            if len(keyword) > 2 and keyword in text:
+                score = max(score, 2)
+            elif keyword == text:
+                score = max(score, 2)
+            if keyword in path_tokens:
+                score = max(score, 1)
+        if score and (best is None or score * 10 + priority > best['score']):
+            best = {'category': category, 'label': label, 'score': score * 10 + priority}
+    return best
+
+
+def remove_boilerplate(pages):
+    """
+    ページ間で重複する行（ヘッダー・フッター・ナビゲーションなど）を除去
+    
+    先に出現したページの行を残し、後続ページの同じ行は削除する
+    """
+    seen = set()
+    for page in pages:
+        lines = []
+        for line in page['content'].splitlines():
+            key = line.strip()
+            if not key:
+                continue
+            if key in seen:
+                continue
+            seen.add(key)
+            lines.append(line)
+        page['content'] = '\n'.join(lines)
+
+
+def merge_page_contents(pages):
+    """全ページの本文を見出し付きで結合"""
+    parts = []
+    for page in pages:
+        if page['content']:
+            parts.append(f"【{page['label']}】{page['url']}\n{page['content']}")
+    return '\n\n'.join(parts)
+
+
+def build_content_bundle(pages, max_chars=CONTENT_BUNDLE_CHARS):
+    """
+    AIに渡す本文をページの優先度順に組み立てる
+    
+    会社概要・事業内容など優先度の高いページを先に置き、
+    文字数の上限は残りページ数で均等に割り当てる（余った分は後続ページに回す）
+    """
+    ranked = [page for page in pages if page['content']]
+    ranked.sort(key=lambda page: (page['category'] != 'top', page['score']), reverse=True)
+    
+    parts = []
+    remaining = max_chars
+    for index, page in enumerate(ranked):
+        share = remaining // (len(ranked) - index)
+        content = page['content'][:share]
+        remaining -= len(content)
+        parts.append(f"【{page['label']}】\n{content}")
+    return '\n\n'.join(parts)
+
+
+def normalize_content(text):
+    """比較用に本文を正規化（全角・半角の統一、空白の圧縮）"""
+    text = unicodedata.normalize('NFKC', text or '')
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def compute_content_hash(scraped_data):
+    """
+    AI構造化の入力となる情報（タイトル・説明・見出し・本文）の正規化ハッシュ
+    
+    ハッシュが前回と同じ場合はAI構造化を省略できる
+    """
+    parts = [
+        scraped_data.get('title', ''),
+        scraped_data.get('meta_description', ''),
+        '\n'.join(scraped_data.get('headings', [])),
+        scraped_data.get('main_content', ''),
+    ]
+    normalized = '\x1f'.join(normalize_content(part) for part in parts)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
 def extract_domain(url):
     """URLからドメインを抽出"""
     parsed = urlparse(url)
     return parsed.netloc
 
+
+def normalize_domain(url):
+    """
+    重複判定用にURLのドメインを正規化
+    
+    小文字化し、ポート番号・末尾のドット・先頭の www. を除く
+    （例: https://WWW.Example.co.jp:443/about → example.co.jp）
+    """
+    if '://' not in url:
+        url = f'//{url}'
+    try:
+        host = urlparse(url).hostname or ''
+    except ValueError:
+        return ''
+    
+    host = host.rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
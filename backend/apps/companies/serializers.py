@@ -9,6 +9,7 @@ class CompanySerializer(serializers.ModelSerializer):
     """企業情報のシリアライザ"""
     
     scrape_status_display = serializers.CharField(source='get_scrape_status_display', read_only=True)
+    main_content = serializers.CharField(read_only=True)
     
     class Meta:
         model = Company
@@ -82,3 +83,46 @@ class CompanyScrapeRequestSerializer(serializers.Serializer):
     company_id = serializers.IntegerField()
     force_rescrape = serializers.BooleanField(default=False)
 
+
+
+class CompanyBulkImportSerializer(serializers.Serializer):
+    """企業の一括インポート用（CSVファイルまたはURLのリスト）"""
+    
+    file = serializers.FileField(required=False)
+    urls = serializers.ListField(
+        child=serializers.CharField(max_length=500),
+        required=False
+    )
+    auto_scrape = serializers.BooleanField(default=True)
+    
+    def validate_file(self, value):
+        """CSVファイルの検証"""
+        if not value.name.lower().endswith('.csv'):
+            raise serializers.ValidationError("CSVファイルのみアップロード可能です")
+        
+        # ファイルサイズチェック（10MB以下）
+        if value.size > 10 * 1024 * 1024:
+            raise serializers.ValidationError("ファイルサイズは10MB以下にしてください")
+        
+        return value
+    
+    def validate(self, data):
+        from .importer import MAX_IMPORT_URLS, parse_csv_urls
+        
+        if data.get('file'):
+            try:
+                urls = parse_csv_urls(data['file'].read())
+            except ValueError as e:
+                raise serializers.ValidationError({'file': str(e)})
+        elif data.get('urls'):
+            urls = data['urls']
+        else:
+            raise serializers.ValidationError("CSVファイルまたはURLのリストを指定してください")
+        
+        if not urls:
+            raise serializers.ValidationError("URLが見つかりません")
+        if len(urls) > MAX_IMPORT_URLS:
+            raise serializers.ValidationError(f"一度にインポートできるURLは{MAX_IMPORT_URLS}件までです")
+        
+        data['urls'] = urls
+        return data
@@ -2,24 +2,145 @@
 企業情報取得のCeleryタスク
 """
 from celery import shared_task
+from celery.exceptions import Retry
+from django.core.cache import cache
 from django.utils import timezone
 import logging
 import json
+import uuid
 
 from apps.core.utils import get_openai_api_key, is_ai_enabled
+from apps.core.prompt_builder import build_prompt_messages
+from apps.core.llm import create_chat_completion
 
 logger = logging.getLogger(__name__)
 
 
+STRUCTURE_SYSTEM_PROMPT = "あなたは企業分析の専門家です。Webサイトの情報から企業の特徴を正確に抽出します。"
+
+# 静的な指示ブロック（プロンプトキャッシュが効くよう先頭に置く）
+STRUCTURE_INSTRUCTIONS = """
+以下は企業のWebサイトからスクレイピングした情報です。
+この情報から、企業の重要な情報を抽出して構造化してください。
+
+# 抽出してほしい情報（JSON形式で返してください）
+{
+  "company_name": "企業名",
+  "business_description": "事業内容の簡潔な説明",
+  "industry": "業界（IT、製造、小売など）",
+  "key_services": ["主要サービス1", "主要サービス2"],
+  "target_market": "ターゲット市場・顧客層",
+  "pain_points": ["推定される課題1", "推定される課題2"],
+  "ai_summary": "企業の特徴を3-4文で要約"
+}
+
+※情報が不明な項目は空文字または空配列を返してください。
+"""
+
+# 一括構造化用の指示ブロック（複数企業を1回のリクエストで構造化する）
+BATCH_STRUCTURE_INSTRUCTIONS = """
+以下は複数の企業のWebサイトからスクレイピングした情報です。
+企業ごとに重要な情報を抽出して構造化してください。
+
+# 抽出してほしい情報（JSON形式で返してください）
+{
+  "companies": [
+    {
+      "id": "見出しに記載された企業ID",
+      "company_name": "企業名",
+      "business_description": "事業内容の簡潔な説明",
+      "industry": "業界（IT、製造、小売など）",
+      "key_services": ["主要サービス1", "主要サービス2"],
+      "target_market": "ターゲット市場・顧客層",
+      "pain_points": ["推定される課題1", "推定される課題2"],
+      "ai_summary": "企業の特徴を3-4文で要約"
+    }
+  ]
+}
+
+※入力されたすべての企業について、企業IDごとに1件ずつ返してください。
+※企業間で情報を混同しないでください。
+※情報が不明な項目は空文字または空配列を返してください。
+"""
+
+# AI構造化の結果の項目
+STRUCTURED_TEXT_FIELDS = ['company_name', 'business_description', 'industry', 'target_market', 'ai_summary']
+STRUCTURED_LIST_FIELDS = ['key_services', 'pain_points']
+
+# 一括構造化の待ち行列（Redisのリスト）と1リクエストあたりの企業数
+STRUCTURE_QUEUE_KEY = 'company_structure_queue'
+STRUCTURE_BATCH_SIZE = 8
+
+# 1回のタスクで処理するバッチ数の上限（CELERY_TASK_TIME_LIMIT 内に終わらせ、残りは次回に回す）
+STRUCTURE_MAX_BATCHES_PER_RUN = 10
+
+# 処理中のバッチ（バッチIDごとのリストと、取り出し時刻を持つソート済みセット）
+STRUCTURE_PROCESSING_KEY = 'company_structure_processing'
+STRUCTURE_PROCESSING_BATCH_KEY = 'company_structure_processing:{batch_id}'
+# この秒数を過ぎても完了しないバッチはワーカーが落ちたと見なして待ち行列に戻す
+# （実行中のバッチを戻さないよう CELERY_TASK_TIME_LIMIT より長くする）
+STRUCTURE_PROCESSING_TIMEOUT = 60 * 40
+
+# 待ち行列の先頭からARGV[1]件をLMOVEで処理中のリストへ移し、取り出し時刻を記録する
+CLAIM_BATCH_SCRIPT = """
+local items = {}
+for i = 1, tonumber(ARGV[1]) do
+    local item = redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT')
+    if not item then break end
+    items[#items + 1] = item
+end
+if #items > 0 then
+    redis.call('ZADD', KEYS[3], redis.call('TIME')[1], ARGV[2])
+end
+return items
+"""
+
+# 取り出しから一定時間を過ぎた処理中のバッチを待ち行列の先頭に戻し、戻したバッチ数を返す
+REQUEUE_STALE_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[1]))
+for _, batch_id in ipairs(stale) do
+    local batch_key = ARGV[2] .. batch_id
+    while redis.call('LMOVE', batch_key, KEYS[1], 'RIGHT', 'LEFT') do end
+    redis.call('ZREM', KEYS[2], batch_id)
+end
+return #stale
+"""
+
+_claim_batch = None
+_requeue_stale = None
+
+# 一括構造化で1社あたりに渡す本文の文字数
+BATCH_CONTENT_CHARS = 1500
+
+# 定期更新で投入済み・未完了の企業（次回の定期更新で重複して投入しない）
+REFRESH_QUEUED_KEY = 'company_refresh_queued:{company_id}'
+REFRESH_QUEUED_TTL = 60 * 60 * 6
+
+# 参照されていないBLOBを削除するまでの猶予（保存直後でDBへの反映前のBLOBを残す）
+BLOB_GC_GRACE_SECONDS = 60 * 60 * 24
+
+
 @shared_task(bind=True)
-def scrape_and_structure_company(self, company_id):
+def scrape_and_structure_company(self, company_id, slot_reserved=False, force=False,
+                                 refresh_run_id=None, batch_structure=False):
     """
     企業情報のスクレイピングとAI構造化
+    
+    前回取得時からサイトが更新されていない場合（304、または本文ハッシュが同じ場合）は
+    AI構造化を省略して取得日時のみ更新する
+    
+    Args:
+        company_id: 企業ID
+        slot_reserved: ドメインのアクセス枠を予約済みか（スケジューラから投入された場合True）
+        force: Trueの場合は更新の有無にかかわらず再取得・AI構造化する
+        refresh_run_id: 定期更新から投入された場合のCompanyRefreshRunのID
+        batch_structure: Trueの場合はAI構造化を待ち行列に入れ、複数企業まとめて行う
     """
     from apps.companies.models import Company
-    from apps.companies.scraper import CompanyScraper
+    from apps.companies.scraper import CompanyScraper, extract_domain
+    from apps.companies.scheduler import reserve_domain_slot
     from apps.core.models import SystemSettings
-    from openai import OpenAI
     
     try:
         # 進捗更新: 開始
@@ -34,80 +155,101 @@ def scrape_and_structure_company(self, company_id):
         if not settings.scraping_enabled:
             raise Exception("スクレイピング機能が無効化されています")
         
-        # スクレイピング実行
+        # 同一ドメインへのアクセス間隔を守る（待機中はワーカーを解放する）
+        if not slot_reserved:
+            wait = reserve_domain_slot(
+                company.domain or extract_domain(company.url),
+                settings.scraping_delay_seconds
+            )
+            if wait > 0:
+                raise self.retry(
+                    countdown=wait,
+                    args=[company_id],
+                    kwargs={
+                        'slot_reserved': True,
+                        'force': force,
+                        'refresh_run_id': refresh_run_id,
+                        'batch_structure': batch_structure
+                    }
+                )
+        
+        # スクレイピング実行（構造化済みの場合は条件付きリクエスト）
+        conditional = company.is_structured() and not force
         scraper = CompanyScraper(
             company.url,
             timeout=settings.scraping_timeout_seconds,
             delay=settings.scraping_delay_seconds
         )
-        scraped_data = scraper.scrape()
+        scraped_data = scraper.scrape(
+            max_pages=settings.scraping_max_pages,
+            etag=company.http_etag if conditional else '',
+            last_modified=company.http_last_modified if conditional else ''
+        )
         
         if scraped_data['status'] == 'failed':
             company.scrape_status = 'failed'
             company.save()
             raise Exception(scraped_data.get('error', 'スクレイピング失敗'))
         
-        # 進捗更新: 50%
-        self.update_state(state='PROGRESS', meta={'progress': 50, 'status': 'AI分析中'})
+        # 未更新ならAI構造化を省略
+        if scraped_data['status'] == 'not_modified' or (
+            conditional and scraped_data['content_hash'] == company.content_hash
+        ):
+            company.http_etag = scraped_data['etag']
+            company.http_last_modified = scraped_data['last_modified']
+            company.scraped_at = timezone.now()
+            company.save(update_fields=['http_etag', 'http_last_modified', 'scraped_at'])
+            
+            logger.info(f"企業情報は未更新のためAI構造化を省略: {company_id} ({scraped_data['status']})")
+            _record_refresh_result(refresh_run_id, company_id, 'unchanged')
+            
+            return {
+                'status': 'unchanged',
+                'company_id': company_id,
+                'company_name': company.company_name
+            }
         
-        # AIで構造化
-        client = OpenAI(api_key=get_openai_api_key())
+        # 情報が少なすぎる場合（SPAの空のページなど）はAI構造化を行わない
+        if not scraped_data['has_enough_signal']:
+            _save_scraped_data(company, scraped_data)
+            company.scrape_status = 'partial'
+            company.scraped_at = timezone.now()
+            company.save()
+            
+            logger.warning(f"企業情報が不足しているためAI構造化を省略: {company_id}")
+            _record_refresh_result(refresh_run_id, company_id, 'insufficient')
+            
+            return {
+                'status': 'insufficient_content',
+                'company_id': company_id,
+                'company_name': company.company_name
+            }
         
-        prompt = f"""
-以下は企業のWebサイトからスクレイピングした情報です。
-この情報から、企業の重要な情報を抽出して構造化してください。
-
-# スクレイピングデータ
-タイトル: {scraped_data['title']}
-説明: {scraped_data['meta_description']}
-見出し: {', '.join(scraped_data.get('headings', []))}
-本文（抜粋）: {scraped_data['main_content'][:2000]}
-
-# 抽出してほしい情報（JSON形式で返してください）
-{{
-  "company_name": "企業名",
-  "business_description": "事業内容の簡潔な説明",
-  "industry": "業界（IT、製造、小売など）",
-  "key_services": ["主要サービス1", "主要サービス2"],
-  "target_market": "ターゲット市場・顧客層",
-  "pain_points": ["推定される課題1", "推定される課題2"],
-  "ai_summary": "企業の特徴を3-4文で要約"
-}}
-
-※情報が不明な項目は空文字または空配列を返してください。
-"""
+        # 一括構造化の場合はスクレイピング結果を保存して待ち行列に入れる
+        if batch_structure:
+            _save_scraped_data(company, scraped_data)
+            company.save()
+            queued = _enqueue_structure(company_id, scraped_data, refresh_run_id)
+            
+            logger.info(f"企業情報の構造化を待ち行列に追加: {company_id}")
+            
+            return {
+                'status': 'queued_for_structuring' if queued else 'structure_queue_failed',
+                'company_id': company_id
+            }
         
-        response = client.chat.completions.create(
-            model=settings.default_ai_model or "gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "あなたは企業分析の専門家です。Webサイトの情報から企業の特徴を正確に抽出します。"},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.3
-        )
+        # 進捗更新: 50%
+        self.update_state(state='PROGRESS', meta={'progress': 50, 'status': 'AI分析中'})
         
-        structured_info = json.loads(response.choices[0].message.content)
+        # AIで構造化
+        structured_info = request_company_structure(settings, scraped_data)
         
         # データベース保存
-        company.title = scraped_data['title']
-        company.meta_description = scraped_data['meta_description']
-        company.main_content = scraped_data['main_content']
-        company.scrape_status = scraped_data['status']
-        
-        # AI抽出情報
-        company.company_name = structured_info.get('company_name', '')
-        company.business_description = structured_info.get('business_description', '')
-        company.industry = structured_info.get('industry', '')
-        company.key_services = structured_info.get('key_services', [])
-        company.target_market = structured_info.get('target_market', '')
-        company.pain_points = structured_info.get('pain_points', [])
-        company.ai_summary = structured_info.get('ai_summary', '')
-        
-        company.scraped_at = timezone.now()
-        company.save()
+        _save_scraped_data(company, scraped_data)
+        _save_structured_info(company, structured_info, scraped_data['content_hash'])
         
         logger.info(f"企業情報取得完了: {company_id} - {company.company_name}")
+        _record_refresh_result(refresh_run_id, company_id, 'success')
         
         return {
             'status': 'success',
@@ -115,8 +257,371 @@ def scrape_and_structure_company(self, company_id):
             'company_name': company.company_name
         }
         
+    except Retry:
+        raise
+    
     except Exception as e:
         logger.error(f"企業情報取得エラー: {e}")
+        _record_refresh_result(refresh_run_id, company_id, 'failed')
         self.update_state(state='FAILURE', meta={'error': str(e)})
         raise
 
+
+def build_structure_data(scraped_data):
+    """AI構造化に渡すスクレイピングデータのテキスト"""
+    return (
+        f"タイトル: {scraped_data.get('title', '')}\n"
+        f"説明: {scraped_data.get('meta_description', '')}\n"
+        f"見出し: {', '.join(scraped_data.get('headings', []))}\n"
+        f"本文（抜粋）:\n{scraped_data.get('content_bundle', '')}"
+    )
+
+
+def request_company_structure(settings, scraped_data):
+    """1社分のスクレイピングデータをAIで構造化"""
+    from openai import OpenAI
+    
+    client = OpenAI(api_key=get_openai_api_key())
+    
+    prompt = build_prompt_messages(
+        'company_analysis',
+        STRUCTURE_INSTRUCTIONS,
+        [('スクレイピングデータ', build_structure_data(scraped_data))],
+        fallback_system_prompt=STRUCTURE_SYSTEM_PROMPT
+    )
+    
+    response = create_chat_completion(
+        client,
+        'company_analysis',
+        model=prompt['model_override'] or settings.default_ai_model or "gpt-4o-mini",
+        messages=prompt['messages'],
+        response_format={"type": "json_object"},
+        temperature=(
+            prompt['temperature_override']
+            if prompt['temperature_override'] is not None
+            else 0.3
+        )
+    )
+    
+    return json.loads(response.choices[0].message.content)
+
+
+def validate_structured_info(info):
+    """
+    一括構造化の1件分の結果を検証
+    
+    Returns:
+        dict: 整形した結果。形式が不正、または中身が空の場合はNone
+    """
+    if not isinstance(info, dict):
+        return None
+    
+    cleaned = {}
+    for field in STRUCTURED_TEXT_FIELDS:
+        value = info.get(field) or ''
+        if not isinstance(value, str):
+            return None
+        cleaned[field] = value.strip()
+    for field in STRUCTURED_LIST_FIELDS:
+        value = info.get(field) or []
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            return None
+        cleaned[field] = [item.strip() for item in value if item.strip()]
+    
+    if not (cleaned['company_name'] or cleaned['business_description'] or cleaned['ai_summary']):
+        return None
+    return cleaned
+
+
+def _save_scraped_data(company, scraped_data):
+    """スクレイピング結果を設定（本文・HTMLはsave()時に圧縮BLOBストアに保存される）"""
+    company.set_page_snapshots(scraped_data['pages'])
+    company.title = scraped_data['title']
+    company.meta_description = scraped_data['meta_description']
+    company.main_content = scraped_data['main_content']
+    company.scrape_status = scraped_data['status']
+    company.http_etag = scraped_data['etag']
+    company.http_last_modified = scraped_data['last_modified']
+
+
+def _save_structured_info(company, structured_info, content_hash):
+    """AI抽出情報を保存（content_hashは構造化が済んだ時点で保存する）"""
+    company.company_name = structured_info.get('company_name', '')
+    company.business_description = structured_info.get('business_description', '')
+    company.industry = structured_info.get('industry', '')
+    company.key_services = structured_info.get('key_services', [])
+    company.target_market = structured_info.get('target_market', '')
+    company.pain_points = structured_info.get('pain_points', [])
+    company.ai_summary = structured_info.get('ai_summary', '')
+    company.content_hash = content_hash
+    
+    company.scraped_at = timezone.now()
+    company.save()
+
+
+def _enqueue_structure(company_id, scraped_data, refresh_run_id):
+    """
+    一括構造化の待ち行列に追加
+    
+    1リクエスト分たまったら一括構造化タスクを投入する（残りはbeatで定期的に処理する）
+    """
+    payload = {
+        'company_id': company_id,
+        'refresh_run_id': refresh_run_id,
+        'content_hash': scraped_data['content_hash'],
+        'scraped': {
+            'title': scraped_data['title'],
+            'meta_description': scraped_data['meta_description'],
+            'headings': scraped_data['headings'],
+            'content_bundle': scraped_data['content_bundle'][:BATCH_CONTENT_CHARS],
+        },
+    }
+    
+    try:
+        from django_redis import get_redis_connection
+        length = get_redis_connection('default').rpush(STRUCTURE_QUEUE_KEY, json.dumps(payload, ensure_ascii=False))
+    except Exception as e:
+        logger.error(f"構造化の待ち行列への追加に失敗 ({company_id}): {e}")
+        _record_refresh_result(refresh_run_id, company_id, 'failed')
+        return False
+    
+    if length >= STRUCTURE_BATCH_SIZE:
+        structure_companies_batch.delay()
+    return True
+
+
+def _record_refresh_result(refresh_run_id, company_id, outcome):
+    """定期更新から投入された場合に結果を記録"""
+    if not refresh_run_id:
+        return
+    
+    from apps.companies.models import CompanyRefreshRun
+    
+    try:
+        CompanyRefreshRun.record_result(refresh_run_id, outcome)
+        cache.delete(REFRESH_QUEUED_KEY.format(company_id=company_id))
+    except Exception as e:
+        logger.warning(f"定期更新の結果の記録に失敗 ({company_id}): {e}")
+
+
+
+@shared_task
+def structure_companies_batch():
+    """
+    待ち行列の企業をまとめてAI構造化（Celery beatから1分ごとにも実行）
+    
+    STRUCTURE_BATCH_SIZE 社ずつ1回のJSONモードのリクエストで構造化し、
+    結果が欠けていたり形式が不正な企業は1社ずつ構造化し直す。
+    取り出した企業は完了まで処理中のリストに残し、STRUCTURE_PROCESSING_TIMEOUT を
+    過ぎても完了しないバッチは次回の実行で待ち行列に戻す。
+    1回の実行では STRUCTURE_MAX_BATCHES_PER_RUN バッチまで処理し、1バッチ分以上が
+    残っていれば自身を投入し直す
+    """
+    from django_redis import get_redis_connection
+    from apps.core.models import SystemSettings
+    
+    global _claim_batch, _requeue_stale
+    
+    redis = get_redis_connection('default')
+    if _claim_batch is None:
+        _claim_batch = redis.register_script(CLAIM_BATCH_SCRIPT)
+        _requeue_stale = redis.register_script(REQUEUE_STALE_SCRIPT)
+    
+    settings = SystemSettings.get_settings()
+    processed = 0
+    
+    # 処理中にワーカーが落ちたバッチを待ち行列に戻す
+    requeued = _requeue_stale(
+        keys=[STRUCTURE_QUEUE_KEY, STRUCTURE_PROCESSING_KEY],
+        args=[STRUCTURE_PROCESSING_TIMEOUT, STRUCTURE_PROCESSING_BATCH_KEY.format(batch_id='')]
+    )
+    if requeued:
+        logger.warning(f"完了しなかった構造化バッチを待ち行列に戻しました: {requeued}件")
+    
+    batches = 0
+    while batches < STRUCTURE_MAX_BATCHES_PER_RUN:
+        # 処理中のリストへ移してから構造化し、完了後に削除する（途中で落ちても失われない）
+        batch_id = uuid.uuid4().hex
+        batch_key = STRUCTURE_PROCESSING_BATCH_KEY.format(batch_id=batch_id)
+        items = _claim_batch(
+            keys=[STRUCTURE_QUEUE_KEY, batch_key, STRUCTURE_PROCESSING_KEY],
+            args=[STRUCTURE_BATCH_SIZE, batch_id]
+        )
+        if not items:
+            break
+        
+        payloads = [json.loads(item) for item in items]
+        _structure_batch(settings, payloads)
+        processed += len(payloads)
+        batches += 1
+        
+        pipe = redis.pipeline()
+        pipe.delete(batch_key)
+        pipe.zrem(STRUCTURE_PROCESSING_KEY, batch_id)
+        pipe.execute()
+    
+    # 上限まで処理しても残っている場合は続きを投入する（端数はbeatの次回実行で処理）
+    if batches >= STRUCTURE_MAX_BATCHES_PER_RUN and redis.llen(STRUCTURE_QUEUE_KEY) >= STRUCTURE_BATCH_SIZE:
+        structure_companies_batch.delay()
+    
+    return {'status': 'success', 'processed': processed, 'requeued_batches': requeued}
+
+
+def _structure_batch(settings, payloads):
+    """1バッチ分の企業を構造化して保存"""
+    from apps.companies.models import Company
+    from openai import OpenAI
+    
+    results = {}
+    if len(payloads) > 1:
+        try:
+            client = OpenAI(api_key=get_openai_api_key())
+            
+            prompt = build_prompt_messages(
+                'company_analysis_batch',
+                BATCH_STRUCTURE_INSTRUCTIONS,
+                [
+                    (f"企業ID: {payload['company_id']}", build_structure_data(payload['scraped']))
+                    for payload in payloads
+                ],
+                fallback_system_prompt=STRUCTURE_SYSTEM_PROMPT
+            )
+            
+            response = create_chat_completion(
+                client,
+                'company_analysis_batch',
+                model=settings.default_ai_model or "gpt-4o-mini",
+                messages=prompt['messages'],
+                response_format={"type": "json_object"},
+                temperature=0.3
+            )
+            
+            entries = json.loads(response.choices[0].message.content).get('companies', [])
+            for entry in entries if isinstance(entries, list) else []:
+                if not isinstance(entry, dict):
+                    continue
+                info = validate_structured_info(entry)
+                if info is not None:
+                    results[str(entry.get('id', '')).strip()] = info
+        except Exception as e:
+            logger.error(f"企業情報の一括構造化エラー: {e}")
+    
+    retried = 0
+    for payload in payloads:
+        company_id = payload['company_id']
+        info = results.get(str(company_id))
+        
+        try:
+            # 一括構造化で結果を得られなかった企業は1社ずつ構造化し直す
+            if info is None:
+                retried += 1
+                info = request_company_structure(settings, payload['scraped'])
+            
+            company = Company.objects.get(id=company_id)
+            _save_structured_info(company, info, payload['content_hash'])
+            _record_refresh_result(payload.get('refresh_run_id'), company_id, 'success')
+        except Exception as e:
+            logger.error(f"企業情報の構造化エラー ({company_id}): {e}")
+            _record_refresh_result(payload.get('refresh_run_id'), company_id, 'failed')
+    
+    logger.info(f"企業情報の一括構造化: {len(payloads)}社, 個別に再実行{retried}社")
+
+
+@shared_task
+def scrape_companies_bulk(company_ids, batch_structure=True):
+    """
+    複数企業のスクレイピングを一括投入
+    
+    ドメインごとの間隔を守りつつ、異なるドメインは並行して処理される
+    
+    Args:
+        company_ids: 企業IDのリスト
+        batch_structure: AI構造化を複数企業まとめて行うか
+    """
+    from apps.companies.models import Company
+    from apps.companies.scheduler import enqueue_company_scrapes
+    from apps.core.models import SystemSettings
+    
+    settings = SystemSettings.get_settings()
+    companies = Company.objects.filter(id__in=company_ids).only('id', 'url', 'domain')
+    
+    return enqueue_company_scrapes(
+        companies,
+        settings.scraping_delay_seconds,
+        task_kwargs={'batch_structure': batch_structure}
+    )
+
+
+@shared_task
+def refresh_stale_companies():
+    """
+    更新が必要な企業情報の定期更新（Celery beatから1時間ごとに実行）
+    
+    取得日時の古い順に company_refresh_batch_size 件までを投入する。
+    投入はドメインごとの間隔を守り、結果は CompanyRefreshRun に集計する。
+    """
+    from apps.companies.models import Company, CompanyRefreshRun
+    from apps.companies.scheduler import enqueue_company_scrapes
+    from apps.core.models import SystemSettings
+    
+    settings = SystemSettings.get_settings()
+    if not settings.company_refresh_enabled or not settings.scraping_enabled:
+        logger.info("企業情報の定期更新は無効化されています")
+        return {'status': 'disabled'}
+    
+    stale = Company.get_stale(settings.company_refresh_days).only('id', 'url', 'domain')
+    run = CompanyRefreshRun.objects.create(stale_count=stale.count())
+    
+    # 前回の定期更新で投入済み・未完了の企業は除外する
+    targets = []
+    skipped = 0
+    for company in stale.iterator(chunk_size=settings.company_refresh_batch_size):
+        if len(targets) >= settings.company_refresh_batch_size:
+            break
+        queued_key = REFRESH_QUEUED_KEY.format(company_id=company.id)
+        if not cache.add(queued_key, run.id, REFRESH_QUEUED_TTL):
+            skipped += 1
+            continue
+        targets.append(company)
+    
+    enqueued = enqueue_company_scrapes(
+        targets,
+        settings.scraping_delay_seconds,
+        task_kwargs={'refresh_run_id': run.id, 'batch_structure': True}
+    )
+    
+    run.enqueued_count = len(enqueued)
+    run.skipped_count = skipped
+    run.save(update_fields=['enqueued_count', 'skipped_count'])
+    
+    logger.info(
+        f"企業情報の定期更新: 対象{run.stale_count}件, 投入{run.enqueued_count}件, "
+        f"スキップ{run.skipped_count}件"
+    )
+    
+    return {
+        'status': 'enqueued',
+        'run_id': run.id,
+        'stale_count': run.stale_count,
+        'enqueued_count': run.enqueued_count,
+        'skipped_count': run.skipped_count
+    }
+
+
+@shared_task
+def collect_unreferenced_blobs():
+    """
+    どの企業からも参照されていない本文・HTMLのBLOBを削除（Celery beatから1日1回実行）
+    
+    再取得で置き換えられた古い本文やHTMLスナップショットが対象
+    """
+    from apps.companies.models import Company
+    from apps.core.blob_store import collect_garbage
+    
+    result = collect_garbage(Company.get_referenced_blob_keys(), BLOB_GC_GRACE_SECONDS)
+    
+    logger.info(
+        f"未参照のBLOBを削除: 確認{result['checked']}件, 削除{result['deleted']}件, "
+        f"{result['freed_bytes']}バイト"
+    )
+    return {'status': 'success', **result}
@@ -3,15 +3,18 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from django_filters import rest_framework as filters
 
 from .models import Company
 from .serializers import (
     CompanySerializer,
     CompanyListSerializer,
-    CompanyScrapeRequestSerializer
+    CompanyScrapeRequestSerializer,
+    CompanyBulkImportSerializer
 )
-from .tasks import scrape_and_structure_company
+from .importer import import_companies
+from .tasks import scrape_and_structure_company, scrape_companies_bulk
 
 
 class CompanyFilter(filters.FilterSet):
@@ -40,11 +43,19 @@ class CompanyViewSet(viewsets.ModelViewSet):
     partial_update: 企業情報部分更新
     destroy: 企業情報削除
     scrape: 企業情報スクレイピング実行
+    bulk_import: 企業URLの一括インポート（CSV / JSON）
     """
     queryset = Company.objects.all().order_by('-created_at')
     permission_classes = [IsAuthenticated]
     filterset_class = CompanyFilter
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # 一覧では大きな列を読まない
+            return queryset.only(*CompanyListSerializer.Meta.fields)
+        return queryset.defer('page_snapshots')
+    
     def get_serializer_class(self):
         if self.action == 'list':
             return CompanyListSerializer
@@ -87,6 +98,33 @@ class CompanyViewSet(viewsets.ModelViewSet):
             'company_id': company.id
         }, status=status.HTTP_202_ACCEPTED)
     
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, MultiPartParser, FormParser])
+    def bulk_import(self, request):
+        """
+        企業URLの一括インポート
+        
+        CSVファイル（file）またはURLのリスト（urls）を受け付ける。
+        ドメインが重複する企業は登録せず、新規登録した企業のみスクレイピングを投入する。
+        """
+        serializer = CompanyBulkImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        result = import_companies(serializer.validated_data['urls'])
+        company_ids = result.pop('company_ids')
+        
+        # 新規登録した企業のみスクレイピング（ドメインごとの間隔はワーカー側で予約する）
+        task = None
+        if serializer.validated_data['auto_scrape'] and company_ids:
+            from apps.core.models import SystemSettings
+            if SystemSettings.get_settings().scraping_enabled:
+                task = scrape_companies_bulk.delay(company_ids)
+        
+        return Response({
+            'message': f"{result['created']}件の企業を登録しました",
+            **result,
+            'task_id': task.id if task else None
+        }, status=status.HTTP_201_CREATED)
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
@@ -3,7 +3,7 @@ from django import forms
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import SystemSettings, PromptTemplate, PromptVersion
+from .models import SystemSettings, PromptTemplate, PromptVersion, LLMUsageStat
 
 
 class SystemSettingsAdminForm(forms.ModelForm):
@@ -35,7 +35,8 @@ class SystemSettingsAdmin(admin.ModelAdmin):
         }),
         ('スクレイピング設定', {
             'fields': ('scraping_enabled', 'scraping_timeout_seconds', 
-                      'scraping_delay_seconds', 'respect_robots_txt'),
+                      'scraping_delay_seconds', 'respect_robots_txt', 'scraping_max_pages',
+                      'company_refresh_enabled', 'company_refresh_days', 'company_refresh_batch_size'),
         }),
         ('PDF処理設定', {
             'fields': ('max_pdf_file_size_mb', 'pdf_processing_enabled'),
@@ -256,7 +257,7 @@ class PromptTemplateAdmin(admin.ModelAdmin):
             '''
         }),
         ('AI設定（オプション）', {
-            'fields': ('model_override', 'temperature_override'),
+            'fields': ('model_override', 'temperature_override', 'timeout_override', 'fallback_model'),
             'classes': ('collapse',),
             'description': '空欄の場合はシステムデフォルト設定を使用'
         }),
@@ -301,3 +302,108 @@ class PromptTemplateAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return request.user.is_admin()
 
+
+
+@admin.register(LLMUsageStat)
+class LLMUsageStatAdmin(admin.ModelAdmin):
+    """LLM利用状況ダッシュボード（呼び出し箇所・モデル別の日次集計）"""
+    
+    change_list_template = 'admin/core/llmusagestat/change_list.html'
+    list_display = ['date', 'call_site', 'model', 'call_count', 'error_count', 'retry_count',
+                    'cache_hit_rate', 'prompt_tokens', 'completion_tokens',
+                    'avg_latency', 'p50_latency', 'p95_latency', 'p99_latency', 'cost_display']
+    list_filter = ['date', 'call_site', 'model']
+    date_hierarchy = 'date'
+    
+    def cache_hit_rate(self, obj):
+        if not obj.call_count:
+            return '-'
+        return f"{obj.cache_hit_count / obj.call_count:.0%}"
+    
+    cache_hit_rate.short_description = 'キャッシュヒット率'
+    
+    def avg_latency(self, obj):
+        return self._format_latency(obj.avg_latency_ms)
+    
+    avg_latency.short_description = '平均'
+    
+    def p50_latency(self, obj):
+        return self._format_latency(obj.latency_percentile(50))
+    
+    p50_latency.short_description = 'p50'
+    
+    def p95_latency(self, obj):
+        return self._format_latency(obj.latency_percentile(95))
+    
+    p95_latency.short_description = 'p95'
+    
+    def p99_latency(self, obj):
+        return self._format_latency(obj.latency_percentile(99))
+    
+    p99_latency.short_description = 'p99'
+    
+    def cost_display(self, obj):
+        return f"${obj.estimated_cost_usd:.4f}"
+    
+    cost_display.short_description = '推定コスト'
+    
+    @staticmethod
+    def _format_latency(latency_ms):
+        if latency_ms is None:
+            return '-'
+        return f"{latency_ms / 1000:.1f}秒"
+    
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+        
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response
+        
+        # 絞り込み結果を呼び出し箇所ごとに合算
+        summary = {}
+        for stat in queryset:
+            row = summary.setdefault(stat.call_site, {
+                'call_site': stat.call_site,
+                'call_count': 0,
+                'error_count': 0,
+                'retry_count': 0,
+                'cache_hit_count': 0,
+                'total_tokens': 0,
+                'total_latency_ms': 0,
+                'cost_usd': 0.0,
+                'histogram': {},
+            })
+            row['call_count'] += stat.call_count
+            row['error_count'] += stat.error_count
+            row['retry_count'] += stat.retry_count
+            row['cache_hit_count'] += stat.cache_hit_count
+            row['total_tokens'] += stat.prompt_tokens + stat.completion_tokens
+            row['total_latency_ms'] += stat.total_latency_ms
+            row['cost_usd'] += stat.estimated_cost_usd
+            for bucket, count in stat.latency_histogram.items():
+                row['histogram'][bucket] = row['histogram'].get(bucket, 0) + count
+        
+        rows = []
+        for row in summary.values():
+            histogram = row.pop('histogram')
+            calls = row['call_count']
+            row['avg_latency'] = self._format_latency(row['total_latency_ms'] / calls if calls else None)
+            row['p95_latency'] = self._format_latency(LLMUsageStat.percentile_from_histogram(histogram, 95))
+            row['p99_latency'] = self._format_latency(LLMUsageStat.percentile_from_histogram(histogram, 99))
+            row['cache_hit_rate'] = f"{row['cache_hit_count'] / calls:.0%}" if calls else '-'
+            rows.append(row)
+        
+        # コストの大きい順
+        rows.sort(key=lambda r: r['cost_usd'], reverse=True)
+        response.context_data['usage_summary'] = rows
+        response.context_data['usage_total_cost'] = sum(r['cost_usd'] for r in rows)
+        return response
+    
+    def has_add_permission(self, request):
+        # 集計は自動記録のみ
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,164 @@
+"""
+圧縮BLOBストア
+
+スクレイピング本文やHTMLのスナップショットなどの大きなデータを、
+zstdで圧縮してメディアボリューム上に保存する。
+ファイル名は圧縮前のデータのSHA-256（コンテンツアドレス）で、同じ内容は1つだけ保存される。
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import zstandard
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+COMPRESSION_LEVEL = 10
+
+_local = threading.local()
+
+
+def get_blob_root():
+    """BLOBの保存先ディレクトリ"""
+    return Path(getattr(settings, 'BLOB_STORE_ROOT', Path(settings.MEDIA_ROOT) / 'blobs'))
+
+
+def get_blob_path(key):
+    """キーに対応するファイルパス（先頭2文字ずつでディレクトリを分ける）"""
+    return get_blob_root() / key[:2] / key[2:4] / f'{key}.zst'
+
+
+def _compressor():
+    # ZstdCompressor / ZstdDecompressor はスレッド間で共有できないためスレッドごとに持つ
+    if not hasattr(_local, 'compressor'):
+        _local.compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+        _local.decompressor = zstandard.ZstdDecompressor()
+    return _local.compressor, _local.decompressor
+
+
+def get_key(data):
+    """データのキー（圧縮前のデータのSHA-256。strはUTF-8で計算）"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def put_blob(data):
+    """
+    データを圧縮して保存
+
+    Args:
+        data: bytes または str（strはUTF-8で保存）
+
+    Returns:
+        str: キー（圧縮前のデータのSHA-256）
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    key = get_key(data)
+    path = get_blob_path(key)
+    if path.exists():
+        # 参照されていないBLOBの削除（collect_garbage）の猶予期間を延ばす
+        try:
+            os.utime(path)
+            return key
+        except FileNotFoundError:
+            pass
+
+    compressor, _ = _compressor()
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # 書き込み途中のファイルを読まれないよう、一時ファイルに書いてから置き換える
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(compressor.compress(data))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return key
+
+
+def get_blob(key):
+    """
+    キーに対応するデータを取得
+
+    Returns:
+        bytes: 展開したデータ。見つからない場合はNone
+    """
+    if not key:
+        return None
+
+    try:
+        with open(get_blob_path(key), 'rb') as f:
+            compressed = f.read()
+    except FileNotFoundError:
+        logger.warning(f"BLOBが見つかりません: {key}")
+        return None
+
+    _, decompressor = _compressor()
+    return decompressor.decompress(compressed)
+
+
+def put_text(text):
+    """テキストを保存してキーを返す（空の場合は空文字）"""
+    if not text:
+        return ''
+    return put_blob(text)
+
+
+def get_text(key):
+    """キーに対応するテキストを取得（見つからない場合は空文字）"""
+    data = get_blob(key)
+    return data.decode('utf-8') if data is not None else ''
+
+
+def text_key(text):
+    """put_textが返すキー（保存はしない。空の場合は空文字）"""
+    if not text:
+        return ''
+    return get_key(text)
+
+
+def collect_garbage(referenced_keys, grace_seconds):
+    """
+    参照されていないBLOBを削除
+
+    保存直後でまだDBに参照が書かれていないBLOBを消さないよう、
+    更新からgrace_seconds秒以内のファイルは残す
+
+    Args:
+        referenced_keys: 参照されているキーの集合
+        grace_seconds: 削除しない猶予期間（秒）
+
+    Returns:
+        dict: 'checked'（確認したBLOB数）, 'deleted'（削除したBLOB数）, 'freed_bytes'
+    """
+    cutoff = time.time() - grace_seconds
+    checked = deleted = freed_bytes = 0
+
+    for path in get_blob_root().glob('*/*/*.zst'):
+        checked += 1
+        if path.stem in referenced_keys:
+            continue
+        try:
+            stat = path.stat()
+            if stat.st_mtime > cutoff:
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        deleted += 1
+        freed_bytes += stat.st_size
+
+    return {'checked': checked, 'deleted': deleted, 'freed_bytes': freed_bytes}
@@ -0,0 +1,341 @@
+"""
+OpenAI呼び出しの計測とリクエストポリシー
+
+すべての chat.completions 呼び出しをここを経由させ、呼び出し箇所（call site）ごとに
+レイテンシ・トークン数・リトライ回数・プロンプトキャッシュのヒットを
+LLMUsageStat に日次で集計する。
+あわせて呼び出し箇所ごとの期限・ヘッジ・モデルフォールバックを適用する。
+"""
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+import openai
+
+from .local_cache import VersionedLocalCache
+from .prompt_builder import get_cached_tokens, log_prompt_cache_usage
+
+logger = logging.getLogger(__name__)
+
+
+# モデル別の料金（USD / 100万トークン）: (入力, キャッシュ済み入力, 出力)
+MODEL_PRICING = {
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+}
+
+# 期限切れ・失敗時のフォールバックモデル（重要度の低い呼び出しのみ）
+FALLBACK_MODEL = 'gpt-4o-mini'
+
+# リクエストポリシーの既定値
+#   deadline: リトライを含めた全体の期限（秒）
+#   critical: Trueの場合はフォールバックしない
+#   hedge: ヘッジリクエストを使うか
+#   hedge_after: 利用統計が少ない場合のヘッジ開始秒数
+#   fallback_timeout: フォールバック時のタイムアウト（秒）
+DEFAULT_REQUEST_POLICY = {
+    'deadline': 60,
+    'critical': True,
+    'hedge': True,
+    'hedge_after': 20,
+    'fallback_timeout': 30,
+}
+
+# 呼び出し箇所ごとのポリシー（PromptTemplateのテンプレートタイプと共通の名前）
+CALL_SITE_POLICIES = {
+    'csv_analysis': {'deadline': 120, 'hedge_after': 40},
+    'product_matching': {'deadline': 90, 'hedge_after': 30},
+    'company_analysis': {'deadline': 60, 'critical': False},
+    'company_analysis_batch': {'deadline': 120, 'hedge_after': 60, 'critical': False},
+    'script_opening': {'critical': False},
+    'script_problem': {'critical': False},
+    'script_solution': {'critical': False},
+    'script_objection': {'critical': False},
+    'script_closing': {'critical': False},
+    'script_generate': {'critical': False},
+    'product_extraction': {'critical': False},
+    'product_summary': {'deadline': 30, 'critical': False},
+    'connection_test': {'deadline': 15, 'hedge': False},
+}
+
+# ヘッジ閾値（p95）の算出に使う統計の日数と最小件数
+HEDGE_STATS_DAYS = 7
+HEDGE_MIN_SAMPLES = 20
+
+hedge_threshold_cache = VersionedLocalCache('llm_hedge_thresholds', recheck_seconds=300, max_age=300)
+
+
+class LLMDeadlineExceeded(Exception):
+    """リクエストポリシーの期限を超過した"""
+    pass
+
+
+# リトライ対象のエラー
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# フォールバック対象のエラー（リクエスト内容の誤りなどはフォールバックしない）
+FALLBACK_ERRORS = RETRYABLE_ERRORS + (LLMDeadlineExceeded,)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    """トークン数から推定コスト（USD）を計算"""
+    pricing = MODEL_PRICING.get(model)
+    if not pricing:
+        return 0.0
+
+    input_price, cached_price, output_price = pricing
+    uncached_tokens = max(prompt_tokens - cached_tokens, 0)
+    return (
+        uncached_tokens * input_price
+        + cached_tokens * cached_price
+        + completion_tokens * output_price
+    ) / 1_000_000
+
+
+def create_chat_completion(client, call_site, max_retries=2, **kwargs):
+    """
+    計測・リクエストポリシー付きで chat.completions.create を実行
+
+    呼び出し箇所ごとのポリシー（get_request_policy）に従い、
+    - 全体の期限（deadline）を各試行のタイムアウトに反映する
+    - p95レイテンシを超えても応答がない場合は同じリクエストを並行して投げる（ヘッジ）
+    - 重要度の低い呼び出しは、期限切れ・失敗時にフォールバックモデルで1回だけ再試行する
+    リトライ回数を記録するため、SDK側の自動リトライは無効にしてここでリトライする。
+
+    Args:
+        client: OpenAIクライアント
+        call_site: 呼び出し箇所の識別子（例: 'product_matching'）
+        max_retries: 一時的なエラーに対するリトライ回数
+        **kwargs: chat.completions.create に渡す引数
+
+    Returns:
+        ChatCompletion
+    """
+    policy = get_request_policy(call_site)
+    model = kwargs.get('model', '')
+    start = time.monotonic()
+
+    try:
+        response, retries = _request_with_deadline(
+            client, call_site, model, kwargs, policy, start + policy['deadline'], max_retries
+        )
+    except FALLBACK_ERRORS as e:
+        failed_retries = getattr(e, 'llm_retries', 0)
+        record_llm_call(call_site, model, None, time.monotonic() - start, failed_retries, error=True)
+
+        fallback_model = policy['fallback_model']
+        if not fallback_model or fallback_model == model:
+            raise
+
+        logger.warning(f"LLM呼び出しを{fallback_model}にフォールバックします [{call_site}]: {e}")
+        model = fallback_model
+        kwargs = {**kwargs, 'model': fallback_model}
+        start = time.monotonic()
+        try:
+            response = client.with_options(
+                max_retries=0,
+                timeout=policy['fallback_timeout']
+            ).chat.completions.create(**kwargs)
+        except Exception:
+            record_llm_call(call_site, model, None, time.monotonic() - start, error=True)
+            raise
+        retries = 0
+    except Exception:
+        record_llm_call(call_site, model, None, time.monotonic() - start, error=True)
+        raise
+
+    record_llm_call(call_site, model, response.usage, time.monotonic() - start, retries)
+    return response
+
+
+def _request_with_deadline(client, call_site, model, kwargs, policy, deadline, max_retries):
+    """期限内でリトライしながらリクエストする。(response, リトライ+ヘッジ回数) を返す"""
+    hedge_after = get_hedge_threshold(call_site, model, policy) if policy['hedge'] else None
+    retries = 0
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            error = LLMDeadlineExceeded(f"期限（{policy['deadline']}秒）を超過しました [{call_site}]")
+            error.llm_retries = retries
+            raise error
+
+        try:
+            response, hedged = _hedged_request(client, call_site, model, kwargs, remaining, hedge_after)
+            return response, retries + hedged
+        except RETRYABLE_ERRORS as e:
+            backoff = min(2 ** (retries + 1), 10)
+            if retries >= max_retries or time.monotonic() + backoff >= deadline:
+                e.llm_retries = retries
+                raise
+            retries += 1
+            logger.warning(f"LLM呼び出しをリトライします [{call_site}] ({retries}/{max_retries}): {e}")
+            time.sleep(backoff)
+
+
+def _hedged_request(client, call_site, model, kwargs, timeout, hedge_after):
+    """
+    ヘッジ付きリクエスト
+
+    hedge_after秒以内に応答がなければ同じリクエストをもう1つ投げ、先に返った方を採用する。
+    遅れた方のリクエストは実行中のものを中断できないため、自身のタイムアウトまで続き、
+    完了した場合はそのトークン数・コストも記録する（呼び出し回数・レイテンシには含めない）。
+
+    Returns:
+        tuple: (response, ヘッジした回数)
+    """
+    request_client = client.with_options(max_retries=0, timeout=timeout)
+    if not hedge_after or hedge_after >= timeout:
+        return request_client.chat.completions.create(**kwargs), 0
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        first = executor.submit(request_client.chat.completions.create, **kwargs)
+        try:
+            return first.result(timeout=hedge_after), 0
+        except FuturesTimeoutError:
+            pass
+
+        hedge_client = client.with_options(max_retries=0, timeout=timeout - hedge_after)
+        second = executor.submit(hedge_client.chat.completions.create, **kwargs)
+
+        error = None
+        for future in as_completed([first, second]):
+            try:
+                response = future.result()
+            except Exception as e:
+                error = e
+                continue
+            loser = second if future is first else first
+            loser.add_done_callback(functools.partial(
+                _record_hedge_loser,
+                call_site=call_site,
+                model=model,
+                caller_thread=threading.get_ident()
+            ))
+            return response, 1
+        raise error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _record_hedge_loser(future, call_site, model, caller_thread):
+    """採用されなかったヘッジ側のリクエストが完了したら、消費したトークン数・コストを記録"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        record_llm_call(call_site, model, future.result().usage, 0, count_call=False)
+    finally:
+        # ワーカースレッドで開いたDB接続は残さない
+        if threading.get_ident() != caller_thread:
+            from django.db import connection
+            connection.close()
+
+
+def get_request_policy(call_site):
+    """
+    呼び出し箇所のリクエストポリシーを取得
+
+    コード上の既定値に、対応するPromptTemplateのタイムアウト・フォールバック設定を上書きする
+    """
+    policy = {**DEFAULT_REQUEST_POLICY, **CALL_SITE_POLICIES.get(call_site, {})}
+    if 'fallback_model' not in policy:
+        policy['fallback_model'] = None if policy['critical'] else FALLBACK_MODEL
+
+    from .models import PromptTemplate
+    from .utils import get_active_prompt_template
+
+    if call_site in dict(PromptTemplate.TEMPLATE_TYPES):
+        try:
+            template = get_active_prompt_template(call_site)
+        except Exception as e:
+            logger.warning(f"リクエストポリシーのテンプレート取得に失敗 [{call_site}]: {e}")
+            template = None
+        if template:
+            if template.timeout_override:
+                policy['deadline'] = template.timeout_override
+            if template.fallback_model == PromptTemplate.FALLBACK_DISABLED:
+                policy['fallback_model'] = None
+            elif template.fallback_model:
+                policy['fallback_model'] = template.fallback_model
+
+    return policy
+
+
+def get_hedge_threshold(call_site, model, policy):
+    """
+    ヘッジを開始するまでの秒数
+
+    直近の利用統計から求めたp95レイテンシ。件数が少ない場合はポリシーの既定値
+    """
+    return hedge_threshold_cache.get(
+        (call_site, model),
+        lambda: _load_hedge_threshold(call_site, model, policy['hedge_after'])
+    )
+
+
+def _load_hedge_threshold(call_site, model, default):
+    from datetime import timedelta
+    from django.utils import timezone
+    from .models import LLMUsageStat
+
+    try:
+        histograms = LLMUsageStat.objects.filter(
+            call_site=call_site,
+            model=model,
+            date__gte=timezone.localdate() - timedelta(days=HEDGE_STATS_DAYS)
+        ).values_list('latency_histogram', flat=True)
+
+        merged = {}
+        for histogram in histograms:
+            for bucket, count in histogram.items():
+                merged[bucket] = merged.get(bucket, 0) + count
+    except Exception as e:
+        logger.warning(f"ヘッジ閾値の取得に失敗 [{call_site}]: {e}")
+        return default
+
+    if sum(merged.values()) < HEDGE_MIN_SAMPLES:
+        return default
+    return LLMUsageStat.percentile_from_histogram(merged, 95) / 1000
+
+
+def record_llm_call(call_site, model, usage, latency_seconds, retries=0, error=False, count_call=True):
+    """
+    呼び出し結果を集計テーブルに記録
+
+    記録に失敗しても呼び出し元の処理は止めない
+
+    Args:
+        count_call: Falseの場合はトークン数・コストだけを加算する（採用されなかったヘッジ側のリクエスト）
+    """
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    cached_tokens = get_cached_tokens(usage)
+
+    if usage is not None:
+        log_prompt_cache_usage(call_site, usage)
+
+    try:
+        from .models import LLMUsageStat
+        LLMUsageStat.record(
+            call_site=call_site,
+            model=model,
+            latency_ms=int(latency_seconds * 1000),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            retries=retries,
+            error=error,
+            cost_usd=estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+            count_call=count_call
+        )
+    except Exception as e:
+        logger.warning(f"LLM利用統計の記録に失敗 [{call_site}]: {e}")
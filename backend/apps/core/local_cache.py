@@ -0,0 +1,173 @@
+"""
+プロセス内ローカルキャッシュ
+
+ホットパスでDBやRedisに問い合わせないよう、各プロセスのメモリに値を保持する。
+無効化はRedisのバージョンキーとpub/subで全プロセスに伝える。
+pub/subを取りこぼした場合に備え、一定間隔でバージョンキーも確認する。
+"""
+import logging
+import os
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'local_cache_invalidation'
+
+# リスナーが落ちた場合に再接続を試みるまでの秒数
+LISTENER_RETRY_SECONDS = 30
+
+_registry = {}
+_listener_lock = threading.Lock()
+_listener_state = {'pid': None, 'thread': None, 'retry_at': 0.0}
+
+
+class VersionedLocalCache:
+    """
+    Redisのバージョンキーで無効化されるプロセス内キャッシュ
+
+    Args:
+        name: キャッシュ名（バージョンキーとpub/subメッセージに使用）
+        recheck_seconds: Redisのバージョンキーを再確認する間隔（秒）
+        max_age: 各値の最大保持秒数（Noneの場合は無効化されるまで保持）
+    """
+
+    def __init__(self, name, recheck_seconds=60, max_age=None):
+        self.name = name
+        self.version_key = f'local_cache_version:{name}'
+        self.recheck_seconds = recheck_seconds
+        self.max_age = max_age
+        self._data = {}
+        self._version = None
+        self._checked_at = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key, loader):
+        """
+        キャッシュから値を取得。なければloaderで読み込んで保持する
+
+        Noneも結果として保持する（存在しないことのキャッシュ）
+        """
+        self._ensure_fresh()
+
+        entry = self._data.get(key)
+        if entry is not None:
+            value, loaded_at = entry
+            if self.max_age is None or time.monotonic() - loaded_at < self.max_age:
+                return value
+
+        generation = self._generation
+        value = loader()
+
+        with self._lock:
+            # 読み込み中に無効化された場合は古い値を保持しない
+            if generation == self._generation:
+                self._data[key] = (value, time.monotonic())
+        return value
+
+    def clear(self):
+        """このプロセスのキャッシュのみクリア"""
+        with self._lock:
+            self._data = {}
+            self._generation += 1
+            self._checked_at = None
+
+    def invalidate(self):
+        """
+        全プロセスのキャッシュを無効化
+
+        トランザクション中に呼ばれた場合はコミット後に通知する
+        （コミット前に他プロセスが古い値を読み直すのを防ぐ）
+        """
+        self.clear()
+        transaction.on_commit(self._publish_invalidation)
+
+    def _publish_invalidation(self):
+        self.clear()
+        try:
+            try:
+                cache.incr(self.version_key)
+            except ValueError:
+                cache.set(self.version_key, 1, None)
+
+            from django_redis import get_redis_connection
+            get_redis_connection('default').publish(INVALIDATION_CHANNEL, self.name)
+        except Exception as e:
+            logger.warning(f"ローカルキャッシュの無効化通知に失敗 ({self.name}): {e}")
+
+    def _ensure_fresh(self):
+        _ensure_listener()
+
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.recheck_seconds:
+            return
+
+        try:
+            version = cache.get(self.version_key)
+        except Exception as e:
+            logger.warning(f"キャッシュバージョンの取得に失敗 ({self.name}): {e}")
+            version = self._version
+
+        if version != self._version:
+            self.clear()
+            self._version = version
+        self._checked_at = now
+
+
+def _handle_message(message):
+    name = message.get('data')
+    if isinstance(name, bytes):
+        name = name.decode()
+
+    local_cache = _registry.get(name)
+    if local_cache is not None:
+        local_cache.clear()
+
+
+def _handle_listener_error(exception, pubsub, thread):
+    logger.warning(f"キャッシュ無効化リスナーが停止しました: {exception}")
+    thread.stop()
+    with _listener_lock:
+        _listener_state['pid'] = None
+        _listener_state['retry_at'] = time.monotonic() + LISTENER_RETRY_SECONDS
+
+
+def _ensure_listener():
+    """pub/subリスナーをプロセスごとに1つ起動（Celeryのfork後も考慮）"""
+    pid = os.getpid()
+    if _listener_state['pid'] == pid:
+        return
+    if time.monotonic() < _listener_state['retry_at']:
+        return
+
+    with _listener_lock:
+        if _listener_state['pid'] == pid:
+            return
+        _listener_state['pid'] = pid
+
+        try:
+            from django_redis import get_redis_connection
+            pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: _handle_message})
+            _listener_state['thread'] = pubsub.run_in_thread(
+                sleep_time=1.0,
+                daemon=True,
+                exception_handler=_handle_listener_error
+            )
+        except Exception as e:
+            # リスナーなしでもバージョンキーの定期確認で整合性は保たれる
+            logger.warning(f"キャッシュ無効化リスナーの起動に失敗: {e}")
+            _listener_state['pid'] = None
+            _listener_state['retry_at'] = time.monotonic() + LISTENER_RETRY_SECONDS
+
+
+# プロンプトテンプレート（選択結果とコンパイル済みテンプレート）
+prompt_template_cache = VersionedLocalCache('prompt_templates')
+
+# システム設定（SystemSettingsとAPIキー）。短い間隔でバージョンキーを確認する
+system_settings_cache = VersionedLocalCache('system_settings', recheck_seconds=5, max_age=300)
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_prompttemplate_template_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMUsageStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('call_site', models.CharField(max_length=100, verbose_name='呼び出し箇所')),
+                ('model', models.CharField(max_length=50, verbose_name='モデル')),
+                ('call_count', models.IntegerField(default=0, verbose_name='呼び出し回数')),
+                ('error_count', models.IntegerField(default=0, verbose_name='エラー回数')),
+                ('retry_count', models.IntegerField(default=0, verbose_name='リトライ回数')),
+                ('cache_hit_count', models.IntegerField(default=0, help_text='プロンプトキャッシュが効いた呼び出しの回数', verbose_name='キャッシュヒット回数')),
+                ('prompt_tokens', models.BigIntegerField(default=0, verbose_name='入力トークン数')),
+                ('completion_tokens', models.BigIntegerField(default=0, verbose_name='出力トークン数')),
+                ('cached_tokens', models.BigIntegerField(default=0, verbose_name='キャッシュ済み入力トークン数')),
+                ('total_latency_ms', models.BigIntegerField(default=0, verbose_name='合計レイテンシ（ms）')),
+                ('max_latency_ms', models.IntegerField(default=0, verbose_name='最大レイテンシ（ms）')),
+                ('latency_histogram', models.JSONField(blank=True, default=dict, help_text='バケット上限（ms）ごとの呼び出し回数', verbose_name='レイテンシ分布')),
+                ('estimated_cost_usd', models.FloatField(default=0.0, verbose_name='推定コスト（USD）')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'LLM利用統計',
+                'verbose_name_plural': 'LLM利用統計',
+                'ordering': ['-date', 'call_site', 'model'],
+                'unique_together': {('date', 'call_site', 'model')},
+            },
+        ),
+    ]
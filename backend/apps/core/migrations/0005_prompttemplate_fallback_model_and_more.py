@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:30
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_llmusagestat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='fallback_model',
+            field=models.CharField(blank=True, choices=[('', 'システムデフォルト'), ('gpt-4o-mini', 'GPT-4o Mini'), ('gpt-4o', 'GPT-4o'), ('disabled', 'フォールバックしない')], help_text='期限切れ・失敗時に切り替えるモデル', max_length=50, verbose_name='フォールバックモデル'),
+        ),
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='timeout_override',
+            field=models.FloatField(blank=True, help_text='リトライを含めたAI呼び出し全体の期限。空欄の場合は呼び出し箇所ごとの既定値', null=True, validators=[django.core.validators.MinValueValidator(5.0), django.core.validators.MaxValueValidator(600.0)], verbose_name='タイムアウト上書き（秒）'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:33
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_prompttemplate_fallback_model_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='systemsettings',
+            name='scraping_max_pages',
+            field=models.IntegerField(default=5, help_text='トップページに加えて会社概要・事業内容・IRなどのページを取得する（1の場合はトップページのみ）', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(20)], verbose_name='スクレイピング最大ページ数'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:38
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_systemsettings_scraping_max_pages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='systemsettings',
+            name='company_refresh_batch_size',
+            field=models.IntegerField(default=100, help_text='定期更新（1時間ごと）で1回に投入する企業数の上限', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1000)], verbose_name='定期更新の1回あたりの企業数'),
+        ),
+        migrations.AddField(
+            model_name='systemsettings',
+            name='company_refresh_days',
+            field=models.IntegerField(default=30, help_text='取得から指定日数を超えた企業情報を定期更新の対象にする', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(365)], verbose_name='企業情報の更新間隔（日）'),
+        ),
+        migrations.AddField(
+            model_name='systemsettings',
+            name='company_refresh_enabled',
+            field=models.BooleanField(default=True, verbose_name='企業情報の定期更新を有効化'),
+        ),
+    ]
@@ -1,8 +1,12 @@
+import copy
+
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.cache import cache
 from django.conf import settings
 
+from .local_cache import prompt_template_cache, system_settings_cache
+
 
 class SystemSettings(models.Model):
     """システム設定（管理者のみ変更可能）"""
@@ -89,6 +93,32 @@ class SystemSettings(models.Model):
         verbose_name="robots.txtを尊重"
     )
     
+    scraping_max_pages = models.IntegerField(
+        default=5,
+        validators=[MinValueValidator(1), MaxValueValidator(20)],
+        verbose_name="スクレイピング最大ページ数",
+        help_text="トップページに加えて会社概要・事業内容・IRなどのページを取得する（1の場合はトップページのみ）"
+    )
+    
+    company_refresh_enabled = models.BooleanField(
+        default=True,
+        verbose_name="企業情報の定期更新を有効化"
+    )
+    
+    company_refresh_days = models.IntegerField(
+        default=30,
+        validators=[MinValueValidator(1), MaxValueValidator(365)],
+        verbose_name="企業情報の更新間隔（日）",
+        help_text="取得から指定日数を超えた企業情報を定期更新の対象にする"
+    )
+    
+    company_refresh_batch_size = models.IntegerField(
+        default=100,
+        validators=[MinValueValidator(1), MaxValueValidator(1000)],
+        verbose_name="定期更新の1回あたりの企業数",
+        help_text="定期更新（1時間ごと）で1回に投入する企業数の上限"
+    )
+    
     # === PDF処理設定 ===
     max_pdf_file_size_mb = models.IntegerField(
         default=20,
@@ -170,10 +200,23 @@ class SystemSettings(models.Model):
         cache.delete('openai_api_key')  # APIキーのキャッシュもクリア
         
         super().save(*args, **kwargs)
+        
+        # 全プロセスのローカルキャッシュを無効化
+        system_settings_cache.invalidate()
     
     @classmethod
     def get_settings(cls):
-        """設定を取得（キャッシュ付き）"""
+        """
+        設定を取得（キャッシュ付き）
+        
+        プロセス内スナップショット → Redis → DB の順に参照する
+        スナップショットはプロセス内で共有するため、呼び出し元が変更・保存しても
+        他のリクエストに影響しないよう複製を返す
+        """
+        return copy.deepcopy(system_settings_cache.get('settings', cls._load_settings))
+    
+    @classmethod
+    def _load_settings(cls):
         settings_obj = cache.get('system_settings')
         if settings_obj is None:
             settings_obj, _ = cls.objects.get_or_create(singleton_id=1)
@@ -193,6 +236,8 @@ class SystemSettings(models.Model):
 class PromptTemplate(models.Model):
     """カスタマイズ可能なプロンプトテンプレート"""
     
+    FALLBACK_DISABLED = 'disabled'
+    
     TEMPLATE_TYPES = [
         ('csv_analysis', 'CSV解析'),
         ('company_analysis', '企業情報分析'),
@@ -251,6 +296,28 @@ class PromptTemplate(models.Model):
         verbose_name="Temperature上書き"
     )
     
+    # リクエストポリシー（オプション）
+    timeout_override = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(5.0), MaxValueValidator(600.0)],
+        verbose_name="タイムアウト上書き（秒）",
+        help_text="リトライを含めたAI呼び出し全体の期限。空欄の場合は呼び出し箇所ごとの既定値"
+    )
+    
+    fallback_model = models.CharField(
+        max_length=50,
+        blank=True,
+        choices=[
+            ('', 'システムデフォルト'),
+            ('gpt-4o-mini', 'GPT-4o Mini'),
+            ('gpt-4o', 'GPT-4o'),
+            ('disabled', 'フォールバックしない'),
+        ],
+        verbose_name="フォールバックモデル",
+        help_text="期限切れ・失敗時に切り替えるモデル"
+    )
+    
     # バージョン管理
     version = models.IntegerField(default=1, verbose_name="バージョン")
     
@@ -287,12 +354,24 @@ class PromptTemplate(models.Model):
     
     def render(self, context):
         """コンテキストを使ってプロンプトをレンダリング"""
-        from django.template import Template, Context
+        from django.template import Context
         
-        template = Template(self.user_prompt_template)
+        template = self.get_compiled_template()
         rendered = template.render(Context(context))
         return rendered
     
+    def get_compiled_template(self):
+        """コンパイル済みテンプレートを取得（プロセス内キャッシュ）"""
+        from django.template import Template
+        
+        if self.pk is None:
+            return Template(self.user_prompt_template)
+        
+        return prompt_template_cache.get(
+            ('compiled', self.template_type, self.pk, self.version),
+            lambda: Template(self.user_prompt_template)
+        )
+    
     def save(self, *args, **kwargs):
         # デフォルトは1つだけ（同じtemplate_type内）
         if self.is_default:
@@ -302,6 +381,14 @@ class PromptTemplate(models.Model):
             ).exclude(pk=self.pk).update(is_default=False)
         
         super().save(*args, **kwargs)
+        
+        # 全プロセスのテンプレートキャッシュを無効化
+        prompt_template_cache.invalidate()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        prompt_template_cache.invalidate()
+        return result
 
 
 class PromptVersion(models.Model):
@@ -341,4 +428,170 @@ class PromptVersion(models.Model):
     
     def __str__(self):
         return f"{self.prompt_template.name} - v{self.version}"
+    
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        super().save(*args, **kwargs)
+        
+        # 新バージョン作成時はテンプレートキャッシュを無効化
+        if is_new:
+            prompt_template_cache.invalidate()
+
+
+
+class JSONBIncrement(models.Func):
+    """JSONフィールドのキーの数値を1加算する式（PostgreSQLの jsonb_set。キーがなければ1）"""
+    
+    output_field = models.JSONField()
+    
+    def __init__(self, field, key):
+        self.key = key
+        super().__init__(models.F(field))
+    
+    def as_sql(self, compiler, connection, **extra_context):
+        field_sql, field_params = compiler.compile(self.source_expressions[0])
+        sql = (
+            f"jsonb_set({field_sql}, ARRAY[%s]::text[], "
+            f"to_jsonb(COALESCE(({field_sql} ->> %s)::bigint, 0) + 1))"
+        )
+        return sql, (*field_params, self.key, *field_params, self.key)
 
+
+class LLMUsageStat(models.Model):
+    """LLM呼び出しの日次集計（呼び出し箇所・モデル別）"""
+    
+    # レイテンシのヒストグラム境界（ミリ秒）。パーセンタイルはこの粒度で近似する
+    LATENCY_BUCKETS_MS = [250, 500, 1000, 2000, 4000, 8000, 15000, 30000, 60000, 120000]
+    
+    date = models.DateField(verbose_name="日付")
+    call_site = models.CharField(max_length=100, verbose_name="呼び出し箇所")
+    model = models.CharField(max_length=50, verbose_name="モデル")
+    
+    # 呼び出し回数
+    call_count = models.IntegerField(default=0, verbose_name="呼び出し回数")
+    error_count = models.IntegerField(default=0, verbose_name="エラー回数")
+    retry_count = models.IntegerField(default=0, verbose_name="リトライ回数")
+    cache_hit_count = models.IntegerField(
+        default=0,
+        verbose_name="キャッシュヒット回数",
+        help_text="プロンプトキャッシュが効いた呼び出しの回数"
+    )
+    
+    # トークン数
+    prompt_tokens = models.BigIntegerField(default=0, verbose_name="入力トークン数")
+    completion_tokens = models.BigIntegerField(default=0, verbose_name="出力トークン数")
+    cached_tokens = models.BigIntegerField(default=0, verbose_name="キャッシュ済み入力トークン数")
+    
+    # レイテンシ
+    total_latency_ms = models.BigIntegerField(default=0, verbose_name="合計レイテンシ（ms）")
+    max_latency_ms = models.IntegerField(default=0, verbose_name="最大レイテンシ（ms）")
+    latency_histogram = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="レイテンシ分布",
+        help_text="バケット上限（ms）ごとの呼び出し回数"
+    )
+    
+    estimated_cost_usd = models.FloatField(default=0.0, verbose_name="推定コスト（USD）")
+    
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+    
+    class Meta:
+        verbose_name = "LLM利用統計"
+        verbose_name_plural = "LLM利用統計"
+        ordering = ['-date', 'call_site', 'model']
+        unique_together = ['date', 'call_site', 'model']
+    
+    def __str__(self):
+        return f"{self.date} {self.call_site} ({self.model})"
+    
+    @classmethod
+    def latency_bucket(cls, latency_ms):
+        """レイテンシが属するバケットのキー"""
+        for bound in cls.LATENCY_BUCKETS_MS:
+            if latency_ms <= bound:
+                return str(bound)
+        return 'inf'
+    
+    @classmethod
+    def percentile_from_histogram(cls, histogram, percentile):
+        """
+        ヒストグラムからパーセンタイル（ms）を近似
+        
+        Returns:
+            int: 該当バケットの上限値。データがない場合はNone
+        """
+        total = sum(histogram.values())
+        if not total:
+            return None
+        
+        threshold = total * percentile / 100
+        cumulative = 0
+        for bound in cls.LATENCY_BUCKETS_MS:
+            cumulative += histogram.get(str(bound), 0)
+            if cumulative >= threshold:
+                return bound
+        return cls.LATENCY_BUCKETS_MS[-1] * 2
+    
+    @classmethod
+    def record(cls, call_site, model, latency_ms, prompt_tokens=0, completion_tokens=0,
+               cached_tokens=0, retries=0, error=False, cost_usd=0.0, count_call=True):
+        """
+        1回の呼び出し結果を日次集計に加算
+        
+        行ロックを取って読み書きせず、1回のUPDATE（F()による加算）で集計するため、
+        同じ行への同時の記録でも待ち時間は文の実行中だけになる。
+        行がなければ作成し、同時に作成された場合は作成された行に加算する。
+        
+        count_call=False の場合はトークン数・コストだけを加算する（採用されなかったヘッジ側のリクエスト）
+        """
+        from django.db import IntegrityError, transaction
+        from django.db.models import F, Value
+        from django.db.models.functions import Greatest
+        from django.utils import timezone
+        
+        lookup = {'date': timezone.localdate(), 'call_site': call_site, 'model': model}
+        increments = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cached_tokens': cached_tokens,
+            'estimated_cost_usd': cost_usd,
+        }
+        bucket = cls.latency_bucket(latency_ms)
+        if count_call:
+            increments.update({
+                'call_count': 1,
+                'retry_count': retries,
+                'error_count': int(bool(error)),
+                'cache_hit_count': int(bool(cached_tokens)),
+                'total_latency_ms': latency_ms,
+            })
+        
+        updates = {field: F(field) + value for field, value in increments.items()}
+        updates['updated_at'] = timezone.now()
+        if count_call:
+            updates['max_latency_ms'] = Greatest(F('max_latency_ms'), Value(latency_ms))
+            updates['latency_histogram'] = JSONBIncrement('latency_histogram', bucket)
+        
+        if cls.objects.filter(**lookup).update(**updates):
+            return
+        
+        initial = dict(increments)
+        if count_call:
+            initial['max_latency_ms'] = latency_ms
+            initial['latency_histogram'] = {bucket: 1}
+        try:
+            with transaction.atomic():
+                cls.objects.create(**lookup, **initial)
+        except IntegrityError:
+            # 同時に作成された行に加算する
+            cls.objects.filter(**lookup).update(**updates)
+    
+    @property
+    def avg_latency_ms(self):
+        if not self.call_count:
+            return None
+        return round(self.total_latency_ms / self.call_count)
+    
+    def latency_percentile(self, percentile):
+        return self.percentile_from_histogram(self.latency_histogram, percentile)
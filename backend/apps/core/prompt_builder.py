@@ -0,0 +1,102 @@
+"""
+プロンプト組み立て機能
+
+OpenAIのプロンプトキャッシュはリクエスト先頭からの一致部分（プレフィックス）に
+効くため、毎回同じになるシステムプロンプト・指示ブロックを先頭に、
+企業情報などの可変データを末尾に配置してメッセージを組み立てる。
+
+PromptTemplateからはシステムプロンプトとモデル・Temperatureの上書きだけを使う。
+ユーザープロンプトのテンプレート（可変データを含む）は使わず、
+指示ブロックは常にコード側の固定の文面にする（JSON形式の指定などを失わないため）。
+"""
+import logging
+
+from .utils import get_active_prompt_template
+
+logger = logging.getLogger(__name__)
+
+
+def build_prompt_messages(template_type, instructions, data_blocks,
+                          fallback_system_prompt='', use_template=True):
+    """
+    静的ブロック → 可変データの順でメッセージを組み立てる
+
+    Args:
+        template_type: PromptTemplateのテンプレートタイプ（例: 'company_analysis'）
+        instructions: 呼び出しごとに変わらない指示ブロック
+        data_blocks: (見出し, 本文) のリスト。可変データとして末尾に配置する
+        fallback_system_prompt: テンプレート未登録時のシステムプロンプト
+        use_template: Falseの場合はテンプレートを参照しない（カスタムプロンプト指定時など）
+
+    Returns:
+        dict: messages / model_override / temperature_override
+    """
+    template = None
+    if use_template:
+        try:
+            template = get_active_prompt_template(template_type)
+        except Exception as e:
+            logger.warning(f"プロンプトテンプレートの取得に失敗 [{template_type}]: {e}")
+
+    system_prompt = (template.system_prompt if template else '') or fallback_system_prompt
+    model_override = template.model_override if template else None
+    temperature_override = template.temperature_override if template else None
+
+    # 可変データは必ず指示ブロックの後ろに置く
+    data_parts = []
+    for heading, body in data_blocks:
+        if body:
+            data_parts.append(f"# {heading}\n{body}")
+
+    user_prompt = instructions.strip()
+    if data_parts:
+        user_prompt += "\n\n---\n\n" + "\n\n".join(data_parts)
+
+    return {
+        'messages': [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        'model_override': model_override or None,
+        'temperature_override': temperature_override,
+    }
+
+
+def get_cached_tokens(usage):
+    """
+    usageからキャッシュヒットしたプロンプトトークン数を取得
+
+    SDKのバージョンによって prompt_tokens_details が属性にも辞書にもなるため両方を扱う
+    """
+    if usage is None:
+        return 0
+
+    details = getattr(usage, 'prompt_tokens_details', None)
+    if details is None:
+        return 0
+    if isinstance(details, dict):
+        return details.get('cached_tokens') or 0
+    return getattr(details, 'cached_tokens', 0) or 0
+
+
+def get_cached_token_ratio(usage):
+    """プロンプトトークンのうちキャッシュヒットした割合（0.0〜1.0）"""
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    if not prompt_tokens:
+        return 0.0
+    return get_cached_tokens(usage) / prompt_tokens
+
+
+def log_prompt_cache_usage(call_site, usage):
+    """
+    キャッシュヒット率をログに記録
+
+    Returns:
+        float: キャッシュヒット率
+    """
+    ratio = get_cached_token_ratio(usage)
+    logger.info(
+        f"プロンプトキャッシュ [{call_site}]: "
+        f"{get_cached_tokens(usage)}/{getattr(usage, 'prompt_tokens', 0)}トークン ({ratio:.0%})"
+    )
+    return ratio
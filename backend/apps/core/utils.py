@@ -4,6 +4,8 @@ Core app のユーティリティ関数
 import os
 from django.core.cache import cache
 
+from .local_cache import prompt_template_cache, system_settings_cache
+
 
 def get_openai_api_key():
     """
@@ -13,6 +15,10 @@ def get_openai_api_key():
     Returns:
         str: OpenAI APIキー
     """
+    return system_settings_cache.get('openai_api_key', _load_openai_api_key)
+
+
+def _load_openai_api_key():
     # キャッシュから取得を試みる
     cached_key = cache.get('openai_api_key')
     if cached_key:
@@ -88,6 +94,27 @@ def clear_settings_cache():
     """
     cache.delete('openai_api_key')
     cache.delete('system_settings')
+    system_settings_cache.invalidate()
+
+
+def get_active_prompt_template(template_type):
+    """
+    テンプレートタイプに対応する有効なプロンプトテンプレートを取得
+    
+    結果はプロセス内にキャッシュされ、PromptTemplate保存時に無効化される
+    
+    Returns:
+        PromptTemplate または None
+    """
+    from .models import PromptTemplate
+    
+    return prompt_template_cache.get(
+        ('active', template_type),
+        lambda: PromptTemplate.objects.filter(
+            template_type=template_type,
+            is_active=True
+        ).order_by('-is_default', '-version').first()
+    )
 
 
 def get_prompt_template(template_type, context=None, fallback_system_prompt=None, fallback_user_prompt=None):
@@ -104,19 +131,14 @@ def get_prompt_template(template_type, context=None, fallback_system_prompt=None
         tuple: (system_prompt, user_prompt) または None
     """
     try:
-        from .models import PromptTemplate
-        
-        template = PromptTemplate.objects.filter(
-            template_type=template_type,
-            is_active=True
-        ).order_by('-is_default', '-version').first()
+        template = get_active_prompt_template(template_type)
         
         if template:
-            # テンプレートをレンダリング
+            # テンプレートをレンダリング（コンパイル済みテンプレートを再利用）
             if context:
                 try:
-                    from django.template import Template, Context
-                    t = Template(template.user_prompt_template)
+                    from django.template import Context
+                    t = template.get_compiled_template()
                     rendered_user_prompt = t.render(Context(context))
                 except Exception:
                     # レンダリングエラー時はそのまま返す
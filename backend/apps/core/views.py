@@ -11,6 +11,7 @@ import json
 import logging
 
 from .utils import get_openai_api_key, is_ai_enabled, get_ai_settings
+from .llm import create_chat_completion
 from .models import SystemSettings
 
 logger = logging.getLogger(__name__)
@@ -54,7 +55,9 @@ def test_openai_connection(request):
         
         # 簡単なテストリクエスト
         client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
+        response = create_chat_completion(
+            client,
+            'connection_test',
             model="gpt-4o-mini",  # コスト節約のためminiを使用
             messages=[
                 {"role": "system", "content": "あなたは親切なアシスタントです。"},
@@ -160,7 +163,9 @@ def ai_chat_send(request):
         
         # OpenAI APIコール
         client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
+        response = create_chat_completion(
+            client,
+            'ai_chat',
             model=settings['model'],
             messages=messages,
             temperature=settings['temperature'],
@@ -6,6 +6,8 @@ import json
 import logging
 
 from apps.core.utils import get_openai_api_key, is_ai_enabled
+from apps.core.prompt_builder import build_prompt_messages
+from apps.core.llm import create_chat_completion
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +15,8 @@ logger = logging.getLogger(__name__)
 class ProductMatcher:
     """分析結果と企業情報から最適な商品を選択"""
     
+    SYSTEM_PROMPT = "あなたは顧客のニーズを深く理解し、最適な商品を提案する専門家です。"
+    
     def __init__(self):
         self.client = OpenAI(api_key=get_openai_api_key())
     
@@ -42,34 +46,15 @@ class ProductMatcher:
                 'key_features': [f.get('name', '') for f in product.key_features] if product.key_features else []
             })
         
-        # プロンプト構築
-        base_prompt = f"""
-あなたは商品提案の専門家です。
+        # 静的な指示ブロック（プロンプトキャッシュが効くよう先頭に置く）
+        instructions = """
 以下の情報から、顧客に最適な商品を選択してください。
 
-# 提案先企業情報
-- 企業名: {company_info.company_name}
-- 業界: {company_info.industry}
-- 事業内容: {company_info.business_description}
-- 推定される課題: {', '.join(company_info.pain_points) if company_info.pain_points else '不明'}
-"""
-        
-        # CSV分析結果がある場合は追加
-        if analysis_result:
-            base_prompt += f"\n\n# データ分析結果\n{analysis_result[:1500]}"
-        
-        base_prompt += f"""
-
-# 提案可能な商品リスト
-{json.dumps(products_summary, ensure_ascii=False, indent=2)}
+以下のJSON形式で回答してください：
 
----
-
-上記を踏まえて、以下のJSON形式で回答してください：
-
-{{
+{
   "recommended_products": [
-    {{
+    {
       "product_id": 商品ID,
       "product_name": "商品名",
       "relevance_score": 0.0-1.0（適合度）,
@@ -78,24 +63,46 @@ class ProductMatcher:
         "マッチング理由2"
       ],
       "proposal_angle": "この企業への提案切り口"
-    }}
+    }
   ],
   "proposal_strategy": "全体的な提案戦略"
-}}
+}
 
 ※最大3商品まで、関連性の高い順に選択してください。
 ※関連性が低い場合は、無理に選択しないでください。
 """
         
+        # 商品リストは企業をまたいで共通なので、企業ごとに変わるデータより前に置く
+        company_block = (
+            f"- 企業名: {company_info.company_name}\n"
+            f"- 業界: {company_info.industry}\n"
+            f"- 事業内容: {company_info.business_description}\n"
+            f"- 推定される課題: {', '.join(company_info.pain_points) if company_info.pain_points else '不明'}"
+        )
+        
+        prompt = build_prompt_messages(
+            'product_matching',
+            instructions,
+            [
+                ('提案可能な商品リスト', json.dumps(products_summary, ensure_ascii=False, indent=2)),
+                ('提案先企業情報', company_block),
+                ('データ分析結果', analysis_result[:1500] if analysis_result else ''),
+            ],
+            fallback_system_prompt=self.SYSTEM_PROMPT
+        )
+        
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",  # マッチングは重要なので高品質モデル
-                messages=[
-                    {"role": "system", "content": "あなたは顧客のニーズを深く理解し、最適な商品を提案する専門家です。"},
-                    {"role": "user", "content": base_prompt}
-                ],
+            response = create_chat_completion(
+                self.client,
+                'product_matching',
+                model=prompt['model_override'] or "gpt-4o",  # マッチングは重要なので高品質モデル
+                messages=prompt['messages'],
                 response_format={"type": "json_object"},
-                temperature=0.5
+                temperature=(
+                    prompt['temperature_override']
+                    if prompt['temperature_override'] is not None
+                    else 0.5
+                )
             )
             
             result = json.loads(response.choices[0].message.content)
@@ -15,6 +15,7 @@ from openai import OpenAI
 
 from django.conf import settings
 from apps.core.utils import get_openai_api_key, is_ai_enabled
+from apps.core.llm import create_chat_completion
 
 logger = logging.getLogger(__name__)
 
@@ -250,7 +251,9 @@ JSONフォーマットで返してください：
 }}
 """
             
-            response = self.client.chat.completions.create(
+            response = create_chat_completion(
+                self.client,
+                'product_extraction',
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -307,7 +310,9 @@ JSONフォーマットで返してください：
 {chunk[:2000]}
 """
                 
-                response = self.client.chat.completions.create(
+                response = create_chat_completion(
+                    self.client,
+                    'product_summary',
                     model="gpt-4o-mini",
                     messages=[
                         {"role": "system", "content": "簡潔な要約の専門家"},
@@ -7,6 +7,8 @@ import logging
 import time
 
 from apps.core.utils import get_openai_api_key, is_ai_enabled
+from apps.core.prompt_builder import build_prompt_messages
+from apps.core.llm import create_chat_completion
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,17 @@ class TalkScriptGenerator:
         'closing': 'クロージング',
     }
     
+    # セクション → PromptTemplateのテンプレートタイプ
+    SECTION_TEMPLATE_TYPES = {
+        'opening': 'script_opening',
+        'problem_identification': 'script_problem',
+        'solution_proposal': 'script_solution',
+        'objection_handling': 'script_objection',
+        'closing': 'script_closing',
+    }
+    
+    SYSTEM_PROMPT = "あなたは経験豊富な営業トレーナーです。効果的な営業トークスクリプトを作成します。"
+    
     def __init__(self, system_settings=None):
         from apps.core.models import SystemSettings
         self.client = OpenAI(api_key=get_openai_api_key())
@@ -72,54 +85,63 @@ class TalkScriptGenerator:
         # 学習コンテキスト取得
         learning_context = self.get_learning_context(company_info)
         
-        # プロンプト構築
-        base_prompt = custom_prompt or f"""
-あなたは経験豊富な営業トレーナーです。
+        # 静的な指示ブロック（プロンプトキャッシュが効くよう先頭に置く）
+        instructions = custom_prompt or f"""
 以下の情報を基に、効果的な営業トークスクリプトの「{self.SECTION_NAMES.get(section_name)}」セクションを作成してください。
-
-# 提案先企業情報
-- 企業名: {company_info.company_name}
-- 業界: {company_info.industry}
-- 事業内容: {company_info.business_description}
-- 推定される課題: {', '.join(company_info.pain_points) if company_info.pain_points else '不明'}
+実際の商談で使える具体的なトークスクリプトを作成してください。
 """
         
-        # CSV分析結果がある場合は追加
-        if analysis_result:
-            base_prompt += f"\n\n# データ分析結果\n{analysis_result[:1000]}"
+        # 可変データ（企業情報など）は末尾に置く
+        company_block = (
+            f"- 企業名: {company_info.company_name}\n"
+            f"- 業界: {company_info.industry}\n"
+            f"- 事業内容: {company_info.business_description}\n"
+            f"- 推定される課題: {', '.join(company_info.pain_points) if company_info.pain_points else '不明'}"
+        )
         
-        # 商品情報を追加
+        products_block = ""
         if selected_products:
-            base_prompt += "\n\n# 提案商品\n"
             for idx, prod_info in enumerate(selected_products, 1):
                 product = prod_info['product']
-                base_prompt += f"\n{idx}. {product.name}\n"
-                base_prompt += f"   説明: {product.short_description}\n"
-                base_prompt += f"   提案角度: {prod_info.get('proposal_angle', '')}\n"
-        
-        # 学習コンテキストを組み込む
-        if learning_context['success_patterns']:
-            base_prompt += f"\n\n【過去の成功事例から学んだポイント】\n"
-            base_prompt += "\n".join(f"- {p}" for p in learning_context['success_patterns'][:3])
-        
-        if section_name == 'objection_handling' and learning_context['common_objections']:
-            base_prompt += f"\n\n【よくある懸念点】\n"
-            base_prompt += "\n".join(f"- {o}" for o in set(learning_context['common_objections'][:5]))
-        
-        if learning_context['avoid_patterns']:
-            base_prompt += f"\n\n【避けるべき表現・アプローチ】\n"
-            base_prompt += "\n".join(f"- {p}" for p in learning_context['avoid_patterns'][:2])
-        
-        base_prompt += "\n\n---\n\n上記の情報を踏まえて、実際の商談で使える具体的なトークスクリプトを作成してください。"
+                products_block += f"\n{idx}. {product.name}\n"
+                products_block += f"   説明: {product.short_description}\n"
+                products_block += f"   提案角度: {prod_info.get('proposal_angle', '')}\n"
+        
+        success_block = "\n".join(f"- {p}" for p in learning_context['success_patterns'][:3])
+        
+        objections_block = ""
+        if section_name == 'objection_handling':
+            objections_block = "\n".join(f"- {o}" for o in set(learning_context['common_objections'][:5]))
+        
+        avoid_block = "\n".join(f"- {p}" for p in learning_context['avoid_patterns'][:2])
+        
+        prompt = build_prompt_messages(
+            self.SECTION_TEMPLATE_TYPES.get(section_name, 'script_generate'),
+            instructions,
+            [
+                ('提案先企業情報', company_block),
+                ('データ分析結果', analysis_result[:1000] if analysis_result else ''),
+                ('提案商品', products_block),
+                ('過去の成功事例から学んだポイント', success_block),
+                ('よくある懸念点', objections_block),
+                ('避けるべき表現・アプローチ', avoid_block),
+            ],
+            fallback_system_prompt=self.SYSTEM_PROMPT,
+            # カスタムプロンプト指定時はテンプレートの設定を使わない
+            use_template=not custom_prompt
+        )
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.settings.default_ai_model,
-                messages=[
-                    {"role": "system", "content": "あなたは経験豊富な営業トレーナーです。効果的な営業トークスクリプトを作成します。"},
-                    {"role": "user", "content": base_prompt}
-                ],
-                temperature=self.settings.ai_temperature,
+            response = create_chat_completion(
+                self.client,
+                self.SECTION_TEMPLATE_TYPES.get(section_name, 'script_generate'),
+                model=prompt['model_override'] or self.settings.default_ai_model,
+                messages=prompt['messages'],
+                temperature=(
+                    prompt['temperature_override']
+                    if prompt['temperature_override'] is not None
+                    else self.settings.ai_temperature
+                ),
                 max_tokens=self.settings.max_tokens_per_request
             )
             
@@ -4,6 +4,7 @@ Django settings for proposal project.
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from celery.schedules import crontab
 
 # Load environment variables
 load_dotenv()
@@ -121,6 +122,9 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 圧縮BLOBストア（スクレイピング本文・HTMLスナップショット）
+BLOB_STORE_ROOT = Path(os.getenv('BLOB_STORE_ROOT', MEDIA_ROOT / 'blobs'))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -161,6 +165,23 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
+CELERY_BEAT_SCHEDULE = {
+    # 更新が必要な企業情報を1時間ごとに少しずつ再取得
+    'refresh-stale-companies': {
+        'task': 'apps.companies.tasks.refresh_stale_companies',
+        'schedule': crontab(minute=0),
+    },
+    # 一括構造化の待ち行列に残った企業を処理
+    'structure-companies-batch': {
+        'task': 'apps.companies.tasks.structure_companies_batch',
+        'schedule': 60.0,
+    },
+    # 参照されなくなった本文・HTMLのBLOBを毎日削除
+    'collect-unreferenced-blobs': {
+        'task': 'apps.companies.tasks.collect_unreferenced_blobs',
+        'schedule': crontab(hour=4, minute=30),
+    },
+}
 
 # REST Framework
 REST_FRAMEWORK = {